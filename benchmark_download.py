@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Benchmark the parallel media downloader against the sequential download_media path
+
+Usage: python benchmark_download.py <channel> <message_id> [worker counts, e.g. 1 2 4 8]
+
+Stop the bot first when it uses a session file, since both would open the same session.
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import logging
+
+import bot
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+async def timed(label, size, download):
+    """Run one download and print its duration and throughput"""
+    start = time.monotonic()
+    path = await download
+    elapsed = time.monotonic() - start
+    print(f"{label:<28} {elapsed:8.1f}s {size / elapsed / (1024 * 1024):8.2f} MB/s")
+    if path and os.path.exists(path):
+        os.unlink(path)
+
+async def main():
+    if len(sys.argv) < 3:
+        print(__doc__)
+        return
+    channel = int(sys.argv[1]) if sys.argv[1].lstrip('-').isdigit() else sys.argv[1]
+    message_id = int(sys.argv[2])
+    worker_counts = [int(arg) for arg in sys.argv[3:]] or [1, 2, 4, 8]
+
+    bot.user_client = bot.create_user_client()
+    await bot.user_client.connect()
+    try:
+        message = await bot.user_client.get_messages(channel, ids=message_id)
+        document = getattr(getattr(message, 'media', None), 'document', None)
+        if not document:
+            print("That message has no document to download")
+            return
+        print(f"Message {message_id}: {document.size / (1024 * 1024):.1f} MB\n")
+
+        temp_dir = tempfile.mkdtemp(prefix="tg_media_bench_")
+        await timed("download_media (sequential)", document.size,
+                    message.download_media(file=os.path.join(temp_dir, "sequential.bin")))
+        for workers in worker_counts:
+            bot.DOWNLOAD_WORKERS = workers
+            await timed(f"parallel, {workers} worker(s)", document.size,
+                        bot.download_media_parallel(message, os.path.join(temp_dir, f"parallel_{workers}.bin")))
+        os.rmdir(temp_dir)
+    finally:
+        await bot.user_client.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(main())
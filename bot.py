@@ -5,29 +5,41 @@ import tempfile
 import json
 import re  # Regular expression module
 import sys
+import signal
 import datetime
 import random  # Added for audio/gif selection
+import hashlib
+import shutil
 from io import BytesIO
-from typing import List, Dict, Any, Optional, Union, Tuple
+from types import SimpleNamespace
+from collections import OrderedDict, deque
+from typing import List, Dict, Any, Optional, Union, Tuple, FrozenSet
+from dataclasses import dataclass
 from datetime import timezone
 
 # Module-level variable to track reposting state
 reposting_active = True  # Default to active
 
 
-from telethon import TelegramClient, events, functions
-from telethon.sessions import StringSession
+from telethon import TelegramClient, events, functions, utils
+from telethon.sessions import StringSession, SQLiteSession
 from telethon.tl.types import (
     Message, MessageMediaPhoto, MessageMediaDocument, MessageMediaWebPage,
-    InputChannel, PeerChannel, Channel, Chat, User,
+    InputChannel, PeerChannel, PeerChat, PeerUser, Channel, Chat, User,
     MessageEntityTextUrl, MessageEntityUrl, MessageEntityMention,
-    ChannelParticipantsAdmins, DocumentAttributeAudio
+    ChannelParticipantsAdmins, DocumentAttributeAudio, DocumentAttributeVideo,
+    ChannelParticipantAdmin, ChannelParticipantCreator, InputUserSelf,
+    UpdateNewChannelMessage, UpdateNewMessage, UpdateEditChannelMessage, UpdateEditMessage,
+    UpdateDeleteChannelMessages, UpdateShortChatMessage, UpdateShortMessage, InputFile, InputFileBig
 )
-from telethon.tl.functions.channels import JoinChannelRequest, GetFullChannelRequest, GetParticipantsRequest
+from telethon.tl.functions.channels import JoinChannelRequest, GetFullChannelRequest, GetParticipantsRequest, GetParticipantRequest
+from telethon.tl.functions.upload import SaveFilePartRequest, SaveBigFilePartRequest
 from telethon.errors import (
     ChannelPrivateError, ChannelInvalidError, 
     FloodWaitError, ChatAdminRequiredError,
-    UserAdminInvalidError
+    UserAdminInvalidError, UserNotParticipantError,
+    ChatWriteForbiddenError, UserBannedInChannelError, PeerIdInvalidError,
+    FileReferenceExpiredError, ServerError, TimedOutError
 )
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -36,7 +48,8 @@ from telegram.ext import Application, CommandHandler, CallbackQueryHandler, Cont
 from config import (
     BOT_TOKEN, API_ID, API_HASH, USER_SESSION, 
     CHANNEL_CONFIG, TAG_CONFIG, ADMIN_USERS, BOT_CONFIG,
-    save_bot_config, logger
+    save_bot_config, schedule_state_save, flush_state, register_state_section,
+    load_state_file, add_config_listener, state_save_pending, STATE_FILE, logger
 )
 
 # Import farewell constants
@@ -67,11 +80,8 @@ MESSAGE_DEDUP_TIME = 60  # 1 minute
 
 # Function to get the current state of deletion synchronization
 def get_sync_deletions():
-    """Get the current state of deletion synchronization from BOT_CONFIG"""
-    from config import BOT_CONFIG  # Import here to get fresh value
-    sync_value = BOT_CONFIG.get("sync_deletions", False)
-    logger.info(f"Sync deletions is currently: {sync_value}")
-    return sync_value
+    """Get the current state of deletion synchronization from the runtime config snapshot"""
+    return runtime_config.sync_deletions
 
 
 # Enable developer mode for additional debugging information in UI
@@ -79,8 +89,11 @@ DEVELOPER_MODE = BOT_CONFIG.get("developer_mode", True)  # Default to True for b
 # Make sure we save the developer mode to the config
 BOT_CONFIG["developer_mode"] = DEVELOPER_MODE
 
+# Log every incoming update before source filtering (noisy; only for diagnosing missed messages)
+DEBUG_ALL_EVENTS = BOT_CONFIG.get("debug_all_events", False)
+
 # Make sure the sync_deletions setting is saved in BOT_CONFIG
-def save_reposting_state():
+async def save_reposting_state():
     """Save the current reposting state to the bot configuration"""
     global reposting_active
     BOT_CONFIG["reposting_active"] = reposting_active
@@ -132,6 +145,126 @@ content_filters = {
     }
 }
 
+@dataclass(frozen=True)
+class RuntimeConfig:
+    """Settings read by the message pipeline, precomputed once per configuration change"""
+    clean_mode: bool
+    sync_deletions: bool
+    destinations: Tuple[Union[int, str], ...]
+    filters_enabled: bool
+    include_keywords: Tuple[str, ...]  # Lowercased
+    exclude_keywords: Tuple[str, ...]  # Lowercased
+    include_media: FrozenSet[str]
+    exclude_media: FrozenSet[str]
+
+def build_runtime_config() -> RuntimeConfig:
+    """Build a snapshot of the current settings for the hot path"""
+    destinations = active_channels["destinations"] or []
+    if not destinations and active_channels["destination"]:
+        # Fallback to single destination if no multiple destinations set
+        destinations = [active_channels["destination"]]
+    return RuntimeConfig(
+        clean_mode=str(BOT_CONFIG.get("CLEAN_MODE", "false")).lower() == "true",
+        sync_deletions=bool(BOT_CONFIG.get("sync_deletions", False)),
+        destinations=tuple(dest for dest in destinations if dest is not None),
+        filters_enabled=content_filters["enabled"],
+        include_keywords=tuple(kw.lower() for kw in content_filters["keywords"]["include"]),
+        exclude_keywords=tuple(kw.lower() for kw in content_filters["keywords"]["exclude"]),
+        include_media=frozenset(content_filters["media_types"]["include"]),
+        exclude_media=frozenset(content_filters["media_types"]["exclude"])
+    )
+
+def refresh_runtime_config():
+    """Swap in a new runtime config snapshot; readers keep whichever snapshot they already hold"""
+    global runtime_config
+    runtime_config = build_runtime_config()
+
+# Every settings change goes through the state store, which rebuilds the snapshot before saving
+runtime_config = build_runtime_config()
+add_config_listener(refresh_runtime_config)
+
+# Pre-download admission rules for media, keyed by source channel (as string) with a "default" fallback
+# Format: {"<source>": {"max_size_mb": 200, "max_duration_sec": 600, "blocked_mime_prefixes": ["video/"], "action": "skip"}}
+# Actions: "skip" drops the message, "reference" posts the caption with a link to the original post,
+# "slow" still downloads the media but only in the "large_media" delivery lane (limited concurrency)
+MEDIA_RULE_ACTIONS = ["skip", "reference", "slow"]
+MEDIA_RULE_SIZE_PRESETS_MB = [None, 10, 50, 200, 500, 1000, 2000]
+MEDIA_RULE_DURATION_PRESETS_SEC = [None, 60, 300, 900, 1800, 3600]
+MEDIA_RULE_MIME_PREFIXES = ["video/", "audio/", "image/", "application/"]
+media_rules = BOT_CONFIG.get("media_rules", {})
+
+# Source updates are delivered in lanes by cost so cheap posts are never stuck behind heavy media:
+# "text" (text posts, edits and deletions), "small_media" and "large_media", each with its own concurrency
+DELIVERY_LANES = ["text", "small_media", "large_media"]
+LANE_CONCURRENCY = {
+    "text": 8,
+    "small_media": 3,
+    "large_media": BOT_CONFIG.get("slow_lane_concurrency", 1),
+    **BOT_CONFIG.get("lane_concurrency", {})
+}
+LARGE_MEDIA_MIN_SIZE_MB = BOT_CONFIG.get("large_media_min_size_mb", 20)  # Media at least this big goes to "large_media"
+# True keeps each source's messages in order within a lane, or a list limits that to the listed sources
+ORDERED_DELIVERY = BOT_CONFIG.get("ordered_delivery", False)
+lane_semaphores = {lane: asyncio.Semaphore(LANE_CONCURRENCY[lane]) for lane in DELIVERY_LANES}
+lane_stats = {lane: {"queued": 0, "active": 0, "done": 0} for lane in DELIVERY_LANES}
+source_lane_tails = {}  # (chat id, lane) -> future resolved when the source's latest message in that lane is done
+new_messages_in_flight = {}  # (chat id, message id) -> future resolved when the new message is delivered
+
+# Large documents are relayed from the download straight into the upload instead of via a temp file
+STREAM_RELAY_MIN_SIZE_MB = BOT_CONFIG.get("stream_relay_min_size_mb", 20)  # Smaller media is downloaded to disk first
+STREAM_PART_SIZE = 512 * 1024  # Telegram's largest upload part; download requests use the same size
+STREAM_BUFFER_PARTS = BOT_CONFIG.get("stream_buffer_parts", 8)  # Downloaded parts held in memory awaiting upload
+BIG_FILE_THRESHOLD = 10 * 1024 * 1024  # Files above this must be uploaded as big file parts
+
+# Large media is downloaded with several concurrent part requests instead of one sequential stream
+DOWNLOAD_WORKERS = BOT_CONFIG.get("download_workers", 4)  # Concurrent part requests per file
+PARALLEL_DOWNLOAD_MIN_SIZE_MB = BOT_CONFIG.get("parallel_download_min_size_mb", 5)  # Smaller media uses download_media
+DOWNLOAD_PART_RETRIES = 3  # Retries per worker before a download is given up (and left resumable)
+
+# Big files are uploaded with concurrent SaveBigFilePart requests instead of one part at a time
+UPLOAD_WORKERS = BOT_CONFIG.get("upload_workers", 4)  # Concurrent part uploads per file
+UPLOAD_PART_RETRIES = 3  # Retries per part before the upload is given up
+
+# Downloaded media is kept in a cache keyed by Telegram media id and content hash
+MEDIA_CACHE_DIR = BOT_CONFIG.get("media_cache_dir") or os.path.join(tempfile.gettempdir(), "tg_media_cache")
+MEDIA_CACHE_MAX_BYTES = BOT_CONFIG.get("media_cache_max_mb", 2048) * 1024 * 1024  # Unreferenced files are evicted above this
+media_cache = OrderedDict()  # path -> {"size", "refs", "hash", "keys"}, least recently used first
+media_cache_keys = {}  # Telegram media key -> path
+media_cache_hashes = {}  # SHA-256 of the content -> path
+media_cache_downloads = {}  # Telegram media key -> task downloading it
+media_cache_download_waiters = {}  # Telegram media key -> acquirers waiting on its download
+media_cache_stats = {"hits": 0, "misses": 0, "deduplicated": 0, "evictions": 0}
+
+# Small media (photos, stickers, voice notes...) is kept in memory instead of going through the disk cache
+SPOOL_MAX_SIZE_KB = BOT_CONFIG.get("spool_max_size_kb", 1024)  # Larger media spills to the disk cache
+
+# Admission control for media downloads: a global in-flight byte budget plus a concurrency limit
+MEDIA_BUDGET_BYTES = BOT_CONFIG.get("media_budget_mb", 512) * 1024 * 1024  # Bytes being downloaded or held in memory
+MAX_CONCURRENT_DOWNLOADS = BOT_CONFIG.get("max_concurrent_downloads", 3)
+media_budget_waiters = deque()  # (bytes, future) in arrival order
+media_budget_stats = {
+    "bytes_in_flight": 0,
+    "downloads_in_flight": 0,
+    "admitted": 0,
+    "waited": 0,
+    "total_wait": 0.0,
+    "max_wait": 0.0
+}
+
+# Our own rights per channel, cached so purge, join and send paths don't re-query Telegram
+ADMIN_RIGHTS_CACHE_TTL = BOT_CONFIG.get("admin_rights_cache_ttl", 600)  # Seconds before rights are re-fetched
+channel_rights_cache = {}  # channel key -> (expires_at, rights dict, or None for peers without admin rights)
+channel_rights_aliases = {}  # username key -> bare id key of the channel it resolved to
+
+# Routing rules from sources to subsets of destinations
+# Format: [{"source": "<source>", "destinations": ["<dest>", ...], "keywords": ["..."], "media_types": ["photo", ...]}]
+# Sources without any rule keep reposting to every destination
+routing_rules = BOT_CONFIG.get("routing_rules", [])
+ROUTE_MEDIA_TYPES = ["text", "photo", "video", "gif", "round", "audio", "voice", "document", "sticker", "webpage", "unknown"]
+
+# Compiled lookup built from routing_rules: {"<source id variant>": [(keywords, media_types, destinations), ...]}
+routing_table = {}
+
 # Channel management settings
 channel_settings = {
     "farewell_sticker_id": FAREWELL_STICKER_ID
@@ -180,6 +313,10 @@ if destination_channel:
         logger.error(f"Error setting up default tag replacements: {str(e)}")
         logger.info("Will continue with explicitly configured tag replacements only")
 
+# Channel and tag settings are owned by this module, so the state file reads them from here
+register_state_section("channel_config", lambda: CHANNEL_CONFIG)
+register_state_section("tag_config", lambda: tag_replacements)
+
 # Dictionary to track message IDs per user and chat to clean up old messages
 user_message_history = {}
 
@@ -191,13 +328,9 @@ if "reposting_active" in BOT_CONFIG:
     reposting_active = BOT_CONFIG["reposting_active"]
     logger.info(f"Loaded reposting state from config: {reposting_active}")
 else:
-    # Make sure our initial state is saved
-    # Note: We can't use await here since we're in the module level code, not in an async function.
-    # The function is designed to handle this by directly calling save_bot_config()
-    try:
-        save_reposting_state()
-    except Exception as e:
-        logger.error(f"Failed to save initial reposting state: {e}")
+    # Record the initial state in memory only; it is written with the next state save
+    BOT_CONFIG["reposting_active"] = reposting_active
+    BOT_CONFIG["sync_deletions"] = True
 
 
 # Content filtering function
@@ -205,14 +338,15 @@ async def filter_content(msg_data: Dict[str, Any]) -> bool:
     """Filter message based on content filters
     Returns True if message should be reposted, False if it should be filtered out"""
     # Skip filtering if filters are disabled
-    if not content_filters["enabled"]:
+    config = runtime_config
+    if not config.filters_enabled:
         return True
         
-    # Get filter settings
-    include_keywords = content_filters["keywords"]["include"]
-    exclude_keywords = content_filters["keywords"]["exclude"]
-    include_media = content_filters["media_types"]["include"]
-    exclude_media = content_filters["media_types"]["exclude"]
+    # Get filter settings (keywords are already lowercased in the snapshot)
+    include_keywords = config.include_keywords
+    exclude_keywords = config.exclude_keywords
+    include_media = config.include_media
+    exclude_media = config.exclude_media
     
     # Media type filtering
     if msg_data["has_media"]:
@@ -253,7 +387,7 @@ async def filter_content(msg_data: Dict[str, Any]) -> bool:
     if include_keywords:
         matched = False
         for keyword in include_keywords:
-            if keyword.lower() in content_lower:
+            if keyword in content_lower:
                 matched = True
                 break
         if not matched:
@@ -263,13 +397,271 @@ async def filter_content(msg_data: Dict[str, Any]) -> bool:
     # Check exclude keywords - if any match, filter out
     if exclude_keywords:
         for keyword in exclude_keywords:
-            if keyword.lower() in content_lower:
+            if keyword in content_lower:
                 logger.info(f"Filtering out message (matched exclude keyword: {keyword})")
                 return False
     
     # If we got here, the message passed all filters
     return True
 
+def channel_id_variants(channel_id: Union[int, str]) -> List[str]:
+    """
+    Return the string forms a channel can be stored under in our configuration.
+    
+    Events report channels in the marked format (-1001234567890) while channels added
+    through a username are stored with their bare id (1234567890), so lookups keyed by
+    channel have to try both.
+    """
+    channel_str = str(channel_id).strip()
+    variants = [channel_str]
+    if channel_str.startswith("-100") and channel_str[4:].isdigit():
+        variants.append(channel_str[4:])
+    elif channel_str.isdigit():
+        variants.append(f"-100{channel_str}")
+    return variants
+
+def get_media_rule(source_channel_id: Union[int, str]) -> Optional[Dict[str, Any]]:
+    """Get the media admission rule for a source channel, falling back to the default rule"""
+    for key in channel_id_variants(source_channel_id):
+        if key in media_rules:
+            return media_rules[key]
+    return media_rules.get("default")
+
+def evaluate_media_admission(message: Message, rule: Optional[Dict[str, Any]]) -> Tuple[str, Optional[str]]:
+    """
+    Decide what to do with a media message before anything is downloaded
+    
+    Only the document metadata (size, mime type and duration attributes) is inspected.
+    Returns a tuple (action, reason) where action is "download" when no rule matched,
+    otherwise the action configured in the rule ("skip", "reference" or "slow").
+    """
+    if not rule:
+        return "download", None
+    
+    document = getattr(message.media, 'document', None)
+    if document is None:
+        # Photos and other non-document media are always small enough to download
+        return "download", None
+    
+    size = getattr(document, 'size', 0) or 0
+    mime_type = getattr(document, 'mime_type', None) or "application/octet-stream"
+    duration = None
+    for attr in getattr(document, 'attributes', []) or []:
+        if isinstance(attr, (DocumentAttributeVideo, DocumentAttributeAudio)) and getattr(attr, 'duration', None):
+            duration = attr.duration
+            break
+    
+    action = rule.get("action", "skip")
+    max_size_mb = rule.get("max_size_mb")
+    if max_size_mb and size > max_size_mb * 1024 * 1024:
+        return action, f"size {size / (1024 * 1024):.1f} MB exceeds {max_size_mb} MB"
+    
+    max_duration = rule.get("max_duration_sec")
+    if max_duration and duration and duration > max_duration:
+        return action, f"duration {int(duration)}s exceeds {max_duration}s"
+    
+    for prefix in rule.get("blocked_mime_prefixes", []):
+        if mime_type.startswith(prefix):
+            return action, f"mime type {mime_type} is blocked"
+    
+    return "download", None
+
+def compile_routing_table():
+    """
+    Compile routing_rules into routing_table for O(1) lookups per message
+    
+    Every rule is registered under all id variants of its source so the hot path
+    only needs a single dict lookup with the event's chat id. Destinations that are
+    no longer configured are dropped here rather than on every message, and a rule left
+    without destinations is ignored instead of swallowing every post from its source.
+    """
+    global routing_table
+    configured_destinations = {str(dest): dest for dest in (active_channels["destinations"] or [])}
+    if active_channels["destination"] is not None:
+        configured_destinations.setdefault(str(active_channels["destination"]), active_channels["destination"])
+    
+    compiled = {}
+    for rule in routing_rules:
+        destinations = tuple(
+            configured_destinations[str(dest)] for dest in rule.get("destinations", [])
+            if str(dest) in configured_destinations
+        )
+        if not destinations:
+            logger.warning(f"Routing rule for source {rule['source']} has no configured destinations, ignoring it")
+            continue
+        entry = (
+            tuple(keyword.lower() for keyword in rule.get("keywords", [])),
+            frozenset(rule.get("media_types", [])),
+            destinations
+        )
+        for key in channel_id_variants(rule["source"]):
+            compiled.setdefault(key, []).append(entry)
+    
+    # Swap in the new table in one assignment so readers never see a half-built table
+    routing_table = compiled
+    logger.info(f"Compiled routing table: {len(routing_rules)} rules for {len(compiled)} source keys")
+
+def resolve_route_destinations(source_channel_id, msg_data: Dict[str, Any], default_destinations: List) -> List:
+    """
+    Get the destinations a processed message should be delivered to
+    
+    Sources without routing rules go to all default destinations. For sources with rules,
+    the message goes to the union of the destinations of every rule it matches; a rule
+    matches when its media types (if any) contain the message type and its keywords
+    (if any) appear in the text or caption.
+    """
+    rules = routing_table.get(str(source_channel_id))
+    if not rules:
+        return default_destinations
+    
+    if msg_data["has_media"] and msg_data["media_data"]:
+        media_type = msg_data["media_data"]["type"]
+        content_text = msg_data["media_data"]["caption"] or ""
+    else:
+        media_type = "text"
+        content_text = msg_data["text"] or ""
+    if media_type.startswith("webpage_"):
+        media_type = "webpage"
+    content_lower = content_text.lower()
+    
+    selected = []
+    for keywords, media_types, destinations in rules:
+        if media_types and media_type not in media_types:
+            continue
+        if keywords and not any(keyword in content_lower for keyword in keywords):
+            continue
+        for dest in destinations:
+            if dest not in selected:
+                selected.append(dest)
+    
+    logger.info(f"Routing table selected {len(selected)} destinations for source {source_channel_id}")
+    return selected
+
+async def resolve_rule_source(channel: Union[int, str]) -> Union[int, str]:
+    """
+    Get the key a per-source rule is stored under: the marked peer id updates carry
+    
+    Usernames are resolved once when the rule is saved, since channel_id_variants only
+    expands numeric ids. Returns the channel unchanged if it can't be resolved.
+    """
+    channel_str = str(channel).strip()
+    if channel_str.lstrip('-').isdigit():
+        return int(channel_str)
+    try:
+        return await user_client.get_peer_id(channel_str)
+    except Exception as e:
+        logger.error(f"Could not resolve rule source {channel_str}: {str(e)}")
+        return channel_str
+
+def build_source_post_link(message: Message) -> str:
+    """Build a t.me link pointing at the original post in the source channel"""
+    username = None
+    try:
+        username = getattr(message.chat, 'username', None) if message.chat else None
+    except Exception:
+        username = None
+    if username:
+        return f"https://t.me/{username}/{message.id}"
+    
+    chat_str = str(message.chat_id)
+    bare_id = chat_str[4:] if chat_str.startswith("-100") else chat_str.lstrip('-')
+    return f"https://t.me/c/{bare_id}/{message.id}"
+
+def channel_rights_key(channel) -> str:
+    """
+    Cache key for a channel given its entity or the identifier stored in the config
+    
+    Entities, marked ids (-100123) and bare ids (123) all map to the bare id; a username maps
+    to the bare id of the channel it last resolved to.
+    """
+    if hasattr(channel, 'id'):
+        return str(channel.id)
+    channel_str = str(channel).strip()
+    if channel_str.startswith("-100") and channel_str[4:].isdigit():
+        return channel_str[4:]
+    if channel_str.lstrip('-').isdigit():
+        return channel_str.lstrip('-')
+    key = channel_str.lstrip('@').lower()
+    return channel_rights_aliases.get(key, key)
+
+def invalidate_channel_rights(channel):
+    """Forget cached rights for a channel, e.g. after ChatAdminRequiredError or joining it"""
+    channel_rights_cache.pop(channel_rights_key(channel), None)
+
+async def get_self_rights(channel, refresh: bool = False) -> Optional[Dict[str, bool]]:
+    """
+    Get our own membership and admin rights in a channel
+    
+    Only our own participant record is fetched (GetParticipantRequest), not the admin list,
+    and the result is cached for ADMIN_RIGHTS_CACHE_TTL seconds.
+    Returns None if the rights could not be determined, or if the peer isn't a channel or
+    group (e.g. a user or bot chat) and so has no admin rights to inspect.
+    """
+    key = channel_rights_key(channel)
+    now = datetime.datetime.now().timestamp()
+    cached = channel_rights_cache.get(key)
+    if cached and not refresh and cached[0] > now:
+        return cached[1]
+    
+    rights = {
+        "is_member": False,
+        "is_admin": False,
+        "is_creator": False,
+        "delete_messages": False,
+        "post_messages": False,
+        "edit_messages": False
+    }
+    try:
+        entity = channel if isinstance(channel, (Channel, Chat)) else await user_client.get_entity(channel)
+        if str(entity.id) != key:
+            # Looked up by username: keep one cache entry per channel under its id
+            channel_rights_aliases[key] = str(entity.id)
+            key = str(entity.id)
+        
+        if not isinstance(entity, (Channel, Chat)):
+            channel_rights_cache[key] = (now + ADMIN_RIGHTS_CACHE_TTL, None)
+            return None
+        
+        if isinstance(entity, Channel):
+            try:
+                result = await user_client(GetParticipantRequest(channel=entity, participant=InputUserSelf()))
+                participant = result.participant
+                rights["is_member"] = True
+                if isinstance(participant, ChannelParticipantCreator):
+                    rights.update(is_admin=True, is_creator=True, delete_messages=True,
+                                  post_messages=True, edit_messages=True)
+                elif isinstance(participant, ChannelParticipantAdmin):
+                    admin_rights = participant.admin_rights
+                    rights["is_admin"] = True
+                    rights["delete_messages"] = bool(admin_rights.delete_messages)
+                    rights["post_messages"] = bool(admin_rights.post_messages) or entity.megagroup
+                    rights["edit_messages"] = bool(admin_rights.edit_messages) or entity.megagroup
+                elif entity.megagroup:
+                    # Regular supergroup members can post unless the group forbids it
+                    banned = entity.default_banned_rights
+                    rights["post_messages"] = not (banned and banned.send_messages)
+            except UserNotParticipantError:
+                pass
+        elif isinstance(entity, Chat):
+            rights["is_member"] = not entity.left
+            rights["is_creator"] = bool(entity.creator)
+            rights["is_admin"] = bool(entity.creator or entity.admin_rights)
+            rights["delete_messages"] = bool(entity.creator or (entity.admin_rights and entity.admin_rights.delete_messages))
+            banned = entity.default_banned_rights
+            rights["post_messages"] = rights["is_member"] and (rights["is_admin"] or not (banned and banned.send_messages))
+            rights["edit_messages"] = rights["post_messages"]
+    except Exception as e:
+        logger.warning(f"Could not determine our rights in {key}: {str(e)}")
+        return None
+    
+    channel_rights_cache[key] = (now + ADMIN_RIGHTS_CACHE_TTL, rights)
+    return rights
+
+async def can_post_messages(channel) -> bool:
+    """Check (from cache where possible) whether we may post in a channel; unknown rights are assumed allowed"""
+    rights = await get_self_rights(channel)
+    return rights is None or rights["post_messages"]
+
 async def normalize_channel_id(channel_input: Union[int, str]) -> Union[int, str]:
     """
     Normalize channel input to a usable format for Telegram API
@@ -325,15 +717,67 @@ async def normalize_channel_id(channel_input: Union[int, str]) -> Union[int, str
         return original_input
         
     return channel_input
+# Build the routing lookup from the saved rules
+compile_routing_table()
+
+# Admin bot application, set once the bot is started and used for background status updates
+bot_app = None
+
 # Initialize the Telegram user client with the session if credentials are available
+# Optional SQLite session file. Unlike the StringSession it persists the entity cache and the
+# update state (pts per channel), so after a reconnect or restart Telethon can fetch the
+# difference from the server instead of silently dropping the updates it missed.
+USER_SESSION_FILE = os.getenv("USER_SESSION_FILE", "")
+
+def build_user_session():
+    """Build the Telethon session: the SQLite file if USER_SESSION_FILE is set, otherwise the StringSession"""
+    if not USER_SESSION_FILE:
+        return StringSession(USER_SESSION)
+    
+    session = SQLiteSession(USER_SESSION_FILE)
+    if not session.auth_key and USER_SESSION:
+        # First use of the file: seed it with the login from the string session
+        string_session = StringSession(USER_SESSION)
+        session.set_dc(string_session.dc_id, string_session.server_address, string_session.port)
+        session.auth_key = string_session.auth_key
+        session.save()
+        logger.info(f"Seeded session file {USER_SESSION_FILE} from USER_SESSION")
+    return session
+
+def create_user_client() -> TelegramClient:
+    """Create the user client; with a session file, missed updates are caught up on connect"""
+    # Make sure API_ID is an integer
+    api_id_int = int(API_ID) if isinstance(API_ID, str) else API_ID
+    return TelegramClient(
+        build_user_session(),
+        api_id_int,
+        API_HASH,
+        connection_retries=None,  # Infinite retries
+        retry_delay=1,  # 1 second delay between retries
+        catch_up=bool(USER_SESSION_FILE)
+    )
+
+# Set once Telethon's replay of missed updates is over, so the checkpoint catch-up doesn't repost them as well
+updates_caught_up = asyncio.Event()
+
+async def catch_up_updates():
+    """Ask Telegram for the updates missed since the persisted update state (session file only)"""
+    try:
+        if not USER_SESSION_FILE:
+            return
+        await user_client.catch_up()
+        logger.info("Fetched missed updates from the persisted update state")
+    except Exception as e:
+        logger.error(f"Error catching up on missed updates: {str(e)}")
+    finally:
+        updates_caught_up.set()
+
 user_client = None
 if API_ID and API_HASH and USER_SESSION:
     try:
-        # Make sure API_ID is an integer
-        api_id_int = int(API_ID) if isinstance(API_ID, str) else API_ID
         # Create the client with proper credentials
-        user_client = TelegramClient(StringSession(USER_SESSION), api_id_int, API_HASH)
-        logger.info(f"User client initialized with API_ID: {api_id_int}")
+        user_client = create_user_client()
+        logger.info(f"User client initialized with API_ID: {API_ID} ({'session file ' + USER_SESSION_FILE if USER_SESSION_FILE else 'string session'})")
     except Exception as e:
         logger.error(f"Error initializing user client: {str(e)}")
         # Still keep the client as None in case of errors
@@ -467,6 +911,7 @@ async def join_channel(client: TelegramClient, channel_id: Union[int, str]) -> b
         # Get entity and join
         entity = await client.get_entity(channel_id)
         await client(JoinChannelRequest(entity))
+        invalidate_channel_rights(entity)
         logger.info(f"Successfully joined channel: {getattr(entity, 'title', channel_id)}")
         return True
     except ChannelPrivateError:
@@ -497,8 +942,195 @@ async def join_channel(client: TelegramClient, channel_id: Union[int, str]) -> b
         logger.error(f"Failed to join channel {original_channel_id}: {str(e)}")
         return False
 
+# Source channels whose access has been checked and whose events are currently subscribed
+subscribed_sources = set()
+
+async def ensure_source_access(channel):
+    """Make sure we can read a source channel, joining it if the entity can't be resolved"""
+    try:
+        # Try to get entity info to check if we're already in the channel
+        entity_info = await get_entity_info(user_client, channel)
+        
+        # If we can't get entity info, we might need to join
+        if not entity_info:
+            logger.info(f"Attempting to join source channel: {channel}")
+            join_success = await join_channel(user_client, channel)
+            if join_success:
+                logger.info(f"Successfully joined source channel: {channel}")
+            else:
+                logger.warning(f"Failed to join source channel: {channel}")
+        else:
+            logger.info(f"Already have access to source channel: {channel}")
+    except Exception as e:
+        logger.error(f"Error checking/joining channel {channel}: {str(e)}")
+
+# Marked peer ids (-100... for channels) of all source chats, swapped as a whole when sources change
+source_peer_ids = frozenset()
+resolved_source_peer_ids = {}  # str(configured source) -> its peer ids, so only new sources are resolved
+
+async def resolve_source_peer_ids(sources: List[Union[int, str]]) -> frozenset:
+    """Turn configured sources (bare ids, marked ids or usernames) into the marked peer ids updates carry"""
+    peer_ids = set()
+    for channel in sources:
+        try:
+            if isinstance(channel, int) or (isinstance(channel, str) and channel.lstrip('-').isdigit()):
+                channel_int = int(channel)
+                if channel_int < 0:
+                    peer_ids.add(channel_int)
+                else:
+                    # Bare ids saved from entity.id may be a channel or a basic group
+                    peer_ids.add(utils.get_peer_id(PeerChannel(channel_int)))
+                    peer_ids.add(-channel_int)
+            else:
+                peer_ids.add(await user_client.get_peer_id(channel))
+        except Exception as e:
+            logger.error(f"Could not resolve source channel {channel}: {str(e)}")
+    return frozenset(peer_ids)
+
+async def dispatch_source_update(update):
+    """
+    Single raw-update handler for all source channels
+    
+    Updates from chats that aren't sources are dropped with one set lookup; the rest are
+    turned into the usual high-level events and routed to the new/edit/delete handlers.
+    Basic groups usually deliver new messages as the compact UpdateShortChatMessage, which
+    Telethon's NewMessage builder expands into a full message like any other update.
+    """
+    if isinstance(update, (UpdateNewChannelMessage, UpdateNewMessage, UpdateShortChatMessage, UpdateShortMessage)):
+        builder, handler = events.NewMessage, handle_new_message
+    elif isinstance(update, (UpdateEditChannelMessage, UpdateEditMessage)):
+        builder, handler = events.MessageEdited, handle_edited_message
+    elif isinstance(update, UpdateDeleteChannelMessages):
+        builder, handler = events.MessageDeleted, handle_deleted_message
+    else:
+        return
+    
+    if isinstance(update, UpdateDeleteChannelMessages):
+        chat_id = utils.get_peer_id(PeerChannel(update.channel_id))
+    elif isinstance(update, UpdateShortChatMessage):
+        chat_id = utils.get_peer_id(PeerChat(update.chat_id))
+    elif isinstance(update, UpdateShortMessage):
+        chat_id = utils.get_peer_id(PeerUser(update.user_id))
+    else:
+        peer = getattr(update.message, 'peer_id', None)
+        chat_id = utils.get_peer_id(peer) if peer else None
+    
+    if DEBUG_ALL_EVENTS:
+        logger.info(f"DEBUG: {update.__class__.__name__} from chat {chat_id}")
+    if chat_id not in source_peer_ids:
+        return
+    
+    event = builder.build(update)
+    if event is None:
+        return
+    # Same setup Telethon does before handing a built event to a handler
+    event.original_update = update
+    event._entities = getattr(update, '_entities', {})
+    event._set_client(user_client)
+    await deliver_in_lane(event, handler, is_new=handler is handle_new_message)
+
+def classify_delivery_lane(event, is_new: bool) -> str:
+    """Pick the delivery lane for a source event from its cost class"""
+    if not is_new:
+        return "text"
+    message = event.message
+    if not message.media or isinstance(message.media, MessageMediaWebPage):
+        return "text"
+    admission, _ = evaluate_media_admission(message, get_media_rule(event.chat_id))
+    if admission in ("skip", "reference"):
+        return "text"
+    if admission == "slow":
+        return "large_media"
+    size = (message.file.size or 0) if message.file else 0
+    return "large_media" if size >= LARGE_MEDIA_MIN_SIZE_MB * 1024 * 1024 else "small_media"
+
+def source_order_preserved(chat_id: int) -> bool:
+    """Whether a source's messages must be delivered in order within each lane"""
+    if isinstance(ORDERED_DELIVERY, list):
+        variants = channel_id_variants(chat_id)
+        return any(str(ordered).strip() in variants for ordered in ORDERED_DELIVERY)
+    return bool(ORDERED_DELIVERY)
+
+async def deliver_in_lane(event, handler, is_new: bool):
+    """
+    Run a source event's handler in its lane
+    
+    Each lane has its own concurrency limit. For ordered sources a message also waits for the
+    source's previous message in the same lane. Edits and deletions always wait until the new
+    message they refer to has been delivered, so they never overtake it from the faster lane.
+    """
+    lane = classify_delivery_lane(event, is_new)
+    chat_id = event.chat_id
+    loop = asyncio.get_event_loop()
+    done = loop.create_future()
+    
+    previous = None
+    if source_order_preserved(chat_id):
+        previous = source_lane_tails.get((chat_id, lane))
+        source_lane_tails[(chat_id, lane)] = done
+    if is_new:
+        new_messages_in_flight[(chat_id, event.message.id)] = done
+        referenced = []
+    else:
+        message_ids = event.deleted_ids if hasattr(event, 'deleted_ids') else [event.message.id]
+        referenced = [new_messages_in_flight[(chat_id, message_id)]
+                      for message_id in message_ids if (chat_id, message_id) in new_messages_in_flight]
+    
+    stats = lane_stats[lane]
+    stats["queued"] += 1
+    queued = True
+    try:
+        for earlier in referenced + ([previous] if previous else []):
+            await asyncio.shield(earlier)
+        async with lane_semaphores[lane]:
+            stats["queued"] -= 1
+            queued = False
+            stats["active"] += 1
+            try:
+                await handler(event)
+            finally:
+                stats["active"] -= 1
+                stats["done"] += 1
+    finally:
+        if queued:
+            stats["queued"] -= 1
+        done.set_result(None)
+        if source_lane_tails.get((chat_id, lane)) is done:
+            del source_lane_tails[(chat_id, lane)]
+        if is_new and new_messages_in_flight.get((chat_id, event.message.id)) is done:
+            del new_messages_in_flight[(chat_id, event.message.id)]
+
+async def apply_source_channels():
+    """
+    Point the source dispatcher at the current source list
+    
+    The dispatcher is registered once and stays registered; only the frozenset of peer ids
+    is swapped, so there is no window in which updates can be missed. Only sources that
+    weren't resolved before cost a lookup; the others reuse their cached peer ids.
+    """
+    global source_peer_ids
+    if not any(callback is dispatch_source_update for callback, _ in user_client.list_event_handlers()):
+        user_client.add_event_handler(dispatch_source_update, events.Raw())
+    
+    current = {str(ch): ch for ch in active_channels["source"]}
+    for stale in set(resolved_source_peer_ids) - set(current):
+        del resolved_source_peer_ids[stale]
+    for key, channel in current.items():
+        if key not in resolved_source_peer_ids:
+            peer_ids = await resolve_source_peer_ids([channel])
+            # Sources that failed to resolve are tried again on the next change
+            if peer_ids:
+                resolved_source_peer_ids[key] = peer_ids
+    source_peer_ids = frozenset().union(*resolved_source_peer_ids.values())
+    subscribed_sources.clear()
+    subscribed_sources.update(str(ch) for ch in active_channels["source"])
+    if active_channels["source"]:
+        logger.info(f"Dispatching updates for source channels: {active_channels['source']} ({len(source_peer_ids)} peer ids)")
+    else:
+        logger.warning("No source channels configured, all updates will be ignored")
+
 async def save_config():
-    """Save current channel configuration to environment variable and .env file"""
+    """Save current channel configuration to the runtime state and update event handlers"""
     # Make sure destinations is a list before saving
     if not isinstance(active_channels["destinations"], list):
         logger.warning(f"Destinations is not a list when saving: {type(active_channels['destinations']).__name__}")
@@ -534,176 +1166,107 @@ async def save_config():
     logger.info(f"Primary destination: {active_channels['destination']} (type: {type(active_channels['destination']).__name__})")
     logger.info(f"Destinations: {unique_destinations} (types: {[type(ch).__name__ for ch in unique_destinations]})")
     
-    # Convert to JSON
-    config_json = json.dumps(config)
-    
-    # Validate the JSON by parsing it back to ensure it's correct
-    try:
-        test_parse = json.loads(config_json)
-        if not isinstance(test_parse.get("destination_channels"), list):
-            logger.error(f"JSON serialization issue - destinations not a list after parsing: {type(test_parse.get('destination_channels')).__name__}")
-            # Force it to be a list
-            test_parse["destination_channels"] = list(unique_destinations)
-            config_json = json.dumps(test_parse)
-    except Exception as e:
-        logger.error(f"JSON validation error: {str(e)}")
-    
-    # Update environment variable
-    os.environ["CHANNEL_CONFIG"] = config_json
-    
-    # Update the .env file to persist the configuration
-    try:
-        # Read the current .env file
-        with open(".env", "r") as env_file:
-            env_content = env_file.read()
-        
-        # Check if CHANNEL_CONFIG already exists in the file
-        if "CHANNEL_CONFIG=" in env_content:
-            # Replace existing value with clean quotes
-            new_env_content = re.sub(
-                r'CHANNEL_CONFIG=.*', 
-                f'CHANNEL_CONFIG=\'{config_json}\'', 
-                env_content
-            )
-        else:
-            # Add new entry
-            new_env_content = env_content + f'\nCHANNEL_CONFIG=\'{config_json}\''
-        
-        # Write back to .env file
-        with open(".env", "w") as env_file:
-            env_file.write(new_env_content)
-            
-        logger.info(f"✅ Successfully updated channel configuration in .env file")
-    except Exception as e:
-        error_msg = str(e)
-        logger.error(f"❌ Failed to update .env file with channel configuration: {error_msg}")
-        logger.info(f"Updated channel configuration in memory only: {config_json}")
-    
     # Force reload the configuration from memory
     global CHANNEL_CONFIG
     CHANNEL_CONFIG = config
     
-    # Update event handlers for new source channels if user client is connected
+    # Persist with the next coalesced state write
+    schedule_state_save()
+    
+    # Destinations may have changed, so rebuild the routing lookup
+    compile_routing_table()
+    
+    await reconcile_source_channels()
+
+async def reconcile_source_channels():
+    """Bring source access and dispatching in line with active_channels, touching only the changed sources"""
     # Important: Only proceed if the client is available and connected
     if user_client and user_client.is_connected():
-        logger.info(f"Updating event handlers for source channels: {active_channels['source']}")
+        current_sources = {str(ch) for ch in active_channels["source"]}
+        added = [ch for ch in active_channels["source"] if str(ch) not in subscribed_sources]
+        removed = subscribed_sources - current_sources
         
-        # Auto-join new source channels
-        if active_channels["source"]:
-            logger.info("Checking if we need to join any source channels...")
-            for channel in active_channels["source"]:
-                try:
-                    # Try to get entity info to check if we're already in the channel
-                    entity_info = await get_entity_info(user_client, channel)
-                    
-                    # If we can't get entity info, we might need to join
-                    if not entity_info:
-                        logger.info(f"Attempting to join source channel: {channel}")
-                        join_success = await join_channel(user_client, channel)
-                        if join_success:
-                            logger.info(f"Successfully joined source channel: {channel}")
-                        else:
-                            logger.warning(f"Failed to join source channel: {channel}")
-                    else:
-                        logger.info(f"Already have access to source channel: {channel}")
-                except Exception as e:
-                    logger.error(f"Error checking/joining channel {channel}: {str(e)}")
+        if not added and not removed:
+            logger.info("Source channels unchanged, keeping current dispatch set")
+            return
         
-        # First remove all existing handlers for this event type
-        # Create a copy of the event builders list since we'll modify it
-        if hasattr(user_client, '_event_builders'):
-            builders = list(user_client._event_builders)
-            for builder in builders:
-                if isinstance(builder[0], events.NewMessage):
-                    user_client.remove_event_handler(builder[1], builder[0])
+        # Resolve and join the new sources concurrently instead of re-checking every source
+        if added:
+            logger.info(f"Checking access to {len(added)} new source channel(s): {added}")
+            await asyncio.gather(*(ensure_source_access(channel) for channel in added))
+        if removed:
+            logger.info(f"Unsubscribing removed source channel(s): {sorted(removed)}")
         
-        # Now add the updated handlers
-        if active_channels["source"]:
-            logger.info(f"Registering event handler for source channels: {active_channels['source']}")
-            # Extra logging to diagnose event handlers
-            logger.info(f"Current event handlers: {len(user_client._event_builders) if hasattr(user_client, '_event_builders') else 0}")
-            
-            user_client.add_event_handler(
-                handle_new_message,
-                events.NewMessage(chats=active_channels["source"])
-            )
-            
-            # Add handler for edited messages
-            user_client.add_event_handler(
-                handle_edited_message,
-                events.MessageEdited(chats=active_channels["source"])
-            )
-            
-            # Log after adding
-            logger.info(f"After adding handlers, event handlers: {len(user_client._event_builders) if hasattr(user_client, '_event_builders') else 0}")
-        else:
-            logger.warning("No source channels configured, event handlers not registered")
+        await apply_source_channels()
     else:
-        logger.warning("User client not available or not connected, skipping event handler update")
+        logger.warning("User client not available or not connected, skipping source channel update")
 
-async def save_tag_config():
-    """Save current tag replacement configuration to environment variable and .env file"""
-    tag_config_json = json.dumps(tag_replacements)
-    os.environ["TAG_CONFIG"] = tag_config_json
+STATE_WATCH_INTERVAL = 5  # Seconds between checks of the state file for external changes
+
+async def reload_channel_config() -> bool:
+    """
+    Re-read the channel configuration from the state file and apply it in place
+    
+    Used for changes made outside the admin bot (file edits, SIGHUP). Returns True if anything changed.
+    While this process still has an unsaved change the file is older than memory, so nothing is reloaded.
+    """
+    global CHANNEL_CONFIG
+    if state_save_pending():
+        return False
+    saved = load_state_file().get("channel_config")
+    if not saved or saved == CHANNEL_CONFIG:
+        return False
     
-    # Update the .env file to persist the configuration
+    logger.info("Channel configuration changed on disk, reloading")
+    active_channels["source"] = saved.get("source_channels", [])
+    active_channels["destination"] = saved.get("destination_channel")
+    active_channels["destinations"] = saved.get("destination_channels", [])
+    CHANNEL_CONFIG = saved
+    compile_routing_table()
+    refresh_runtime_config()
+    await reconcile_source_channels()
+    return True
+
+async def watch_channel_config():
+    """Poll the state file's modification time and hot-reload channel configuration when it changes"""
     try:
-        # Read the current .env file
-        with open(".env", "r") as env_file:
-            env_content = env_file.read()
-        
-        # Check if TAG_CONFIG already exists in the file
-        if "TAG_CONFIG=" in env_content:
-            # Replace existing value
-            new_env_content = re.sub(
-                r'TAG_CONFIG=.*', 
-                f'TAG_CONFIG=\'{tag_config_json}\'', 
-                env_content
-            )
-        else:
-            # Add new entry
-            new_env_content = env_content + f'\nTAG_CONFIG=\'{tag_config_json}\''
-        
-        # Write back to .env file
-        with open(".env", "w") as env_file:
-            env_file.write(new_env_content)
-            
-        logger.info(f"Updated tag configuration in .env file and memory: {tag_config_json}")
-    except Exception as e:
-        logger.error(f"Failed to update .env file with tag configuration: {str(e)}")
-        logger.info(f"Updated tag configuration in memory only: {tag_config_json}")
+        last_mtime = os.path.getmtime(STATE_FILE)
+    except OSError:
+        last_mtime = None
+    while True:
+        await asyncio.sleep(STATE_WATCH_INTERVAL)
+        try:
+            mtime = os.path.getmtime(STATE_FILE)
+        except OSError:
+            continue
+        # Wait for our own pending save first; the change is picked up on a later poll
+        if mtime != last_mtime and not state_save_pending():
+            last_mtime = mtime
+            try:
+                await reload_channel_config()
+            except Exception as e:
+                logger.error(f"Error reloading channel configuration: {str(e)}")
+
+def start_config_reloaders():
+    """Start the state file watcher and reload the channel configuration on SIGHUP"""
+    asyncio.create_task(watch_channel_config())
+    try:
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGHUP, lambda: asyncio.create_task(reload_channel_config())
+        )
+        logger.info("Channel configuration reloads on SIGHUP and on state file changes")
+    except (NotImplementedError, AttributeError):
+        logger.info("SIGHUP reload not supported on this platform, using the file watch only")
+
+async def save_tag_config():
+    """Save current tag replacement configuration to the runtime state"""
+    schedule_state_save()
+    logger.info(f"Updated tag configuration: {len(tag_replacements)} replacements")
     
 async def save_admin_config():
-    """Save current admin users configuration to environment variable and .env file"""
-    admin_config_json = json.dumps(ADMIN_USERS)
-    os.environ["ADMIN_USERS"] = admin_config_json
-    
-    # Update the .env file to persist the configuration
-    try:
-        # Read the current .env file
-        with open(".env", "r") as env_file:
-            env_content = env_file.read()
-        
-        # Check if ADMIN_USERS already exists in the file
-        if "ADMIN_USERS=" in env_content:
-            # Replace existing value
-            new_env_content = re.sub(
-                r'ADMIN_USERS=.*', 
-                f'ADMIN_USERS=\'{admin_config_json}\'', 
-                env_content
-            )
-        else:
-            # Add new entry
-            new_env_content = env_content + f'\nADMIN_USERS=\'{admin_config_json}\''
-        
-        # Write back to .env file
-        with open(".env", "w") as env_file:
-            env_file.write(new_env_content)
-            
-        logger.info(f"Updated admin users configuration in .env file and memory: {admin_config_json}")
-    except Exception as e:
-        logger.error(f"Failed to update .env file with admin users configuration: {str(e)}")
-        logger.info(f"Updated admin users configuration in memory only: {admin_config_json}")
+    """Save current admin users configuration to the runtime state"""
+    schedule_state_save()
+    logger.info(f"Updated admin users configuration: {ADMIN_USERS}")
 
 
 async def update_farewell_sticker_constant(sticker_id: str, add_to_list: bool = True) -> bool:
@@ -1463,6 +2026,468 @@ async def direct_replace_tme_links(text: str) -> str:
     
     return modified
 
+async def download_media_parts(media, file_size: int, on_part, skip: FrozenSet[int] = frozenset(), workers: int = None):
+    """
+    Download a file in STREAM_PART_SIZE parts with concurrent workers, calling on_part(index, chunk)
+    
+    Worker k fetches parts k, k + workers, k + 2 * workers... with strided iter_downloads, so
+    the requests run concurrently over the sender of the media's DC. Parts in skip are not
+    downloaded: each run of missing parts in a worker's stride gets its own iter_download.
+    A failing worker restarts at the part it was on, up to DOWNLOAD_PART_RETRIES times.
+    """
+    workers = workers or DOWNLOAD_WORKERS
+    total_parts = (file_size + STREAM_PART_SIZE - 1) // STREAM_PART_SIZE
+    
+    async def lane(index: int):
+        attempts = 0
+        while index < total_parts:
+            if index in skip:
+                index += workers
+                continue
+            # The run of missing parts starting here ends at the next finished part or the end of the file
+            run_end = index
+            while run_end < total_parts and run_end not in skip:
+                run_end += workers
+            try:
+                async with user_client.iter_download(
+                    media,
+                    offset=index * STREAM_PART_SIZE,
+                    stride=workers * STREAM_PART_SIZE,
+                    limit=len(range(index, run_end, workers)),
+                    request_size=STREAM_PART_SIZE,
+                    chunk_size=STREAM_PART_SIZE,
+                    file_size=file_size
+                ) as downloader:
+                    async for chunk in downloader:
+                        await on_part(index, bytes(chunk))
+                        index += workers
+                        attempts = 0
+            except FloodWaitError as e:
+                logger.warning(f"Flood wait of {e.seconds}s while downloading part {index}")
+                await asyncio.sleep(e.seconds)
+            except Exception as e:
+                attempts += 1
+                if attempts > DOWNLOAD_PART_RETRIES:
+                    raise
+                logger.warning(f"Downloading part {index} failed ({str(e)}), retrying")
+                await asyncio.sleep(2 ** attempts)
+    
+    tasks = [asyncio.create_task(lane(first)) for first in range(min(workers, total_parts))]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # One failed worker fails the whole download, so don't leave the others running
+        for task in tasks:
+            task.cancel()
+
+async def download_media_parallel(message: Message, file_path: str) -> str:
+    """
+    Download a message's document into file_path with DOWNLOAD_WORKERS concurrent part requests
+    
+    Parts are written at their offsets into a preallocated file. Finished parts are recorded in a
+    "<file_path>.parts" sidecar, so a failed download resumes where it stopped when it is retried.
+    """
+    document = message.media.document
+    sidecar_path = f"{file_path}.parts"
+    done = set()
+    if os.path.exists(sidecar_path) and os.path.exists(file_path):
+        try:
+            with open(sidecar_path, "r") as f:
+                sidecar = json.load(f)
+            if sidecar.get("size") == document.size:
+                done = set(sidecar["done"])
+                logger.info(f"Resuming download of {file_path} with {len(done)} parts already present")
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable download sidecar {sidecar_path}: {str(e)}")
+    
+    def save_sidecar():
+        with open(sidecar_path, "w") as sidecar_file:
+            json.dump({"size": document.size, "done": sorted(done)}, sidecar_file)
+    
+    with open(file_path, "r+b" if done else "wb") as f:
+        f.truncate(document.size)  # Preallocate so parts can be written at their offsets
+        
+        async def write_part(index: int, chunk: bytes):
+            f.seek(index * STREAM_PART_SIZE)
+            f.write(chunk)
+            done.add(index)
+            if len(done) % 16 == 0:
+                f.flush()
+                save_sidecar()
+        
+        try:
+            await download_media_parts(message.media, document.size, write_part, skip=frozenset(done))
+        except BaseException:
+            f.flush()
+            save_sidecar()
+            raise
+    
+    if os.path.exists(sidecar_path):
+        os.unlink(sidecar_path)
+    logger.info(f"Downloaded {document.size} bytes to {file_path} with {DOWNLOAD_WORKERS} workers")
+    return file_path
+
+def media_budget_fits(size: int) -> bool:
+    """Whether a download of size bytes can start right now"""
+    return (media_budget_stats["downloads_in_flight"] < MAX_CONCURRENT_DOWNLOADS
+            and media_budget_stats["bytes_in_flight"] + size <= MEDIA_BUDGET_BYTES)
+
+def wake_media_budget_waiters():
+    """Admit queued downloads in arrival order while the head of the queue fits"""
+    while media_budget_waiters:
+        size, future = media_budget_waiters[0]
+        if future.cancelled():
+            media_budget_waiters.popleft()
+            continue
+        if not media_budget_fits(size):
+            # Strict FIFO: a big download at the head isn't overtaken by smaller ones
+            break
+        media_budget_waiters.popleft()
+        media_budget_stats["bytes_in_flight"] += size
+        media_budget_stats["downloads_in_flight"] += 1
+        future.set_result(None)
+
+async def admit_media_download(size: int) -> int:
+    """
+    Wait for a download slot and size bytes of the in-flight budget; returns the bytes reserved
+    
+    Waiters are admitted first come, first served. Media larger than the whole budget is admitted
+    once it can run alone. Call finish_media_download() when the download ends and
+    release_media_bytes() with the returned value when the bytes are no longer held.
+    """
+    size = min(size, MEDIA_BUDGET_BYTES)
+    loop = asyncio.get_event_loop()
+    started = loop.time()
+    if not media_budget_waiters and media_budget_fits(size):
+        media_budget_stats["bytes_in_flight"] += size
+        media_budget_stats["downloads_in_flight"] += 1
+    else:
+        future = loop.create_future()
+        media_budget_waiters.append((size, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as we were cancelled: hand the capacity back
+                finish_media_download()
+                release_media_bytes(size)
+            raise
+        waited = loop.time() - started
+        media_budget_stats["waited"] += 1
+        media_budget_stats["total_wait"] += waited
+        media_budget_stats["max_wait"] = max(media_budget_stats["max_wait"], waited)
+    media_budget_stats["admitted"] += 1
+    return size
+
+def finish_media_download():
+    """Free the download slot taken by admit_media_download"""
+    media_budget_stats["downloads_in_flight"] -= 1
+    wake_media_budget_waiters()
+
+def release_media_bytes(size: int):
+    """Return bytes reserved by admit_media_download to the budget"""
+    media_budget_stats["bytes_in_flight"] -= size
+    wake_media_budget_waiters()
+
+def media_cache_key(message: Message) -> str:
+    """Cache key for a message's media: the same document or photo has the same key in every chat"""
+    document = getattr(message.media, 'document', None)
+    if document is not None:
+        return f"doc_{document.id}"
+    photo = getattr(message.media, 'photo', None)
+    if photo is not None:
+        return f"photo_{photo.id}"
+    return f"msg_{message.chat_id}_{message.id}"
+
+def file_sha256(path: str) -> str:
+    """Hash a file in 1 MB blocks (run off the event loop)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def remove_media_cache_entry(path: str):
+    """Drop a cached file and every key pointing at it"""
+    entry = media_cache.pop(path)
+    for key in entry["keys"]:
+        media_cache_keys.pop(key, None)
+    if entry["hash"]:
+        media_cache_hashes.pop(entry["hash"], None)
+    if os.path.exists(path):
+        os.unlink(path)
+
+def evict_media_cache():
+    """Delete least recently used files nobody is uploading until the cache fits MEDIA_CACHE_MAX_BYTES"""
+    total = sum(entry["size"] for entry in media_cache.values())
+    for path in list(media_cache):
+        if total <= MEDIA_CACHE_MAX_BYTES:
+            break
+        entry = media_cache[path]
+        if entry["refs"]:
+            continue
+        remove_media_cache_entry(path)
+        total -= entry["size"]
+        media_cache_stats["evictions"] += 1
+
+async def download_into_media_cache(message: Message, key: str, extension: str) -> str:
+    """
+    Download a message's media into the cache directory and index it
+    
+    The download goes to "<path>.partial" and is renamed into place only once it is complete,
+    so a file under its final name is never a truncated or half-written download.
+    """
+    os.makedirs(MEDIA_CACHE_DIR, exist_ok=True)
+    path = os.path.join(MEDIA_CACHE_DIR, f"{key}{extension}")
+    partial_path = f"{path}.partial"
+    logger.info(f"Downloading media to {path}")
+    
+    # Larger documents are fetched with concurrent part requests, within the in-flight byte budget
+    document = getattr(message.media, 'document', None)
+    reserved = await admit_media_download((message.file.size or 0) if message.file else 0)
+    try:
+        if document and (getattr(document, 'size', 0) or 0) >= PARALLEL_DOWNLOAD_MIN_SIZE_MB * 1024 * 1024:
+            downloaded = await download_media_parallel(message, partial_path)
+        else:
+            downloaded = await message.download_media(file=partial_path)
+    finally:
+        finish_media_download()
+        release_media_bytes(reserved)
+    if not downloaded:
+        raise Exception("Failed to download media file")
+    os.replace(downloaded, path)
+    
+    # The same bytes re-uploaded under another id share one file
+    content_hash = await asyncio.to_thread(file_sha256, path)
+    
+    # Take the waiting acquirers' references right away, before anything can evict the file
+    refs = media_cache_download_waiters.pop(key, 0)
+    existing = media_cache_hashes.get(content_hash)
+    if existing and existing != path:
+        os.unlink(path)
+        media_cache[existing]["keys"].add(key)
+        media_cache[existing]["refs"] += refs
+        media_cache_keys[key] = existing
+        media_cache_stats["deduplicated"] += 1
+        return existing
+    
+    media_cache[path] = {"size": os.path.getsize(path), "refs": refs, "hash": content_hash, "keys": {key}}
+    media_cache_keys[key] = path
+    media_cache_hashes[content_hash] = path
+    return path
+
+async def acquire_cached_media(message: Message, extension: str) -> str:
+    """
+    Return a local file with a message's media, downloading it only if it isn't cached yet
+    
+    Concurrent requests for the same media share one download. The caller holds a reference
+    until release_cached_media(); referenced files are never evicted. Callers waiting on a
+    download get their reference from the download itself, as it indexes the file.
+    """
+    key = media_cache_key(message)
+    path = media_cache_keys.get(key)
+    if path is None:
+        task = media_cache_downloads.get(key)
+        if task is None:
+            media_cache_stats["misses"] += 1
+            task = asyncio.create_task(download_into_media_cache(message, key, extension))
+            media_cache_downloads[key] = task
+            task.add_done_callback(lambda _: (media_cache_downloads.pop(key, None),
+                                              media_cache_download_waiters.pop(key, None)))
+        media_cache_download_waiters[key] = media_cache_download_waiters.get(key, 0) + 1
+        try:
+            path = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done():
+                media_cache_download_waiters[key] -= 1
+            elif not task.cancelled() and task.exception() is None:
+                # The download finished and already counted us: give the reference back
+                release_cached_media(task.result())
+            raise
+    else:
+        media_cache_stats["hits"] += 1
+        logger.info(f"Using cached media {path} for message {message.id}")
+        media_cache[path]["refs"] += 1
+    
+    media_cache.move_to_end(path)
+    evict_media_cache()
+    return path
+
+def release_cached_media(path: str):
+    """Give back a reference taken by acquire_cached_media"""
+    entry = media_cache.get(path)
+    if entry and entry["refs"]:
+        entry["refs"] -= 1
+    evict_media_cache()
+
+def release_media_file(msg_data: Dict[str, Any]):
+    """Release the cached file or in-memory budget behind a processed message (safe to call twice)"""
+    path = msg_data.pop("cache_path", None)
+    if path:
+        release_cached_media(path)
+    reserved = msg_data.pop("budget_bytes", None)
+    if reserved is not None:
+        release_media_bytes(reserved)
+
+def sweep_media_temp_dirs():
+    """
+    Remove leftover tg_media_* temp dirs and re-index the media cache at startup
+    
+    Only files renamed into place after a complete download are indexed. A .partial file with a
+    .parts sidecar is kept so its download can resume; one without a sidecar can't be trusted and is removed.
+    """
+    temp_root = tempfile.gettempdir()
+    removed = 0
+    for name in os.listdir(temp_root):
+        path = os.path.join(temp_root, name)
+        if name.startswith("tg_media_") and os.path.isdir(path) and os.path.abspath(path) != os.path.abspath(MEDIA_CACHE_DIR):
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    if removed:
+        logger.info(f"Removed {removed} orphaned media temp dirs")
+    
+    if not os.path.isdir(MEDIA_CACHE_DIR):
+        return
+    files = []
+    for name in os.listdir(MEDIA_CACHE_DIR):
+        path = os.path.join(MEDIA_CACHE_DIR, name)
+        if name.endswith(".partial"):
+            if not os.path.exists(f"{path}.parts"):
+                os.unlink(path)
+            continue
+        if name.endswith(".parts"):
+            if not os.path.exists(path[:-len(".parts")]):
+                os.unlink(path)
+            continue
+        if os.path.exists(f"{path}.parts") or path in media_cache:
+            continue
+        files.append((os.path.getmtime(path), name, path))
+    for _, name, path in sorted(files):
+        key = os.path.splitext(name)[0]
+        media_cache[path] = {"size": os.path.getsize(path), "refs": 0, "hash": None, "keys": {key}}
+        media_cache_keys[key] = path
+    evict_media_cache()
+    logger.info(f"Media cache holds {len(media_cache)} files ({sum(e['size'] for e in media_cache.values()) // (1024 * 1024)} MB)")
+
+async def save_file_part(file_id: int, index: int, total_parts: int, chunk: bytes, is_big: bool):
+    """Upload one file part, retrying just that part after flood waits and transient errors"""
+    for attempt in range(UPLOAD_PART_RETRIES + 1):
+        try:
+            if is_big:
+                request = SaveBigFilePartRequest(file_id, index, total_parts, chunk)
+            else:
+                request = SaveFilePartRequest(file_id, index, chunk)
+            if await user_client(request):
+                return
+            error = RuntimeError(f"Telegram rejected upload part {index} of {total_parts}")
+            delay = 2 ** attempt
+        except FloodWaitError as e:
+            error, delay = e, e.seconds
+        except Exception as e:
+            error, delay = e, 2 ** attempt
+        if attempt < UPLOAD_PART_RETRIES:
+            logger.warning(f"Uploading part {index} failed ({str(error)}), retrying in {delay}s")
+            await asyncio.sleep(delay)
+    raise error
+
+async def upload_file_parallel(file_path: str, file_name: str = None) -> InputFileBig:
+    """
+    Upload a big file with UPLOAD_WORKERS concurrent SaveBigFilePart requests
+    
+    The part size grows with the file (128 to 512 KB, as Telethon picks it) and every part is
+    retried on its own. The returned handle works with any send_file call and can be reused
+    for several destinations.
+    """
+    file_size = os.path.getsize(file_path)
+    part_size = utils.get_appropriated_part_size(file_size) * 1024
+    total_parts = (file_size + part_size - 1) // part_size
+    file_id = random.getrandbits(63)
+    pending_parts = iter(range(total_parts))  # Shared by the workers, each takes the next part
+    
+    with open(file_path, "rb") as f:
+        async def worker():
+            for index in pending_parts:
+                f.seek(index * part_size)
+                chunk = f.read(part_size)
+                await save_file_part(file_id, index, total_parts, chunk, True)
+        
+        tasks = [asyncio.create_task(worker()) for _ in range(min(UPLOAD_WORKERS, total_parts))]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    logger.info(f"Uploaded {file_size} bytes from {file_path} in {total_parts} parts with {UPLOAD_WORKERS} workers")
+    return InputFileBig(file_id, total_parts, file_name or os.path.basename(file_path))
+
+async def relay_media_upload(message: Message, file_name: str) -> Union[InputFile, InputFileBig]:
+    """
+    Upload a message's document while it is still being downloaded
+    
+    Parts from download_media_parts go through a bounded queue (STREAM_BUFFER_PARTS) straight into
+    SaveFilePart/SaveBigFilePart requests, so the upload overlaps the download and nothing is
+    written to disk. Big files accept parts in any order and are downloaded with DOWNLOAD_WORKERS
+    and uploaded with UPLOAD_WORKERS workers; small files need an in-order MD5 and use one of each.
+    The returned handle can be sent to several chats without uploading again.
+    """
+    document = message.media.document
+    total_parts = (document.size + STREAM_PART_SIZE - 1) // STREAM_PART_SIZE
+    is_big = document.size > BIG_FILE_THRESHOLD
+    upload_workers = UPLOAD_WORKERS if is_big else 1
+    file_id = random.getrandbits(63)
+    md5 = hashlib.md5()
+    buffer = asyncio.Queue(maxsize=STREAM_BUFFER_PARTS)
+    uploaded = 0
+    
+    async def enqueue_part(index: int, chunk: bytes):
+        await buffer.put((index, chunk))
+    
+    async def download():
+        try:
+            await download_media_parts(
+                message.media, document.size, enqueue_part, workers=DOWNLOAD_WORKERS if is_big else 1
+            )
+        finally:
+            # One end marker per upload worker
+            for _ in range(upload_workers):
+                await buffer.put(None)
+    
+    async def upload():
+        nonlocal uploaded
+        while True:
+            item = await buffer.get()
+            if item is None:
+                return
+            index, chunk = item
+            if not is_big:
+                md5.update(chunk)
+            await save_file_part(file_id, index, total_parts, chunk, is_big)
+            uploaded += 1
+    
+    # The relay holds at most the queue plus one part per worker in memory
+    reserved = await admit_media_download(
+        min(document.size, (STREAM_BUFFER_PARTS + DOWNLOAD_WORKERS + upload_workers) * STREAM_PART_SIZE)
+    )
+    download_task = asyncio.create_task(download())
+    upload_tasks = [asyncio.create_task(upload()) for _ in range(upload_workers)]
+    try:
+        await asyncio.gather(*upload_tasks)
+        await download_task  # Surfaces download errors
+    finally:
+        for task in [download_task] + upload_tasks:
+            if not task.done():
+                task.cancel()
+        finish_media_download()
+        release_media_bytes(reserved)
+    
+    if uploaded != total_parts:
+        raise RuntimeError(f"Relayed {uploaded} of {total_parts} parts")
+    logger.info(f"Relayed {document.size} bytes of message {message.id} in {total_parts} parts")
+    if is_big:
+        return InputFileBig(file_id, total_parts, file_name)
+    return InputFile(file_id, total_parts, file_name, md5.hexdigest())
+
 async def process_message_for_reposting(message: Message) -> Dict[str, Any]:
     # Debug logging for message content
     logger.info(f"PROCESSING SOURCE MESSAGE: {message.id} for reposting")
@@ -1522,7 +2547,7 @@ async def process_message_for_reposting(message: Message) -> Dict[str, Any]:
             msg_data["text"] = direct_processed_text
         
         # Now continue with normal channel tag replacements
-        use_clean_mode = BOT_CONFIG.get("CLEAN_MODE", "false").lower() == "true"
+        use_clean_mode = runtime_config.clean_mode
         modified_text, processed_entities = await find_replace_channel_tags(
             msg_data["text"], 
             msg_data["entities"],
@@ -1782,6 +2807,26 @@ async def process_message_for_reposting(message: Message) -> Dict[str, Any]:
             logger.error(f"Error determining media type: {str(e)}")
             media_type = "unknown"
         
+        # Apply the pre-download admission rules for this source before touching the network
+        admission, admission_reason = evaluate_media_admission(message, get_media_rule(message.chat_id))
+        if admission == "skip":
+            logger.info(f"Skipping media message {message.id} before download: {admission_reason}")
+            msg_data["skip_reason"] = admission_reason
+            return msg_data
+        elif admission == "reference":
+            # Post the caption with a link to the original media instead of re-uploading it
+            logger.info(f"Sending media message {message.id} as reference only: {admission_reason}")
+            document = getattr(message.media, 'document', None)
+            size_mb = (getattr(document, 'size', 0) or 0) / (1024 * 1024)
+            reference_line = f"📎 {media_type} ({size_mb:.1f} MB): {build_source_post_link(message)}"
+            msg_data["text"] = f"{msg_data['text']}\n\n{reference_line}" if msg_data["text"] else reference_line
+            msg_data["has_media"] = False
+            msg_data["link_preview"] = False
+            return msg_data
+        elif admission == "slow":
+            # classify_delivery_lane already put the message in the "large_media" lane
+            logger.info(f"Media message {message.id} is in the slow lane: {admission_reason}")
+        
         try:
             # Generate appropriate file extension
             extension = ".bin"  # Default
@@ -1813,48 +2858,59 @@ async def process_message_for_reposting(message: Message) -> Dict[str, Any]:
                 if file_name and '.' in file_name:
                     extension = f'.{file_name.split(".")[-1]}'
             
-            # Download the media - use a more efficient method with proper chunk size
-            # Create a unique temp directory to prevent file conflicts
-            temp_dir = tempfile.mkdtemp(prefix="tg_media_")
-            file_path = os.path.join(temp_dir, f"media{extension}")
-            
-            # Log that we're attempting to download the media
-            logger.info(f"Downloading media to {file_path}")
-            
-            # Use a more efficient download with larger chunks for faster performance
-            # Use simplified download options to avoid parameter compatibility issues
-            download_options = {
-                'file': file_path
-                # Removed problematic parameters causing 'dc_id' error
+            media_data = {
+                "type": media_type,
+                "mime_type": getattr(message.media.document, 'mime_type', None) if hasattr(message.media, 'document') else None,
+                "file_name": file_name if 'file_name' in locals() else None,
+                "caption": msg_data["text"],
+                "is_photo": is_photo,
+                "is_video": is_video,
+                "is_gif": is_gif,
+                "is_sticker": is_sticker,
+                "is_voice": is_voice,
+                "is_audio": is_audio,
+                "is_document": is_document
             }
             
-            # Download the media
-            downloaded_path = await message.download_media(**download_options)
+            # Large documents aren't downloaded here: process_message_event relays them into the upload
+            document = getattr(message.media, 'document', None)
+            if document and not is_sticker and (getattr(document, 'size', 0) or 0) >= STREAM_RELAY_MIN_SIZE_MB * 1024 * 1024:
+                logger.info(f"Media of message {message.id} ({document.size} bytes) will be relayed without a temp file")
+                msg_data["media_data"] = media_data
+                msg_data["stream_source"] = message
+                msg_data["stream_file_name"] = media_data["file_name"] or f"media{extension}"
+                msg_data["text"] = None  # Text will be used as caption instead
+                return msg_data
             
-            if downloaded_path:
-                logger.info(f"Successfully downloaded media to {downloaded_path}")
-                file_path = downloaded_path
-                
-                # Store media info
-                msg_data["media_data"] = {
-                    "type": media_type,
-                    "mime_type": getattr(message.media.document, 'mime_type', None) if hasattr(message.media, 'document') else None,
-                    "file_name": file_name if 'file_name' in locals() else None,
-                    "caption": msg_data["text"],
-                    "is_photo": is_photo,
-                    "is_video": is_video,
-                    "is_gif": is_gif,
-                    "is_sticker": is_sticker,
-                    "is_voice": is_voice,
-                    "is_audio": is_audio,
-                    "is_document": is_document
-                }
-                
-                msg_data["file_path"] = file_path
+            # Small media is downloaded into memory and uploaded from there, without touching the disk
+            media_size = message.file.size if message.file and message.file.size else None
+            if media_size is not None and media_size <= SPOOL_MAX_SIZE_KB * 1024:
+                # The bytes stay reserved in the budget until release_media_file()
+                reserved = await admit_media_download(media_size)
+                try:
+                    buffer = BytesIO(await message.download_media(file=bytes))
+                except BaseException:
+                    release_media_bytes(reserved)
+                    raise
+                finally:
+                    finish_media_download()
+                buffer.name = media_data["file_name"] or f"media{extension}"
+                logger.info(f"Media for message {message.id} is spooled in memory ({media_size} bytes)")
+                msg_data["media_data"] = media_data
+                msg_data["file_path"] = buffer
+                msg_data["budget_bytes"] = reserved
                 msg_data["text"] = None  # Text will be used as caption instead
-            else:
-                logger.error("Failed to download media")
-                raise Exception("Failed to download media file")
+                return msg_data
+            
+            # Get the media from the cache, downloading it if needed
+            file_path = await acquire_cached_media(message, extension)
+            logger.info(f"Media for message {message.id} is ready at {file_path}")
+            
+            # Store media info; the cache reference is released with release_media_file()
+            msg_data["media_data"] = media_data
+            msg_data["file_path"] = file_path
+            msg_data["cache_path"] = file_path
+            msg_data["text"] = None  # Text will be used as caption instead
         
         except Exception as e:
             logger.error(f"Error downloading media: {str(e)}")
@@ -1895,6 +2951,57 @@ message_mapping_order = []
 # Counter for tracking operations since last cleanup
 op_counter = 0
 
+# Mappings of backfilled copies, persisted apart from the small live cache so a backfill
+# doesn't push out the mappings of current posts. Same entry shape as message_mapping.
+BACKFILL_MAPPINGS_KEPT = BOT_CONFIG.get("backfill_mappings_kept", 5000)  # Oldest entries are dropped beyond this
+
+def config_channel_value(channel: str) -> Union[int, str]:
+    """Turn a channel read back from a JSON key into the form used in the configuration"""
+    return int(channel) if channel.lstrip('-').isdigit() else channel
+
+def load_backfill_mappings() -> Dict[Tuple[int, int], Dict[str, Any]]:
+    """Load the persisted backfill mappings, keyed like message_mapping"""
+    mappings = {}
+    for key, entry in load_state_file().get("backfill_mappings", {}).items():
+        source_id, message_id = key.rsplit(":", 1)
+        mappings[(int(source_id), int(message_id))] = {
+            "destinations": {config_channel_value(dest): dest_msg_id for dest, dest_msg_id in entry["destinations"].items()},
+            "content_hash": entry.get("content_hash")
+        }
+    return mappings
+
+backfill_message_mapping = load_backfill_mappings()
+register_state_section("backfill_mappings", lambda: {
+    f"{source_id}:{message_id}": {
+        "destinations": {str(dest): dest_msg_id for dest, dest_msg_id in entry["destinations"].items()},
+        "content_hash": entry.get("content_hash")
+    }
+    for (source_id, message_id), entry in backfill_message_mapping.items()
+})
+
+async def add_backfill_mapping(source_channel_id, source_message_id, dest_channel, dest_msg_id):
+    """Record where a backfilled message was reposted, keeping at most BACKFILL_MAPPINGS_KEPT messages"""
+    key = (source_channel_id, source_message_id)
+    entry = backfill_message_mapping.setdefault(key, {"destinations": {}, "content_hash": None})
+    entry["destinations"][dest_channel] = dest_msg_id
+    while len(backfill_message_mapping) > BACKFILL_MAPPINGS_KEPT:
+        del backfill_message_mapping[next(iter(backfill_message_mapping))]
+    schedule_state_save(notify_listeners=False)
+
+def get_message_mapping(source_channel_id, source_message_id) -> Optional[Dict[str, Any]]:
+    """Find the mapping of a source message in the live cache or among the backfilled copies"""
+    key = (source_channel_id, source_message_id)
+    return message_mapping.get(key) or backfill_message_mapping.get(key)
+
+def drop_message_mapping(source_channel_id, source_message_id):
+    """Forget a source message's mapping in both stores"""
+    key = (source_channel_id, source_message_id)
+    message_mapping.pop(key, None)
+    if key in message_mapping_order:
+        message_mapping_order.remove(key)
+    if backfill_message_mapping.pop(key, None) is not None:
+        schedule_state_save(notify_listeners=False)
+
 # Function to add a message mapping to the recent messages cache (limited to 50 messages)
 async def add_message_mapping(source_channel_id, source_message_id, dest_channel, dest_msg_id):
     """Add a message mapping with optimized storage
@@ -2008,7 +3115,107 @@ async def handle_new_message(event):
     logger.info(f"=== NEW MESSAGE EVENT RECEIVED ===\nFrom channel: {event.chat_id}\nMessage ID: {event.message.id if hasattr(event, 'message') else 'Unknown'}")
     logger.info(f"Active channels: Source={active_channels['source']}, Destination={active_channels['destinations']}")
     logger.info(f"Reposting active: {reposting_active}")
-    await process_message_event(event, is_edit=False)
+    global live_messages_in_flight
+    live_messages_in_flight += 1
+    try:
+        await process_message_event(event, is_edit=False)
+    finally:
+        live_messages_in_flight -= 1
+    if reposting_active:
+        record_processed_message(event.chat_id, event.message.id)
+        record_source_content(event.chat_id, event.message)
+
+# Live messages currently in the pipeline; background jobs such as backfill yield while this is non-zero
+live_messages_in_flight = 0
+
+# Last processed message id per source (marked chat id as string), used to catch up after downtime
+source_checkpoints = load_state_file().get("source_checkpoints", {})
+register_state_section("source_checkpoints", lambda: source_checkpoints)
+CATCHUP_MAX_BACKLOG = BOT_CONFIG.get("catchup_max_backlog", 200)  # Most recent missed messages reposted per source
+CATCHUP_RATE_PER_SEC = BOT_CONFIG.get("catchup_rate_per_sec", 1)  # Reposts per second during catch-up
+
+source_highest_processed = {}  # Highest finished message id per source, may be ahead of the checkpoint
+catch_up_floors = {}  # chat id -> oldest missed message catch-up hasn't finished yet
+
+def record_processed_message(chat_id: int, message_id: int):
+    """
+    Advance a source's checkpoint; saved with the next coalesced state write
+    
+    Messages finish out of order across the delivery lanes, so the checkpoint only moves up to
+    just below the oldest message of the source still in the pipeline. After a crash, catch-up
+    then starts at that message instead of skipping it.
+    """
+    key = str(chat_id)
+    highest = max(source_highest_processed.get(key, 0), message_id)
+    source_highest_processed[key] = highest
+    pending = [pending_id for pending_chat, pending_id in new_messages_in_flight
+               if pending_chat == chat_id and pending_id != message_id]
+    if chat_id in catch_up_floors and catch_up_floors[chat_id] != message_id:
+        pending.append(catch_up_floors[chat_id])
+    checkpoint = min(highest, min(pending) - 1) if pending else highest
+    if checkpoint > source_checkpoints.get(key, 0):
+        source_checkpoints[key] = checkpoint
+        schedule_state_save(notify_listeners=False)
+
+async def catch_up_missed_messages():
+    """
+    Repost messages that were posted in sources while the bot was down
+    
+    For each source, messages newer than the saved checkpoint are fetched with iter_messages(min_id=...)
+    (at most CATCHUP_MAX_BACKLOG, newest kept) and delivered oldest first through the source's delivery
+    lanes like live messages, paced at CATCHUP_RATE_PER_SEC. A source without a checkpoint starts from
+    its current latest message. Runs after Telethon's own update replay and the deliveries it started,
+    so messages that replay already handled are not reposted twice.
+    """
+    if not reposting_active:
+        logger.info("Reposting is not active, skipping startup catch-up")
+        return
+    
+    await updates_caught_up.wait()
+    
+    async def deliver_missed_message(event):
+        # Service messages (joins, pins...) never reach the pipeline from live events either
+        if not getattr(event.message, 'action', None):
+            await process_message_event(event, is_edit=False)
+        record_processed_message(event.chat_id, event.message.id)
+    
+    for source in list(active_channels["source"]):
+        try:
+            chat_id = await user_client.get_peer_id(source)
+            key = str(chat_id)
+            
+            # Let replayed messages of this source finish so the checkpoint below includes them
+            replayed = [future for (pending_chat, _), future in new_messages_in_flight.items() if pending_chat == chat_id]
+            if replayed:
+                await asyncio.gather(*(asyncio.shield(future) for future in replayed))
+            
+            if key not in source_checkpoints:
+                # First run for this source: don't repost its whole history
+                latest = await user_client.get_messages(source, limit=1)
+                if latest:
+                    record_processed_message(chat_id, latest[0].id)
+                continue
+            
+            missed = [message async for message in user_client.iter_messages(
+                source, min_id=source_checkpoints[key], limit=CATCHUP_MAX_BACKLOG
+            )]
+            if not missed:
+                continue
+            if len(missed) == CATCHUP_MAX_BACKLOG:
+                logger.warning(f"Catch-up backlog for {source} reached {CATCHUP_MAX_BACKLOG} messages, older missed messages are skipped")
+            logger.info(f"Catching up {len(missed)} missed message(s) from source {source}")
+            
+            try:
+                for message in reversed(missed):
+                    # Live messages finishing meanwhile must not move the checkpoint past this one
+                    catch_up_floors[chat_id] = message.id
+                    if (chat_id, message.id) not in new_messages_in_flight:
+                        await deliver_in_lane(SimpleNamespace(chat_id=chat_id, message=message), deliver_missed_message, is_new=True)
+                    await asyncio.sleep(1.0 / CATCHUP_RATE_PER_SEC)
+            finally:
+                catch_up_floors.pop(chat_id, None)
+        except Exception as e:
+            logger.error(f"Error catching up source {source}: {str(e)}")
 
 # Event handler for edited messages in source channels
 async def handle_edited_message(event):
@@ -2034,10 +3241,52 @@ async def handle_edited_message(event):
     
     # Process the edit event
     await process_message_event(event, is_edit=True)
-    
+    if reposting_active:
+        record_source_content(event.chat_id, event.message)
+    
+# Deletion sync collects destination ids per channel and deletes them in batches
+DELETION_BATCH_WINDOW = BOT_CONFIG.get("deletion_batch_window", 1.0)  # Seconds to aggregate deletions before flushing
+DELETION_BATCH_SIZE = 100  # Most ids Telegram accepts per delete_messages call
+pending_deletions = {}  # dest channel -> set of destination message ids
+_deletion_flush_task = None
+
+async def flush_pending_deletions():
+    """Delete the queued destination messages, one call per destination per DELETION_BATCH_SIZE ids"""
+    global _deletion_flush_task
+    await asyncio.sleep(DELETION_BATCH_WINDOW)
+    batches = dict(pending_deletions)
+    pending_deletions.clear()
+    # Deletions queued while this batch is being sent schedule a flush of their own
+    _deletion_flush_task = None
+    
+    for dest_channel, dest_ids in batches.items():
+        dest_ids = sorted(dest_ids)
+        for start in range(0, len(dest_ids), DELETION_BATCH_SIZE):
+            chunk = dest_ids[start:start + DELETION_BATCH_SIZE]
+            try:
+                await user_client.delete_messages(dest_channel, chunk)
+                logger.info(f"Deleted {len(chunk)} message(s) from destination channel {dest_channel}")
+            except ChatAdminRequiredError:
+                invalidate_channel_rights(dest_channel)
+                logger.error(f"Missing delete rights in {dest_channel}, {len(chunk)} message(s) not deleted")
+            except Exception as e:
+                logger.error(f"Error deleting {len(chunk)} message(s) from channel {dest_channel}: {e}")
+
+def queue_destination_deletions(destinations_dict: Dict[Union[int, str], int]):
+    """Queue the copies of a deleted source message and schedule a flush after the aggregation window"""
+    global _deletion_flush_task
+    for dest_channel, dest_msg_id in destinations_dict.items():
+        pending_deletions.setdefault(dest_channel, set()).add(dest_msg_id)
+    if _deletion_flush_task is None or _deletion_flush_task.done():
+        _deletion_flush_task = asyncio.create_task(flush_pending_deletions())
+
 # Event handler for deleted messages in source channels
 async def handle_deleted_message(event):
-    """Handle deleted messages in source channels and sync deletion to destination channels if enabled"""
+    """Handle deleted messages in source channels and sync deletion to destination channels if enabled
+    
+    Copies are not deleted one by one: their ids are queued per destination and removed in
+    batches once DELETION_BATCH_WINDOW has passed, so a mass deletion costs a few calls per destination.
+    """
     # Check if deletion synchronization is enabled by calling our function
     if not get_sync_deletions():
         logger.info("Message deletion detected, but deletion sync is disabled")
@@ -2050,60 +3299,499 @@ async def handle_deleted_message(event):
         # Get the deleted message IDs
         deleted_ids = event.deleted_ids
         source_channel_id = event.chat_id
+        queued = 0
         
         # Process each deleted message
         for deleted_id in deleted_ids:
-            logger.info(f"Processing deletion of message {deleted_id} from channel {source_channel_id}")
-            
-            # Look for this message in our limited mapping cache
-            key = (source_channel_id, deleted_id)
-            if key in message_mapping:
-                # We found a mapping for this message
-                logger.info(f"Found mapping for deleted message {deleted_id}")
-                
+            # Look for this message in our limited mapping cache and among backfilled copies
+            mapping_data = get_message_mapping(source_channel_id, deleted_id)
+            if mapping_data:
                 # For each destination where we previously sent this message
-                mapping_data = message_mapping[key]
                 
                 # Update memory statistics
                 memory_stats["cache_hits"] += 1
                 
-                # Handle both old and new format mappings
-                if "destinations" in mapping_data:  # New format
-                    mapping_data["last_accessed"] = datetime.datetime.now(timezone.utc)
-                    destinations_dict = mapping_data["destinations"]
-                else:  # Old format - convert to new format
-                    destinations_dict = mapping_data  # The old format is just the destinations dict
-                    # Convert to new format
-                    message_mapping[key] = {
-                        "destinations": destinations_dict,
-                        "timestamp": datetime.datetime.now(timezone.utc),
-                        "last_accessed": datetime.datetime.now(timezone.utc)
-                    }
-                    # Update mapping_data reference to point to the new structure
-                    mapping_data = message_mapping[key]
-                    logger.info(f"Upgraded old format message mapping to new format for deleted message key {key}")
-                
-                for dest_channel, dest_msg_id in destinations_dict.items():
-                    try:
-                        # Delete the message from destination channel
-                        logger.info(f"Deleting message {dest_msg_id} from destination channel {dest_channel}")
-                        await user_client.delete_messages(dest_channel, dest_msg_id)
-                        logger.info(f"Successfully deleted message {dest_msg_id} from channel {dest_channel}")
-                    except Exception as e:
-                        logger.error(f"Error deleting message {dest_msg_id} from channel {dest_channel}: {e}")
+                # Handle both old and new format mappings (the old format is just the destinations dict)
+                destinations_dict = mapping_data["destinations"] if "destinations" in mapping_data else mapping_data
+                queue_destination_deletions(destinations_dict)
+                queued += 1
                 
                 # Remove the mapping since it's no longer needed
-                message_mapping.pop(key, None)
-                if key in message_mapping_order:
-                    message_mapping_order.remove(key)
-                logger.info(f"Removed mapping for deleted message {deleted_id}")
+                drop_message_mapping(source_channel_id, deleted_id)
             else:
                 logger.info(f"No mapping found for deleted message {deleted_id} (message not in the last {MAX_RECENT_MESSAGES} messages)")
+        
+        if queued:
+            logger.info(f"Queued copies of {queued} deleted message(s) from channel {source_channel_id} for batched deletion")
     except Exception as e:
         logger.error(f"Error processing message deletion event: {e}")
     
-async def process_message_event(event, is_edit=False):
-    """Process message events (new or edited)"""
+def source_content_hash(message) -> str:
+    """Fingerprint of a source message's text and media, used to spot edits we missed"""
+    media_id = message.file.id if getattr(message, 'file', None) else ""
+    return hashlib.sha1(f"{message.message or ''}\0{media_id}".encode("utf-8")).hexdigest()
+
+def record_source_content(chat_id: int, message):
+    """Remember what the reposted copies of a source message were built from"""
+    mapping_data = get_message_mapping(chat_id, message.id)
+    if mapping_data and "destinations" in mapping_data:
+        mapping_data["content_hash"] = source_content_hash(message)
+        if (chat_id, message.id) in backfill_message_mapping:
+            schedule_state_save(notify_listeners=False)
+
+# Periodic reconciliation repairs edits and deletions whose events never arrived
+RECONCILE_INTERVAL_MINUTES = BOT_CONFIG.get("reconcile_interval_minutes", 30)  # 0 disables the reconciler
+RECONCILE_BATCH_SIZE = 100  # Message ids per get_messages/delete_messages call (Telegram's limit)
+RECONCILE_MAX_REPAIRS = BOT_CONFIG.get("reconcile_max_repairs", 20)  # Edits + deletions per run
+RECONCILE_RATE_PER_SEC = BOT_CONFIG.get("reconcile_rate_per_sec", 1)  # API calls per second
+reconcile_lock = asyncio.Lock()
+reconcile_report = {
+    "last_run": None,
+    "checked": 0,
+    "edited": 0,
+    "deleted": 0,
+    "missing_in_destination": 0,
+    "deferred": 0,
+    "errors": 0
+}
+
+async def reconcile_pause():
+    """Pace reconciliation API calls and give way to live traffic"""
+    await asyncio.sleep(1.0 / RECONCILE_RATE_PER_SEC)
+    while live_messages_in_flight:
+        await asyncio.sleep(0.5)
+
+async def reconcile_mapped_messages() -> Dict[str, Any]:
+    """
+    Compare mapped source messages with their reposted copies and repair divergences
+    
+    Source and destination messages are fetched in batches with get_messages(ids=[...]).
+    Copies of source messages that no longer exist are deleted in batches (when deletion sync
+    is on), copies of messages whose content changed are re-edited through the normal edit path,
+    and mappings whose destination copy is gone are dropped. At most RECONCILE_MAX_REPAIRS
+    repairs are made per run; the rest are counted as deferred and picked up next time.
+    """
+    async with reconcile_lock:
+        report = {
+            "last_run": datetime.datetime.now(timezone.utc),
+            "checked": 0,
+            "edited": 0,
+            "deleted": 0,
+            "missing_in_destination": 0,
+            "deferred": 0,
+            "errors": 0
+        }
+        repairs_left = RECONCILE_MAX_REPAIRS
+        
+        # Group the mapped message ids (live and backfilled) by source
+        by_source = {}
+        for (source_id, message_id), mapping_data in list({**backfill_message_mapping, **message_mapping}.items()):
+            if "destinations" in mapping_data:
+                by_source.setdefault(source_id, []).append(message_id)
+        
+        for source_id, message_ids in by_source.items():
+            for start in range(0, len(message_ids), RECONCILE_BATCH_SIZE):
+                batch = sorted(message_ids[start:start + RECONCILE_BATCH_SIZE])
+                try:
+                    source_messages = await user_client.get_messages(source_id, ids=batch)
+                except Exception as e:
+                    logger.error(f"Reconciliation could not fetch messages from source {source_id}: {str(e)}")
+                    report["errors"] += 1
+                    continue
+                await reconcile_pause()
+                report["checked"] += len(batch)
+                
+                deleted_ids = []
+                edited_messages = []
+                for message_id, source_message in zip(batch, source_messages):
+                    mapping_data = get_message_mapping(source_id, message_id)
+                    if not mapping_data:
+                        continue
+                    if source_message is None:
+                        deleted_ids.append(message_id)
+                    elif not mapping_data.get("content_hash"):
+                        # No fingerprint yet (mapped before the reconciler existed): start tracking now
+                        mapping_data["content_hash"] = source_content_hash(source_message)
+                    elif mapping_data["content_hash"] != source_content_hash(source_message):
+                        edited_messages.append(source_message)
+                
+                # Destination copies of deleted source messages go through the batched deletion queue
+                if deleted_ids and runtime_config.sync_deletions:
+                    to_delete = deleted_ids[:repairs_left]
+                    report["deferred"] += len(deleted_ids) - len(to_delete)
+                    for message_id in to_delete:
+                        queue_destination_deletions(get_message_mapping(source_id, message_id)["destinations"])
+                        drop_message_mapping(source_id, message_id)
+                    report["deleted"] += len(to_delete)
+                    repairs_left -= len(to_delete)
+                
+                # Re-edit copies whose source content changed
+                for source_message in edited_messages:
+                    if repairs_left <= 0:
+                        report["deferred"] += 1
+                        continue
+                    try:
+                        await process_message_event(SimpleNamespace(chat_id=source_id, message=source_message), is_edit=True)
+                        record_source_content(source_id, source_message)
+                        report["edited"] += 1
+                    except Exception as e:
+                        logger.error(f"Reconciliation could not re-edit message {source_message.id} from {source_id}: {str(e)}")
+                        report["errors"] += 1
+                    repairs_left -= 1
+                    await reconcile_pause()
+                
+                # Drop mappings whose destination copy was removed by hand
+                per_destination = {}
+                for message_id in batch:
+                    mapping_data = get_message_mapping(source_id, message_id)
+                    if mapping_data:
+                        for dest_channel, dest_msg_id in mapping_data["destinations"].items():
+                            per_destination.setdefault(dest_channel, []).append((message_id, dest_msg_id))
+                for dest_channel, pairs in per_destination.items():
+                    try:
+                        dest_messages = await user_client.get_messages(dest_channel, ids=[dest_msg_id for _, dest_msg_id in pairs])
+                    except Exception as e:
+                        logger.error(f"Reconciliation could not fetch messages from destination {dest_channel}: {str(e)}")
+                        report["errors"] += 1
+                        continue
+                    for (message_id, _), dest_message in zip(pairs, dest_messages):
+                        if dest_message is None:
+                            get_message_mapping(source_id, message_id)["destinations"].pop(dest_channel, None)
+                            report["missing_in_destination"] += 1
+                    await reconcile_pause()
+        
+        reconcile_report.update(report)
+        logger.info(f"Reconciliation finished: {report}")
+        return report
+
+def format_reconcile_report() -> str:
+    """Describe the last reconciliation run for the admin UI"""
+    if not reconcile_report["last_run"]:
+        return "No reconciliation run yet."
+    return (
+        f"Last run: {reconcile_report['last_run'].strftime('%Y-%m-%d %H:%M UTC')}\n"
+        f"Mapped messages checked: {reconcile_report['checked']}\n"
+        f"Edits repaired: {reconcile_report['edited']}\n"
+        f"Deletions repaired: {reconcile_report['deleted']}\n"
+        f"Copies missing in destinations: {reconcile_report['missing_in_destination']}\n"
+        f"Repairs deferred to next run: {reconcile_report['deferred']}\n"
+        f"Errors: {reconcile_report['errors']}"
+    )
+
+async def periodic_reconciliation():
+    """Run the reconciler every RECONCILE_INTERVAL_MINUTES while reposting is active"""
+    if not RECONCILE_INTERVAL_MINUTES:
+        logger.info("Periodic reconciliation is disabled")
+        return
+    while True:
+        await asyncio.sleep(RECONCILE_INTERVAL_MINUTES * 60)
+        if not reposting_active:
+            continue
+        try:
+            await reconcile_mapped_messages()
+        except Exception as e:
+            logger.error(f"Error in periodic reconciliation: {str(e)}")
+
+# Deliveries that failed after all fallbacks are retried from a persistent queue
+RETRY_BASE_DELAY = BOT_CONFIG.get("retry_base_delay", 30)  # Seconds before the first retry, doubled per attempt
+RETRY_MAX_DELAY = BOT_CONFIG.get("retry_max_delay", 3600)
+RETRY_MAX_ATTEMPTS = BOT_CONFIG.get("retry_max_attempts", 8)  # Transient errors
+RETRY_UNKNOWN_MAX_ATTEMPTS = 3  # Errors we can't classify get fewer attempts
+RETRY_POLL_INTERVAL = 10  # Seconds between checks for due retries
+DEAD_LETTERS_KEPT = 50
+PERMANENT_DELIVERY_ERRORS = (
+    ChatAdminRequiredError, ChatWriteForbiddenError, UserBannedInChannelError,
+    ChannelPrivateError, ChannelInvalidError, PeerIdInvalidError
+)
+TRANSIENT_DELIVERY_ERRORS = (
+    FloodWaitError, FileReferenceExpiredError, ServerError, TimedOutError,
+    ConnectionError, asyncio.TimeoutError, OSError
+)
+retry_queue = load_state_file().get("retry_queue", {})  # "<source>:<message id>:<destination>" -> entry
+dead_letters = load_state_file().get("dead_letters", [])
+register_state_section("retry_queue", lambda: retry_queue)
+register_state_section("dead_letters", lambda: dead_letters)
+
+def classify_delivery_error(error: BaseException) -> str:
+    """Classify a delivery error as permanent (no rights, channel gone), transient (network, flood wait, expired file reference) or unknown"""
+    if isinstance(error, PERMANENT_DELIVERY_ERRORS):
+        return "permanent"
+    if isinstance(error, TRANSIENT_DELIVERY_ERRORS):
+        return "transient"
+    return "unknown"
+
+def retry_delay(attempts: int, error: Optional[BaseException] = None) -> float:
+    """Exponential backoff with jitter; flood waits are never retried early"""
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempts - 1)) * random.uniform(0.5, 1.5)
+    if isinstance(error, FloodWaitError):
+        delay = max(delay, error.seconds)
+    return delay
+
+def record_delivery_failure(source_channel_id: int, source_message_id: int, dest_channel: Union[int, str],
+                            error: BaseException, backfill: bool = False):
+    """Queue a failed delivery for a later retry, or dead-letter it when it can't succeed"""
+    if not source_channel_id or not source_message_id:
+        return
+    key = f"{source_channel_id}:{source_message_id}:{dest_channel}"
+    entry = retry_queue.get(key) or {
+        "source": source_channel_id,
+        "message_id": source_message_id,
+        "destination": dest_channel,
+        "attempts": 0,
+        "first_failed_at": datetime.datetime.now(timezone.utc).isoformat(),
+        "backfill": backfill  # Retried copies are mapped in the store the first attempt would have used
+    }
+    error_class = classify_delivery_error(error)
+    entry["attempts"] += 1
+    entry["error_class"] = error_class
+    entry["last_error"] = f"{error.__class__.__name__}: {str(error)}"[:200]
+    
+    max_attempts = RETRY_UNKNOWN_MAX_ATTEMPTS if error_class == "unknown" else RETRY_MAX_ATTEMPTS
+    if error_class == "permanent" or entry["attempts"] >= max_attempts:
+        retry_queue.pop(key, None)
+        dead_letters.append(entry)
+        del dead_letters[:-DEAD_LETTERS_KEPT]
+        logger.error(f"Delivery of {source_message_id} from {source_channel_id} to {dest_channel} dead-lettered: {entry['last_error']}")
+    else:
+        entry["next_attempt_at"] = datetime.datetime.now(timezone.utc).timestamp() + retry_delay(entry["attempts"], error)
+        retry_queue[key] = entry
+        logger.warning(f"Delivery of {source_message_id} from {source_channel_id} to {dest_channel} queued for retry #{entry['attempts']}")
+    schedule_state_save(notify_listeners=False)
+
+async def retry_failed_deliveries():
+    """Re-run due deliveries from the retry queue, one destination at a time"""
+    now = datetime.datetime.now(timezone.utc).timestamp()
+    for key, entry in list(retry_queue.items()):
+        if not reposting_active:
+            return
+        if entry["next_attempt_at"] > now:
+            continue
+        try:
+            message = await user_client.get_messages(entry["source"], ids=entry["message_id"])
+        except Exception as e:
+            logger.error(f"Couldn't fetch message {entry['message_id']} from {entry['source']} for retry: {str(e)}")
+            continue
+        if message is None:
+            # The source message is gone, nothing left to deliver
+            retry_queue.pop(key, None)
+            schedule_state_save(notify_listeners=False)
+            continue
+        
+        attempts = entry["attempts"]
+        delivered = await process_message_event(
+            SimpleNamespace(chat_id=entry["source"], message=message),
+            destinations_override=[entry["destination"]], bypass_dedup=True, backfill=entry.get("backfill", False)
+        ) or {}
+        if entry["destination"] in delivered:
+            retry_queue.pop(key, None)
+            schedule_state_save(notify_listeners=False)
+            logger.info(f"Retry delivered message {entry['message_id']} from {entry['source']} to {entry['destination']}")
+        elif retry_queue.get(key) is entry and entry["attempts"] == attempts:
+            # Nothing was sent and no failure was recorded: the destination was skipped (no posting
+            # rights, circuit open, filtered), so count the attempt and back off like any other failure
+            entry["attempts"] += 1
+            entry["last_error"] = "Not sent: destination unavailable or message skipped"
+            if entry["attempts"] >= RETRY_MAX_ATTEMPTS:
+                retry_queue.pop(key, None)
+                dead_letters.append(entry)
+                del dead_letters[:-DEAD_LETTERS_KEPT]
+                logger.error(f"Delivery of {entry['message_id']} from {entry['source']} to {entry['destination']} dead-lettered: {entry['last_error']}")
+            else:
+                entry["next_attempt_at"] = datetime.datetime.now(timezone.utc).timestamp() + retry_delay(entry["attempts"])
+                logger.warning(f"Retry of {entry['message_id']} from {entry['source']} to {entry['destination']} skipped, deferred")
+            schedule_state_save(notify_listeners=False)
+
+async def retry_queue_worker():
+    """Background loop retrying failed deliveries with backoff"""
+    while True:
+        await asyncio.sleep(RETRY_POLL_INTERVAL)
+        if not retry_queue or not reposting_active:
+            continue
+        try:
+            await retry_failed_deliveries()
+        except Exception as e:
+            logger.error(f"Error in retry queue worker: {str(e)}")
+
+# Circuit breaker per destination: stop sending to channels that keep failing with permanent errors
+BREAKER_FAILURE_THRESHOLD = BOT_CONFIG.get("breaker_failure_threshold", 3)  # Consecutive permanent failures to open
+BREAKER_PROBE_INTERVAL = BOT_CONFIG.get("breaker_probe_interval", 300)  # Seconds between probe sends while open
+destination_breakers = {}  # str(destination) -> {"state", "failures", "opened_at", "probe_at", "skipped", "last_error"}
+
+async def notify_admins(text: str):
+    """Send a notice to every admin through the admin bot"""
+    if not bot_app:
+        return
+    for admin_id in ADMIN_USERS:
+        try:
+            await bot_app.bot.send_message(chat_id=admin_id, text=text)
+        except Exception as e:
+            logger.error(f"Error notifying admin {admin_id}: {str(e)}")
+
+def destination_available(dest_channel: Union[int, str]) -> bool:
+    """
+    Whether a message may be sent to a destination right now
+    
+    While a breaker is open every send is short-circuited; once BREAKER_PROBE_INTERVAL has
+    passed it turns half-open and lets one message through as a probe (again every interval
+    until a probe succeeds or fails).
+    """
+    breaker = destination_breakers.get(str(dest_channel))
+    if not breaker or breaker["state"] == "closed":
+        return True
+    now = datetime.datetime.now(timezone.utc).timestamp()
+    if now - max(breaker["opened_at"], breaker["probe_at"]) >= BREAKER_PROBE_INTERVAL:
+        breaker["state"] = "half_open"
+        breaker["probe_at"] = now
+        logger.info(f"Circuit for destination {dest_channel} is half-open, sending a probe")
+        return True
+    breaker["skipped"] += 1
+    return False
+
+def record_destination_success(dest_channel: Union[int, str]):
+    """Close the destination's breaker after a successful send"""
+    breaker = destination_breakers.pop(str(dest_channel), None)
+    if breaker and breaker["state"] != "closed":
+        logger.info(f"Circuit for destination {dest_channel} closed again")
+        asyncio.create_task(notify_admins(
+            f"✅ Destination {dest_channel} is reachable again, reposting to it resumed "
+            f"({breaker['skipped']} message(s) were skipped while it was unavailable)."
+        ))
+
+def record_destination_failure(dest_channel: Union[int, str], error: BaseException):
+    """Count a failed send; consecutive permanent failures open the destination's breaker"""
+    breaker = destination_breakers.setdefault(str(dest_channel), {
+        "state": "closed", "failures": 0, "opened_at": 0, "probe_at": 0, "skipped": 0, "last_error": None
+    })
+    breaker["last_error"] = f"{error.__class__.__name__}: {str(error)}"[:200]
+    now = datetime.datetime.now(timezone.utc).timestamp()
+    if breaker["state"] == "half_open":
+        # The probe failed: stay open for another interval
+        breaker["state"] = "open"
+        breaker["opened_at"] = now
+        return
+    if classify_delivery_error(error) != "permanent":
+        return
+    breaker["failures"] += 1
+    if breaker["state"] == "closed" and breaker["failures"] >= BREAKER_FAILURE_THRESHOLD:
+        breaker["state"] = "open"
+        breaker["opened_at"] = now
+        logger.error(f"Circuit for destination {dest_channel} opened after {breaker['failures']} permanent failures")
+        asyncio.create_task(notify_admins(
+            f"⚠️ Reposting to destination {dest_channel} is paused after {breaker['failures']} failed sends "
+            f"({breaker['last_error']}).\n\nCheck that the account can still post there. "
+            f"A probe message is tried every {BREAKER_PROBE_INTERVAL // 60} minutes."
+        ))
+
+async def prepare_media_caption(msg_data: Dict[str, Any]) -> Optional[str]:
+    """
+    Apply tag replacements to a media caption and build its HTML version
+    
+    Returns the HTML caption when the caption has hyperlinks, otherwise None after writing the
+    tag-replaced text back to msg_data["media_data"]["caption"]. Used for live and backfilled media.
+    """
+    # Process caption for hyperlinks if applicable
+    caption_html = None
+    
+    if msg_data["media_data"]["caption"]:
+        # Process any caption text, regardless of format
+        caption_text = msg_data["media_data"]["caption"]
+        logger.info(f"Processing caption: {caption_text[:50]}...")
+        
+        # We'll use our enhanced detect_markdown_links function which now handles both 
+        # markdown-style links [text](url) and regular URLs like https://example.com
+        processed_text, detected_links = await detect_markdown_links(caption_text)
+        
+        if detected_links:
+            logger.info(f"Found {len(detected_links)} hyperlinks in caption (both markdown & URLs)")
+            logger.info(f"Caption link details: {[{'url': link['url'], 'text': processed_text[link['offset']:link['offset']+link['length']]} for link in detected_links]}")
+            
+            # Create message entities from the detected links
+            caption_entities = []
+            for e in detected_links:
+                # Ensure URL has protocol
+                link_url = e['url']
+                if link_url.startswith('t.me/') or link_url.startswith('telegram.me/'):
+                    link_url = 'https://' + link_url
+                    logger.info(f"Fixed URL in caption to include protocol: {link_url}")
+                
+                caption_entities.append(
+                    MessageEntityTextUrl(
+                        offset=e['offset'],
+                        length=e['length'],
+                        url=link_url
+                    )
+                )
+            
+            # Process these hyperlinks (replace t.me links)
+            modified_text, processed_entities = await find_replace_channel_tags(processed_text, caption_entities)
+            
+            # Create HTML version of caption
+            parts = []
+            last_end = 0
+            
+            # Sort entities by offset
+            sorted_entities = sorted(processed_entities, key=lambda e: e['offset'])
+            
+            # Process each entity
+            for entity_dict in sorted_entities:
+                if entity_dict['type'] == 'MessageEntityTextUrl':
+                    # Add any text before this entity
+                    start = entity_dict['offset']
+                    end = start + entity_dict['length']
+                    
+                    # Ensure we don't go beyond text boundaries
+                    if start >= len(modified_text):
+                        logger.warning(f"Entity start {start} is beyond text length {len(modified_text)}")
+                        continue
+                        
+                    if end > len(modified_text):
+                        logger.warning(f"Entity end {end} is beyond text length {len(modified_text)}")
+                        end = len(modified_text)
+                    
+                    # Add text before this entity
+                    if start > last_end and last_end < len(modified_text):
+                        parts.append(modified_text[last_end:start])
+                    
+                    # Add the entity as an HTML tag
+                    link_text = modified_text[start:end]
+                    parts.append(f'<a href="{entity_dict["url"]}">{link_text}</a>')
+                    
+                    # Update the last end position
+                    last_end = end
+            
+            # Add any remaining text
+            if last_end < len(modified_text):
+                parts.append(modified_text[last_end:])
+            
+            # Build the final HTML caption
+            caption_html = ''.join(parts)
+            logger.info(f"Formatted HTML caption: {caption_html}")
+            
+            # Extra logging to check if HTML is being generated properly
+            if "http" in caption_html:
+                logger.info("HTML caption contains hyperlinks - should be displayed as clickable links")
+                logger.info(f"HTML tags in caption: {len(re.findall(r'<a href=', caption_html))}")
+        else:
+            # No hyperlinks found, still process for channel tags
+            modified_text, _ = await find_replace_channel_tags(caption_text)
+            caption_html = None  # No HTML formatting needed
+            # Update the caption in the media data
+            msg_data["media_data"]["caption"] = modified_text
+    
+    return caption_html
+
+async def process_message_event(event, is_edit=False, destinations_override=None, bypass_dedup=False,
+                                backfill=False):
+    """Process message events (new or edited)
+    
+    destinations_override sends to exactly those destinations, bypassing the default
+    destinations and routing rules (used by backfill jobs). bypass_dedup skips the
+    duplicate check for deliberate re-sends (used by the retry queue). backfill=True records
+    the copies in the persisted backfill mappings instead of the small live mapping cache.
+    
+    Returns the destinations the message was delivered to ({destination: message id}),
+    or None when it was dropped before sending.
+    """
     # Check if reposting is active
     global reposting_active
     
@@ -2116,7 +3804,7 @@ async def process_message_event(event, is_edit=False):
         source_message_id = event.message.id
 
         # Check for duplicate messages
-        if not is_edit and source_channel_id and source_message_id:
+        if not is_edit and not bypass_dedup and source_channel_id and source_message_id:
             message_key = f"{source_channel_id}:{source_message_id}"
             current_time = asyncio.get_event_loop().time()
             
@@ -2155,6 +3843,11 @@ async def process_message_event(event, is_edit=False):
     
     # Initialize sent_destinations dictionary at the top level
     sent_destinations = {}
+    failed_destinations = set()  # Destinations already handed to the retry queue
+    record_mapping = add_backfill_mapping if backfill else add_message_mapping
+    
+    # One settings snapshot for the whole message, even if the admin changes something meanwhile
+    config = runtime_config
     
     try:
         # Get the message
@@ -2164,17 +3857,19 @@ async def process_message_event(event, is_edit=False):
         if is_edit and source_channel_id and source_message_id:
             logger.info(f"Edited message received from channel {source_channel_id}, message ID: {source_message_id}")
             
-            # Check if we have this message in our limited mapping cache
+            # Check if we have this message in our limited mapping cache or among backfilled copies
             key = (source_channel_id, source_message_id)
-            if key in message_mapping:
+            if key in message_mapping or key in backfill_message_mapping:
                 logger.info(f"Found mapping for edited message - will update in destination channels")
                 
                 # Update memory statistics
                 memory_stats["cache_hits"] += 1
-                message_mapping[key]["last_accessed"] = datetime.datetime.now(timezone.utc)
                 
                 # For each destination where we previously sent this message
-                if "destinations" in message_mapping[key]:  # Use the new structure
+                if key not in message_mapping:  # Backfilled copy, mapped in the persisted backfill store
+                    destinations_dict = backfill_message_mapping[key]["destinations"]
+                elif "destinations" in message_mapping[key]:  # Use the new structure
+                    message_mapping[key]["last_accessed"] = datetime.datetime.now(timezone.utc)
                     destinations_dict = message_mapping[key]["destinations"]
                 else:  # For backward compatibility with older entries
                     destinations_dict = message_mapping[key]
@@ -2187,13 +3882,19 @@ async def process_message_event(event, is_edit=False):
                     logger.info(f"Upgraded old format message mapping to new format for key {key}")
                 
                 # Now iterate through the destinations
-                for dest_channel, dest_msg_id in destinations_dict.items():
+                for dest_channel, dest_msg_id in list(destinations_dict.items()):
                     logger.info(f"Will update message in channel {dest_channel}, message ID: {dest_msg_id}")
                     
                     try:
-                        # Process message for reposting
+                        # Process message for reposting (releasing the previous destination's copy first)
+                        if 'msg_data' in locals():
+                            release_media_file(msg_data)
                         msg_data = await process_message_for_reposting(message)
                         
+                        # Media rejected by the admission rules is not re-synced
+                        if msg_data.get("skip_reason"):
+                            break
+                        
                         # Update the message in the destination channel
                         if msg_data["has_media"]:
                             # For media edits, we need special handling to properly handle hyperlinks
@@ -2299,6 +4000,8 @@ async def process_message_event(event, is_edit=False):
                                     # Delete the old message to avoid having two versions
                                     await user_client.delete_messages(dest_channel, dest_msg_id)
                                     logger.info(f"Deleted old media message {dest_msg_id} in channel {dest_channel} to avoid duplicates")
+                                    # The destination no longer has a copy, so the repost below may send one
+                                    destinations_dict.pop(dest_channel, None)
                                     
                                     # Note: We explicitly do NOT add to sent_destinations here
                                     # This ensures the reposting logic below will create a new post
@@ -2331,10 +4034,13 @@ async def process_message_event(event, is_edit=False):
                     except Exception as e:
                         logger.error(f"Error processing edited message: {e}")
                 
-                # Return if we've handled all destinations
-                if len(sent_destinations) == len(active_channels["destinations"] or [active_channels["destination"]]):
+                if key in backfill_message_mapping:
+                    schedule_state_save(notify_listeners=False)
+                
+                # Return if every destination holding a copy was updated
+                if all(dest_channel in sent_destinations for dest_channel in destinations_dict):
                     logger.info("All destinations updated successfully, no need to repost")
-                    return
+                    return sent_destinations
                 
                 logger.info("Some destinations couldn't be updated, will repost to remaining destinations")
             else:
@@ -2345,122 +4051,95 @@ async def process_message_event(event, is_edit=False):
         if 'msg_data' not in locals():
             msg_data = await process_message_for_reposting(message)
         
+        # Media rejected by the admission rules is dropped without being downloaded
+        if msg_data.get("skip_reason"):
+            logger.info(f"Message not reposted: {msg_data['skip_reason']}")
+            return
+        
         # Apply content filtering if enabled
-        if content_filters["enabled"]:
+        if config.filters_enabled:
             should_repost = await filter_content(msg_data)
             if not should_repost:
                 logger.info("Message filtered out based on content filters")
                 return
                 
-        # Determine destination channels
-        destinations = active_channels["destinations"]
-        if not destinations:
-            # Fallback to single destination if no multiple destinations set
-            if active_channels["destination"]:
-                destinations = [active_channels["destination"]]
-            else:
-                logger.error("No destination channels configured.")
-                return
-                
-        logger.info(f"Preparing to send message to {len(destinations)} destination channels")
-        
-        # The actual send operation depends on the message type
-        if msg_data["has_media"]:
-            # Handle media messages
-            # Process caption for hyperlinks if applicable
-            caption_html = None
-            
-            if msg_data["media_data"]["caption"]:
-                # Process any caption text, regardless of format
-                caption_text = msg_data["media_data"]["caption"]
-                logger.info(f"Processing caption: {caption_text[:50]}...")
-                
-                # We'll use our enhanced detect_markdown_links function which now handles both 
-                # markdown-style links [text](url) and regular URLs like https://example.com
-                processed_text, detected_links = await detect_markdown_links(caption_text)
-                
-                if detected_links:
-                    logger.info(f"Found {len(detected_links)} hyperlinks in caption (both markdown & URLs)")
-                    logger.info(f"Caption link details: {[{'url': link['url'], 'text': processed_text[link['offset']:link['offset']+link['length']]} for link in detected_links]}")
-                    
-                    # Create message entities from the detected links
-                    caption_entities = []
-                    for e in detected_links:
-                        # Ensure URL has protocol
-                        link_url = e['url']
-                        if link_url.startswith('t.me/') or link_url.startswith('telegram.me/'):
-                            link_url = 'https://' + link_url
-                            logger.info(f"Fixed URL in caption to include protocol: {link_url}")
-                        
-                        caption_entities.append(
-                            MessageEntityTextUrl(
-                                offset=e['offset'],
-                                length=e['length'],
-                                url=link_url
-                            )
-                        )
-                    
-                    # Process these hyperlinks (replace t.me links)
-                    modified_text, processed_entities = await find_replace_channel_tags(processed_text, caption_entities)
-                    
-                    # Create HTML version of caption
-                    parts = []
-                    last_end = 0
-                    
-                    # Sort entities by offset
-                    sorted_entities = sorted(processed_entities, key=lambda e: e['offset'])
-                    
-                    # Process each entity
-                    for entity_dict in sorted_entities:
-                        if entity_dict['type'] == 'MessageEntityTextUrl':
-                            # Add any text before this entity
-                            start = entity_dict['offset']
-                            end = start + entity_dict['length']
-                            
-                            # Ensure we don't go beyond text boundaries
-                            if start >= len(modified_text):
-                                logger.warning(f"Entity start {start} is beyond text length {len(modified_text)}")
-                                continue
-                                
-                            if end > len(modified_text):
-                                logger.warning(f"Entity end {end} is beyond text length {len(modified_text)}")
-                                end = len(modified_text)
-                            
-                            # Add text before this entity
-                            if start > last_end and last_end < len(modified_text):
-                                parts.append(modified_text[last_end:start])
-                            
-                            # Add the entity as an HTML tag
-                            link_text = modified_text[start:end]
-                            parts.append(f'<a href="{entity_dict["url"]}">{link_text}</a>')
-                            
-                            # Update the last end position
-                            last_end = end
-                    
-                    # Add any remaining text
-                    if last_end < len(modified_text):
-                        parts.append(modified_text[last_end:])
-                    
-                    # Build the final HTML caption
-                    caption_html = ''.join(parts)
-                    logger.info(f"Formatted HTML caption: {caption_html}")
+        if destinations_override is not None:
+            destinations = list(destinations_override)
+        else:
+            # Determine destination channels (already normalized in the snapshot)
+            destinations = list(config.destinations)
+            if not destinations:
+                logger.error("No destination channels configured.")
+                return
                     
-                    # Extra logging to check if HTML is being generated properly
-                    if "http" in caption_html:
-                        logger.info("HTML caption contains hyperlinks - should be displayed as clickable links")
-                        logger.info(f"HTML tags in caption: {len(re.findall(r'<a href=', caption_html))}")
-                else:
-                    # No hyperlinks found, still process for channel tags
-                    modified_text, _ = await find_replace_channel_tags(caption_text)
-                    caption_html = None  # No HTML formatting needed
-                    # Update the caption in the media data
-                    msg_data["media_data"]["caption"] = modified_text
+            # Narrow the destinations down using the routing table (the media is only downloaded once for all routes)
+            destinations = resolve_route_destinations(source_channel_id, msg_data, destinations)
+            if not destinations:
+                logger.info("No routing rule matched this message, not reposting")
+                return
+                
+        # Never send a second copy to a destination that already has one (edits, catch-up and reconciler re-runs)
+        mapping_data = get_message_mapping(source_channel_id, source_message_id)
+        if mapping_data:
+            mapped = mapping_data["destinations"] if "destinations" in mapping_data else mapping_data
+            mapped = {str(dest): dest_msg_id for dest, dest_msg_id in mapped.items()}
+            already_sent = {dest: mapped[str(dest)] for dest in destinations if str(dest) in mapped}
+            destinations = [dest for dest in destinations if str(dest) not in mapped]
+            if not destinations:
+                logger.info("Every destination already has a copy of this message, not reposting")
+                return {**already_sent, **sent_destinations}
+        
+        # Drop destinations we can no longer post to (rights are cached, so normally no API calls)
+        # and those whose circuit breaker is open
+        destinations = [dest for dest in destinations if await can_post_messages(dest) and destination_available(dest)]
+        if not destinations:
+            logger.warning("No destination channel allows posting, not reposting")
+            return
+        
+        logger.info(f"Preparing to send message to {len(destinations)} destination channels")
+        
+        # The actual send operation depends on the message type
+        if msg_data["has_media"]:
+            # Handle media messages
+            caption_html = await prepare_media_caption(msg_data)
 
             # Send the media with appropriate formatting
             logger.info(f"Sending media of type: {msg_data['media_data']['type']}")
             
+            # Large media is relayed from the download into one upload that every destination reuses
+            media_file = msg_data["file_path"]
+            if msg_data.get("stream_source"):
+                try:
+                    media_file = await relay_media_upload(msg_data["stream_source"], msg_data["stream_file_name"])
+                except Exception as e:
+                    logger.error(f"Streaming relay failed, falling back to a full download: {str(e)}")
+                    media_file = await acquire_cached_media(
+                        msg_data["stream_source"], os.path.splitext(msg_data["stream_file_name"])[1]
+                    )
+                    msg_data["file_path"] = media_file
+                    msg_data["cache_path"] = media_file
+            
+            # Spooled media is uploaded once straight from memory, and the handle is reused
+            if isinstance(media_file, BytesIO):
+                try:
+                    media_file = await user_client.upload_file(media_file, file_name=media_file.name)
+                except Exception as e:
+                    logger.error(f"Uploading spooled media failed, letting send_file retry it: {str(e)}")
+            
+            # Big files on disk are uploaded once with concurrent part requests, and the handle is reused
+            if isinstance(media_file, str) and os.path.getsize(media_file) > BIG_FILE_THRESHOLD:
+                try:
+                    media_file = await upload_file_parallel(
+                        media_file, msg_data["media_data"].get("file_name") or os.path.basename(media_file)
+                    )
+                except Exception as e:
+                    logger.error(f"Parallel upload failed, letting send_file upload the file: {str(e)}")
+            
             # Send to each destination channel
             for dest_channel in destinations:
+                # A spooled buffer that couldn't be pre-uploaded is read again by every send
+                if isinstance(media_file, BytesIO):
+                    media_file.seek(0)
                 try:
                     logger.info(f"Sending to destination channel: {dest_channel}")
                     file_attributes = []
@@ -2477,9 +4156,8 @@ async def process_message_event(event, is_edit=False):
                         'caption': caption_html if caption_html else msg_data["media_data"]["caption"],
                         'parse_mode': 'html',
                         'force_document': False,
-                        'attributes': file_attributes,
-                        'part_size_kb': 1024,  # Use 1MB chunks for upload too
-                        'workers': 4           # Use multiple workers for faster upload
+                        'attributes': file_attributes
+                        # Big files were already uploaded in parallel above (send_file ignores worker options)
                     }
                     
                     # Handle each media type specifically
@@ -2487,7 +4165,7 @@ async def process_message_event(event, is_edit=False):
                         # Photos
                         dest_message = await user_client.send_file(
                             dest_channel,
-                            msg_data["file_path"],
+                            media_file,
                             **upload_options
                         )
                         logger.info(f"Sent as photo to {dest_channel}")
@@ -2499,7 +4177,7 @@ async def process_message_event(event, is_edit=False):
                         
                         dest_message = await user_client.send_file(
                             dest_channel,
-                            msg_data["file_path"],
+                            media_file,
                             **upload_options
                         )
                         logger.info(f"Sent as video to {dest_channel}")
@@ -2511,7 +4189,7 @@ async def process_message_event(event, is_edit=False):
                         
                         dest_message = await user_client.send_file(
                             dest_channel,
-                            msg_data["file_path"],
+                            media_file,
                             **upload_options
                         )
                         logger.info(f"Sent as gif to {dest_channel}")
@@ -2520,7 +4198,7 @@ async def process_message_event(event, is_edit=False):
                         # Stickers
                         dest_message = await user_client.send_file(
                             dest_channel,
-                            msg_data["file_path"],
+                            media_file,
                             caption=caption_html if caption_html else msg_data["media_data"]["caption"],
                             parse_mode='html',
                             force_document=False,
@@ -2532,7 +4210,7 @@ async def process_message_event(event, is_edit=False):
                         # Voice messages
                         dest_message = await user_client.send_file(
                             dest_channel,
-                            msg_data["file_path"],
+                            media_file,
                             caption=caption_html if caption_html else msg_data["media_data"]["caption"],
                             parse_mode='html',
                             force_document=False,
@@ -2545,7 +4223,7 @@ async def process_message_event(event, is_edit=False):
                         # Audio files
                         dest_message = await user_client.send_file(
                             dest_channel,
-                            msg_data["file_path"],
+                            media_file,
                             caption=caption_html if caption_html else msg_data["media_data"]["caption"],
                             parse_mode='html',
                             force_document=False,
@@ -2559,7 +4237,7 @@ async def process_message_event(event, is_edit=False):
                         file_name = msg_data["media_data"].get("file_name", None)
                         dest_message = await user_client.send_file(
                             dest_channel,
-                            msg_data["file_path"],
+                            media_file,
                             caption=caption_html if caption_html else msg_data["media_data"]["caption"],
                             parse_mode='html',
                             force_document=True,  # Send as document
@@ -2572,7 +4250,7 @@ async def process_message_event(event, is_edit=False):
                         # Unknown type - let Telegram determine how to send it
                         dest_message = await user_client.send_file(
                             dest_channel,
-                            msg_data["file_path"],
+                            media_file,
                             caption=caption_html if caption_html else msg_data["media_data"]["caption"],
                             parse_mode='html',
                             force_document=False,  # Let Telegram decide
@@ -2589,6 +4267,16 @@ async def process_message_event(event, is_edit=False):
                         
                 except Exception as e:
                     logger.error(f"Error sending media to {dest_channel}: {str(e)}")
+                    if isinstance(e, ChatAdminRequiredError):
+                        invalidate_channel_rights(dest_channel)
+                    
+                    # The fallbacks below can't fix a permanent error, so don't upload the media again
+                    if classify_delivery_error(e) == "permanent":
+                        record_destination_failure(dest_channel, e)
+                        if not is_edit:
+                            record_delivery_failure(source_channel_id, source_message_id, dest_channel, e, backfill=backfill)
+                            failed_destinations.add(dest_channel)
+                        continue
                     
                     # Fallback - try sending without special attributes but still with HTML
                     try:
@@ -2639,7 +4327,7 @@ async def process_message_event(event, is_edit=False):
                         
                         dest_message = await user_client.send_file(
                             dest_channel,
-                            msg_data["file_path"],
+                            media_file,
                             caption=caption_to_use,
                             parse_mode='html',
                             force_document=False  # Let Telegram determine type
@@ -2650,7 +4338,7 @@ async def process_message_event(event, is_edit=False):
                         if not is_edit and source_channel_id and source_message_id and dest_message:
                             dest_msg_id = dest_message.id
                             # Use memory-efficient mapping function
-                            await add_message_mapping(source_channel_id, source_message_id, dest_channel, dest_msg_id)
+                            await record_mapping(source_channel_id, source_message_id, dest_channel, dest_msg_id)
                             sent_destinations[dest_channel] = dest_msg_id
                             logger.info(f"Message from ({source_channel_id}, {source_message_id}) reposted to {dest_channel} with mapping stored")
                     except Exception as e2:
@@ -2663,7 +4351,7 @@ async def process_message_event(event, is_edit=False):
                             logger.info(f"Last resort: sending as document with HTML caption")
                             dest_message = await user_client.send_file(
                                 dest_channel,
-                                msg_data["file_path"],
+                                media_file,
                                 caption=caption_to_use,  # Use the already processed caption
                                 parse_mode='html',
                                 force_document=True
@@ -2673,19 +4361,18 @@ async def process_message_event(event, is_edit=False):
                             # Store mapping even for last resort method
                             if not is_edit and source_channel_id and source_message_id and dest_message:
                                 dest_msg_id = dest_message.id
-                                await add_message_mapping(source_channel_id, source_message_id, dest_channel, dest_msg_id)
+                                await record_mapping(source_channel_id, source_message_id, dest_channel, dest_msg_id)
                                 sent_destinations[dest_channel] = dest_msg_id
                         except Exception as e3:
                             logger.error(f"Complete failure sending media to {dest_channel}: {str(e3)}")
+                            record_destination_failure(dest_channel, e3)
+                            if not is_edit:
+                                record_delivery_failure(source_channel_id, source_message_id, dest_channel, e3, backfill=backfill)
+                                failed_destinations.add(dest_channel)
             
-            # Clean up the temporary file
-            if msg_data["file_path"] and os.path.exists(msg_data["file_path"]):
-                os.unlink(msg_data["file_path"])
+            # The cached file is released in the finally block below
         
         else:  # Text-only messages
-            # Track which destinations received the message
-            sent_destinations = {}
-            
             # For messages with hyperlinks, try a different approach
             if msg_data.get("html_backup", False):
                 # Send to each destination channel
@@ -2775,12 +4462,14 @@ async def process_message_event(event, is_edit=False):
                         if not is_edit and source_channel_id and source_message_id and dest_message:
                             dest_msg_id = dest_message.id
                             # Use memory-efficient mapping function
-                            await add_message_mapping(source_channel_id, source_message_id, dest_channel, dest_msg_id)
+                            await record_mapping(source_channel_id, source_message_id, dest_channel, dest_msg_id)
                             sent_destinations[dest_channel] = dest_msg_id
                             logger.info(f"Message from ({source_channel_id}, {source_message_id}) reposted to {dest_channel} with mapping stored")
                             
                     except Exception as e:
                         logger.error(f"Error sending HTML message to {dest_channel}: {str(e)}")
+                        if isinstance(e, ChatAdminRequiredError):
+                            invalidate_channel_rights(dest_channel)
                         
                         # Try alternate HTML approach
                         try:
@@ -2822,11 +4511,15 @@ async def process_message_event(event, is_edit=False):
                             if not is_edit and source_channel_id and source_message_id and dest_message:
                                 dest_msg_id = dest_message.id
                                 # Use memory-efficient mapping function
-                                await add_message_mapping(source_channel_id, source_message_id, dest_channel, dest_msg_id)
+                                await record_mapping(source_channel_id, source_message_id, dest_channel, dest_msg_id)
                                 sent_destinations[dest_channel] = dest_msg_id
                                 logger.info(f"Message from ({source_channel_id}, {source_message_id}) reposted to {dest_channel} with mapping stored")
                         except Exception as e2:
                             logger.error(f"Error sending alternate HTML message to {dest_channel}: {str(e2)}")
+                            record_destination_failure(dest_channel, e2)
+                            if not is_edit:
+                                record_delivery_failure(source_channel_id, source_message_id, dest_channel, e2, backfill=backfill)
+                                failed_destinations.add(dest_channel)
             
             else:  # Regular text messages without hyperlinks
                 # Send to each destination channel
@@ -2853,12 +4546,14 @@ async def process_message_event(event, is_edit=False):
                         if not is_edit and source_channel_id and source_message_id and dest_message:
                             dest_msg_id = dest_message.id
                             # Use memory-efficient mapping function
-                            await add_message_mapping(source_channel_id, source_message_id, dest_channel, dest_msg_id)
+                            await record_mapping(source_channel_id, source_message_id, dest_channel, dest_msg_id)
                             sent_destinations[dest_channel] = dest_msg_id
                             logger.info(f"Message from ({source_channel_id}, {source_message_id}) reposted to {dest_channel} with mapping stored")
                             
                     except Exception as e:
                         logger.error(f"Error sending message to {dest_channel}: {str(e)}")
+                        if isinstance(e, ChatAdminRequiredError):
+                            invalidate_channel_rights(dest_channel)
                         # Fallback to sending plain text
                         try:
                             dest_message = await user_client.send_message(
@@ -2871,16 +4566,35 @@ async def process_message_event(event, is_edit=False):
                             if not is_edit and source_channel_id and source_message_id and dest_message:
                                 dest_msg_id = dest_message.id
                                 # Use memory-efficient mapping function
-                                await add_message_mapping(source_channel_id, source_message_id, dest_channel, dest_msg_id)
+                                await record_mapping(source_channel_id, source_message_id, dest_channel, dest_msg_id)
                                 sent_destinations[dest_channel] = dest_msg_id
                         except Exception as e2:
                             logger.error(f"Failed to send message to {dest_channel}: {str(e2)}")
+                            record_destination_failure(dest_channel, e2)
+                            if not is_edit:
+                                record_delivery_failure(source_channel_id, source_message_id, dest_channel, e2, backfill=backfill)
+                                failed_destinations.add(dest_channel)
+        
+        # Successful sends close any breaker that was probing
+        for dest_channel in sent_destinations:
+            record_destination_success(dest_channel)
         
         # Log the message mapping status
         logger.info(f"Successfully sent message to {len(sent_destinations)} destination channels")
         
     except Exception as e:
         logger.error(f"Error processing message: {str(e)}")
+        # Destinations this message never reached (e.g. the media download failed) are retried later
+        if not is_edit and 'destinations' in locals():
+            for dest_channel in destinations:
+                if dest_channel not in sent_destinations and dest_channel not in failed_destinations:
+                    record_delivery_failure(source_channel_id, source_message_id, dest_channel, e, backfill=backfill)
+    finally:
+        # Let the media cache evict the file once no other message is using it
+        if 'msg_data' in locals():
+            release_media_file(msg_data)
+    
+    return sent_destinations
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Start command handler with session information"""
     # Get the message that triggered this command
@@ -3115,6 +4829,768 @@ async def edit_message_smartly(message, text, reply_markup=None, parse_mode=None
             parse_mode=parse_mode
         )
 
+# Channel purge settings
+PURGE_BATCH_SIZE = 100  # Telegram accepts at most 100 message IDs per delete_messages call
+PURGE_PROGRESS_INTERVAL = 3  # Minimum seconds between status message edits during a purge
+PURGE_CHECKPOINT_INTERVAL = 10  # Persist a purge job checkpoint every N batches
+PURGE_RATE_PER_SEC = BOT_CONFIG.get("purge_rate_per_sec", 4)  # Delete calls per second shared by all purge jobs
+PURGE_FINISHED_JOBS_KEPT = 10  # Finished jobs kept for the status view
+
+# Background purge jobs keyed by job id, persisted so a restart resumes from the checkpoint
+# (jobs saved inside bot_config by older versions are moved to their own state section)
+_legacy_purge_jobs = BOT_CONFIG.pop("purge_jobs", {})
+purge_jobs = load_state_file().get("purge_jobs", _legacy_purge_jobs)
+register_state_section("purge_jobs", lambda: purge_jobs)
+purge_job_tasks = {}
+purge_job_resume_events = {}
+purge_budget_lock = asyncio.Lock()
+purge_budget_next_at = 0.0
+
+async def wait_for_purge_budget():
+    """Wait for a slot in the delete budget shared by all running purge jobs"""
+    global purge_budget_next_at
+    async with purge_budget_lock:
+        now = asyncio.get_event_loop().time()
+        if purge_budget_next_at > now:
+            await asyncio.sleep(purge_budget_next_at - now)
+            now = asyncio.get_event_loop().time()
+        purge_budget_next_at = max(now, purge_budget_next_at) + 1.0 / PURGE_RATE_PER_SEC
+
+async def delete_message_batch(channel_entity, message_ids: List[int]) -> int:
+    """
+    Delete up to PURGE_BATCH_SIZE messages with a single API call
+    
+    Calls are paced by the shared purge budget; FloodWait errors pause every purge job and the same batch is retried.
+    Returns the number of messages Telegram reported as deleted.
+    """
+    global purge_budget_next_at
+    while True:
+        await wait_for_purge_budget()
+        try:
+            results = await user_client.delete_messages(channel_entity, message_ids)
+            return sum(getattr(result, 'pts_count', 0) for result in results)
+        except ChatAdminRequiredError:
+            invalidate_channel_rights(channel_entity)
+            raise
+        except FloodWaitError as e:
+            # Push the shared budget back so every purge job waits out the flood wait
+            logger.warning(f"FloodWait while purging: pausing all purge jobs for {e.seconds}s")
+            purge_budget_next_at = max(purge_budget_next_at, asyncio.get_event_loop().time() + e.seconds + 1)
+
+async def delete_history_server_side(channel_entity, max_id: int) -> bool:
+    """
+    Clear history up to max_id with a single server-side request where the chat type allows it
+    
+    Supergroups use channels.DeleteHistoryRequest and basic groups use messages.DeleteHistoryRequest.
+    Broadcast channels have no such request, so False is returned and the caller falls back to the id sweep.
+    Every request, including each basic group slice, is paced by the shared purge budget.
+    """
+    global purge_budget_next_at
+    if not (isinstance(channel_entity, Channel) and channel_entity.megagroup) and not isinstance(channel_entity, Chat):
+        return False
+    while True:
+        await wait_for_purge_budget()
+        try:
+            if isinstance(channel_entity, Channel):
+                await user_client(functions.channels.DeleteHistoryRequest(
+                    channel=channel_entity, max_id=max_id, for_everyone=True
+                ))
+                return True
+            # Basic groups delete history in slices; keep going until the server reports nothing left
+            result = await user_client(functions.messages.DeleteHistoryRequest(
+                peer=channel_entity, max_id=max_id, revoke=True
+            ))
+            if not result.offset:
+                return True
+        except FloodWaitError as e:
+            # Push the shared budget back so every purge job waits out the flood wait
+            logger.warning(f"FloodWait on server-side history deletion: pausing all purge jobs for {e.seconds}s")
+            purge_budget_next_at = max(purge_budget_next_at, asyncio.get_event_loop().time() + e.seconds + 1)
+        except ChatAdminRequiredError:
+            invalidate_channel_rights(channel_entity)
+            raise PermissionError("Unable to delete any messages")
+        except Exception as e:
+            logger.warning(f"Server-side history deletion failed, falling back to id sweep: {str(e)}")
+            return False
+
+def save_purge_jobs():
+    """Persist purge jobs and their checkpoints with the next coalesced state write"""
+    finished = [job_id for job_id, job in purge_jobs.items() if job["state"] in ("completed", "cancelled", "failed")]
+    for job_id in finished[:-PURGE_FINISHED_JOBS_KEPT or None]:
+        del purge_jobs[job_id]
+    schedule_state_save(notify_listeners=False)
+
+def format_purge_job_status(job: Dict[str, Any]) -> str:
+    """Describe a purge job's state and progress for the admin UI"""
+    state_icons = {
+        "running": "🗑️", "paused": "⏸️", "leaving": "🚪",
+        "completed": "✅", "cancelled": "✖️", "failed": "❌"
+    }
+    top_id = job.get("top_id") or 0
+    remaining = max(job.get("last_deleted_id", top_id + 1) - 1, 0)
+    percent = 100 if not top_id else int((top_id - remaining) * 100 / top_id)
+    
+    text = f"{state_icons.get(job['state'], '•')} {job['title']} ({job['state']})\n"
+    if job.get("leave"):
+        text += "Mode: delete all & leave\n"
+    text += f"Deleted: {job.get('deleted', 0)} messages\n"
+    if top_id:
+        text += f"Progress: {percent}% ({remaining} ids left)\n"
+    if job.get("error"):
+        text += f"Error: {job['error']}\n"
+    return text
+
+def build_purge_job_keyboard(job: Dict[str, Any]) -> InlineKeyboardMarkup:
+    """Build the control buttons for a purge job"""
+    keyboard = []
+    if job["state"] == "running":
+        keyboard.append([
+            InlineKeyboardButton("⏸️ Pause", callback_data=f"purge_job_pause_{job['id']}"),
+            InlineKeyboardButton("✖️ Cancel", callback_data=f"purge_job_cancel_{job['id']}")
+        ])
+    elif job["state"] == "paused":
+        keyboard.append([
+            InlineKeyboardButton("▶️ Resume", callback_data=f"purge_job_resume_{job['id']}"),
+            InlineKeyboardButton("✖️ Cancel", callback_data=f"purge_job_cancel_{job['id']}")
+        ])
+    keyboard.append([InlineKeyboardButton("📋 All Purge Jobs", callback_data="purge_jobs_status")])
+    keyboard.append([InlineKeyboardButton("🏠 Back to Main Menu", callback_data="back_to_menu")])
+    return InlineKeyboardMarkup(keyboard)
+
+async def edit_job_status_message(job: Dict[str, Any], text: str, reply_markup: InlineKeyboardMarkup):
+    """Edit the admin message a background job reports its progress to"""
+    if not bot_app or not job.get("status_chat_id"):
+        return
+    try:
+        await bot_app.bot.edit_message_text(
+            chat_id=job["status_chat_id"],
+            message_id=job["status_message_id"],
+            text=text,
+            reply_markup=reply_markup
+        )
+    except Exception as e:
+        if "not modified" not in str(e).lower():
+            logger.error(f"Error updating job status message: {str(e)}")
+
+async def update_purge_job_message(job: Dict[str, Any]):
+    """Refresh the status message the purge job was started from"""
+    await edit_job_status_message(
+        job, f"Channel Purge Job\n\n{format_purge_job_status(job)}", build_purge_job_keyboard(job)
+    )
+
+async def run_purge_job(job_id: str):
+    """
+    Run a purge job in the background until the channel is empty, it is cancelled or it fails
+    
+    The top message id is read once. Where the chat type allows it the whole history is
+    cleared server-side; otherwise ids are swept from the checkpoint down to 1 in chunks of
+    PURGE_BATCH_SIZE, tolerating gaps. The lowest deleted id is stored as the checkpoint
+    so a restarted job continues where it left off.
+    """
+    job = purge_jobs[job_id]
+    resume_event = purge_job_resume_events.setdefault(job_id, asyncio.Event())
+    if job["state"] != "paused":
+        resume_event.set()
+    loop = asyncio.get_event_loop()
+    
+    try:
+        channel_entity = await user_client.get_entity(job["channel_id"])
+        
+        if job.get("top_id") is None:
+            latest = await user_client.get_messages(channel_entity, limit=1)
+            job["top_id"] = latest[0].id if latest else 0
+            job["last_deleted_id"] = job["top_id"] + 1
+            save_purge_jobs()
+            if job["top_id"] and await delete_history_server_side(channel_entity, job["top_id"]):
+                job["deleted"] += getattr(latest, 'total', 0) or 0
+                job["last_deleted_id"] = 1
+                logger.info(f"Purge job {job_id}: cleared history up to message {job['top_id']} server-side")
+        
+        batches_done = 0
+        last_progress = loop.time()
+        while job["last_deleted_id"] > 1 and job["state"] != "cancelled":
+            if job["state"] == "paused":
+                save_purge_jobs()
+                await update_purge_job_message(job)
+                await resume_event.wait()
+                continue
+            
+            high_id = job["last_deleted_id"] - 1
+            batch = list(range(high_id, max(high_id - PURGE_BATCH_SIZE, 0), -1))
+            deleted = await delete_message_batch(channel_entity, batch)
+            # The first batch always contains the top message, so nothing deleted means no rights
+            if high_id == job["top_id"] and deleted == 0:
+                raise PermissionError("Unable to delete any messages - check admin rights")
+            
+            job["deleted"] += deleted
+            job["last_deleted_id"] = batch[-1]
+            batches_done += 1
+            if batches_done % PURGE_CHECKPOINT_INTERVAL == 0:
+                save_purge_jobs()
+            if loop.time() - last_progress >= PURGE_PROGRESS_INTERVAL:
+                last_progress = loop.time()
+                await update_purge_job_message(job)
+        
+        if job["state"] != "cancelled":
+            if job.get("leave"):
+                job["state"] = "leaving"
+                save_purge_jobs()
+                await update_purge_job_message(job)
+                await send_farewell_sequence(channel_entity)
+                await asyncio.sleep(1)
+                await user_client.delete_dialog(channel_entity)
+            job["state"] = "completed"
+        logger.info(f"Purge job {job_id} {job['state']}: deleted {job['deleted']} messages")
+    except Exception as e:
+        logger.error(f"Purge job {job_id} failed: {str(e)}")
+        job["state"] = "failed"
+        job["error"] = str(e)
+    finally:
+        purge_job_tasks.pop(job_id, None)
+        purge_job_resume_events.pop(job_id, None)
+        save_purge_jobs()
+        await update_purge_job_message(job)
+
+def start_purge_job(job_id: str):
+    """Start (or restart) the background task for a purge job"""
+    if job_id in purge_job_tasks:
+        return
+    purge_job_tasks[job_id] = asyncio.create_task(run_purge_job(job_id))
+
+def create_purge_job(channel_id: int, title: str, leave: bool, status_message, already_deleted: int = 0) -> Dict[str, Any]:
+    """Register a new purge job for a channel and start it in the background"""
+    job_id = str(abs(channel_id))
+    purge_jobs[job_id] = {
+        "id": job_id,
+        "channel_id": channel_id,
+        "title": title,
+        "leave": leave,
+        "state": "running",
+        "deleted": already_deleted,
+        "top_id": None,
+        "last_deleted_id": None,
+        "status_chat_id": status_message.chat_id if status_message else None,
+        "status_message_id": status_message.message_id if status_message else None,
+        "error": None
+    }
+    save_purge_jobs()
+    start_purge_job(job_id)
+    return purge_jobs[job_id]
+
+def resume_purge_jobs():
+    """Restart purge jobs that were still active when the bot last stopped"""
+    resumed = 0
+    for job_id, job in purge_jobs.items():
+        if job["state"] in ("running", "paused", "leaving"):
+            start_purge_job(job_id)
+            resumed += 1
+    if resumed:
+        logger.info(f"Resumed {resumed} purge job(s) from their checkpoints")
+
+# Backfill jobs copy a source's existing history into chosen destinations through the normal pipeline
+BACKFILL_RATE_PER_SEC = BOT_CONFIG.get("backfill_rate_per_sec", 0.5)  # Messages (or albums) per second per job
+backfill_jobs = load_state_file().get("backfill_jobs", {})
+register_state_section("backfill_jobs", lambda: backfill_jobs)
+backfill_job_tasks = {}
+backfill_job_resume_events = {}
+backfill_job_rates = {}  # job id -> (start time, processed at start) for the current run
+
+def save_backfill_jobs():
+    """Persist backfill jobs and their checkpoints with the next coalesced state write"""
+    schedule_state_save(notify_listeners=False)
+
+def format_backfill_job_status(job: Dict[str, Any]) -> str:
+    """Describe a backfill job's state, progress and ETA for the admin UI"""
+    state_icons = {
+        "running": "📥", "paused": "⏸️", "completed": "✅", "cancelled": "✖️", "failed": "❌"
+    }
+    total = job.get("total") or 0
+    processed = job.get("processed", 0)
+    
+    text = f"{state_icons.get(job['state'], '•')} {job['title']} ({job['state']})\n"
+    text += f"Destinations: {len(job['destinations'])}\n"
+    if total:
+        text += f"Progress: {processed}/{total} ({min(100, int(processed * 100 / total))}%)\n"
+    else:
+        text += f"Processed: {processed} messages\n"
+    
+    if job["state"] == "running" and job["id"] in backfill_job_rates:
+        started_at, processed_at_start = backfill_job_rates[job["id"]]
+        elapsed = asyncio.get_event_loop().time() - started_at
+        done = processed - processed_at_start
+        if elapsed > 0 and done > 0:
+            rate = done / elapsed
+            text += f"Rate: {rate * 60:.1f} messages/min\n"
+            if total > processed:
+                eta_minutes = int((total - processed) / rate / 60)
+                text += f"ETA: {eta_minutes // 60}h {eta_minutes % 60}m\n"
+    if job.get("error"):
+        text += f"Error: {job['error']}\n"
+    return text
+
+def build_backfill_job_keyboard(job: Dict[str, Any]) -> InlineKeyboardMarkup:
+    """Build the control buttons for a backfill job"""
+    keyboard = []
+    if job["state"] == "running":
+        keyboard.append([
+            InlineKeyboardButton("⏸️ Pause", callback_data=f"backfill_job_pause_{job['id']}"),
+            InlineKeyboardButton("✖️ Cancel", callback_data=f"backfill_job_cancel_{job['id']}")
+        ])
+    elif job["state"] == "paused":
+        keyboard.append([
+            InlineKeyboardButton("▶️ Resume", callback_data=f"backfill_job_resume_{job['id']}"),
+            InlineKeyboardButton("✖️ Cancel", callback_data=f"backfill_job_cancel_{job['id']}")
+        ])
+    keyboard.append([InlineKeyboardButton("📋 All Backfill Jobs", callback_data="backfill_menu")])
+    keyboard.append([InlineKeyboardButton("🏠 Back to Main Menu", callback_data="back_to_menu")])
+    return InlineKeyboardMarkup(keyboard)
+
+async def update_backfill_job_message(job: Dict[str, Any]):
+    """Refresh the status message the backfill job was started from"""
+    await edit_job_status_message(
+        job, f"History Backfill Job\n\n{format_backfill_job_status(job)}", build_backfill_job_keyboard(job)
+    )
+
+async def send_backfill_album(chat_id: int, messages: List[Message], destinations: List[Union[int, str]]):
+    """
+    Repost an album as one grouped message and record a backfill mapping per item
+    
+    Items that end up without a downloaded file (skipped or turned into references by the
+    media rules, failed downloads) go through the normal pipeline on their own instead.
+    Captions, skipped destinations, the retry queue and circuit breakers are handled as for
+    single messages.
+    """
+    prepared = [(message, await process_message_for_reposting(message)) for message in messages]
+    album = [(message, data) for message, data in prepared if data["has_media"] and data.get("file_path")]
+    singles = [message for message, data in prepared if not (data["has_media"] and data.get("file_path"))]
+    
+    try:
+        if len(album) >= 2:
+            # Spooled items are uploaded once here, so every destination can reuse them
+            files = [
+                await user_client.upload_file(data["file_path"], file_name=data["file_path"].name)
+                if isinstance(data["file_path"], BytesIO) else data["file_path"]
+                for _, data in album
+            ]
+            # Same caption handling as live posts: tag replacement and HTML hyperlinks
+            captions = []
+            for _, data in album:
+                caption_html = await prepare_media_caption(data)
+                captions.append(caption_html or data["media_data"]["caption"] or "")
+            mapped = [
+                {str(dest) for dest in (get_message_mapping(chat_id, message.id) or {}).get("destinations", {})}
+                for message, _ in album
+            ]
+            for dest_channel in destinations:
+                # Skip destinations that already hold the whole album (e.g. a resumed job)
+                if all(str(dest_channel) in item_destinations for item_destinations in mapped):
+                    continue
+                if not await can_post_messages(dest_channel) or not destination_available(dest_channel):
+                    continue
+                try:
+                    sent = await user_client.send_file(dest_channel, files, caption=captions, parse_mode='html')
+                    for (message, _), dest_message in zip(album, sent):
+                        await add_backfill_mapping(chat_id, message.id, dest_channel, dest_message.id)
+                    record_destination_success(dest_channel)
+                except Exception as e:
+                    logger.error(f"Error sending backfilled album to {dest_channel}: {str(e)}")
+                    if isinstance(e, ChatAdminRequiredError):
+                        invalidate_channel_rights(dest_channel)
+                    # Each item is queued for retry; retries repost the items one by one
+                    record_destination_failure(dest_channel, e)
+                    for message, _ in album:
+                        record_delivery_failure(chat_id, message.id, dest_channel, e, backfill=True)
+        else:
+            singles = messages
+    finally:
+        for _, data in prepared:
+            release_media_file(data)
+    
+    for message in singles:
+        await process_message_event(
+            SimpleNamespace(chat_id=chat_id, message=message), destinations_override=destinations, backfill=True
+        )
+
+async def run_backfill_job(job_id: str):
+    """
+    Walk a source's history oldest first and push it through the pipeline into the job's destinations
+    
+    The id of the last reposted message is the checkpoint, so a restarted job continues after it.
+    Albums are reposted as albums. The job yields whenever live messages are in the pipeline and
+    waits while reposting is switched off.
+    """
+    job = backfill_jobs[job_id]
+    resume_event = backfill_job_resume_events.setdefault(job_id, asyncio.Event())
+    if job["state"] != "paused":
+        resume_event.set()
+    backfill_job_rates[job_id] = (asyncio.get_event_loop().time(), job.get("processed", 0))
+    loop = asyncio.get_event_loop()
+    last_progress = loop.time()
+    
+    try:
+        chat_id = await user_client.get_peer_id(job["source"])
+        if job.get("total") is None:
+            latest = await user_client.get_messages(job["source"], limit=1)
+            job["total"] = getattr(latest, 'total', 0) or 0
+            save_backfill_jobs()
+        
+        album = []
+        
+        async def repost(messages):
+            nonlocal last_progress
+            # Wait while paused, while reposting is off, and whenever live traffic is being processed
+            while job["state"] == "paused":
+                save_backfill_jobs()
+                await update_backfill_job_message(job)
+                await resume_event.wait()
+            while job["state"] == "running" and (not reposting_active or live_messages_in_flight):
+                await asyncio.sleep(0.5)
+            if job["state"] == "cancelled":
+                return
+            
+            if len(messages) > 1:
+                await send_backfill_album(chat_id, messages, job["destinations"])
+            elif not getattr(messages[0], 'action', None):
+                await process_message_event(
+                    SimpleNamespace(chat_id=chat_id, message=messages[0]),
+                    destinations_override=job["destinations"], backfill=True
+                )
+            
+            job["processed"] += len(messages)
+            job["last_message_id"] = messages[-1].id
+            # Saved after every repost (writes are coalesced), so a restart doesn't repost anything twice
+            save_backfill_jobs()
+            if loop.time() - last_progress >= PURGE_PROGRESS_INTERVAL:
+                last_progress = loop.time()
+                await update_backfill_job_message(job)
+            await asyncio.sleep(1.0 / BACKFILL_RATE_PER_SEC)
+        
+        async for message in user_client.iter_messages(job["source"], reverse=True, min_id=job["last_message_id"]):
+            if job["state"] == "cancelled":
+                break
+            # Collect album parts and send them together once the album ends
+            if album and message.grouped_id != album[-1].grouped_id:
+                await repost(album)
+                album = []
+            if message.grouped_id:
+                album.append(message)
+            else:
+                await repost([message])
+        if album and job["state"] != "cancelled":
+            await repost(album)
+        
+        if job["state"] != "cancelled":
+            job["state"] = "completed"
+        logger.info(f"Backfill job {job_id} {job['state']}: {job['processed']} messages")
+    except Exception as e:
+        logger.error(f"Backfill job {job_id} failed: {str(e)}")
+        job["state"] = "failed"
+        job["error"] = str(e)
+    finally:
+        backfill_job_tasks.pop(job_id, None)
+        backfill_job_resume_events.pop(job_id, None)
+        backfill_job_rates.pop(job_id, None)
+        save_backfill_jobs()
+        await update_backfill_job_message(job)
+
+def start_backfill_job(job_id: str):
+    """Start (or restart) the background task for a backfill job"""
+    if job_id in backfill_job_tasks:
+        return
+    backfill_job_tasks[job_id] = asyncio.create_task(run_backfill_job(job_id))
+
+def create_backfill_job(source: Union[int, str], title: str, destinations: List[Union[int, str]], status_message) -> Dict[str, Any]:
+    """Register a new backfill job and start it in the background"""
+    job_id = str(int(datetime.datetime.now().timestamp()))
+    backfill_jobs[job_id] = {
+        "id": job_id,
+        "source": source,
+        "title": title,
+        "destinations": list(destinations),
+        "state": "running",
+        "processed": 0,
+        "total": None,
+        "last_message_id": 0,
+        "status_chat_id": status_message.chat_id if status_message else None,
+        "status_message_id": status_message.message_id if status_message else None,
+        "error": None
+    }
+    save_backfill_jobs()
+    start_backfill_job(job_id)
+    return backfill_jobs[job_id]
+
+def resume_backfill_jobs():
+    """Restart backfill jobs that were still active when the bot last stopped"""
+    resumed = 0
+    for job_id, job in backfill_jobs.items():
+        if job["state"] in ("running", "paused"):
+            start_backfill_job(job_id)
+            resumed += 1
+    if resumed:
+        logger.info(f"Resumed {resumed} backfill job(s) from their checkpoints")
+
+async def send_farewell_sequence(channel_entity):
+    """Post the farewell GIF with credits and a farewell audio track before leaving a channel"""
+    # Import the required constants first
+    try:
+        from assets.farewell.constants import FAREWELL_GIFS, FAREWELL_AUDIO
+        from assets.farewell.constants import CREATOR_NAME, CREATOR_USERNAME, CREATOR_LINK
+        logger.info(f"Loaded farewell constants: {len(FAREWELL_GIFS)} GIFs")
+    except ImportError as import_err:
+        logger.error(f"Could not import farewell constants: {str(import_err)}")
+        # Set defaults if import fails
+        FAREWELL_GIFS = []
+        FAREWELL_AUDIO = "assets/farewell/bye.mp3"
+        CREATOR_NAME = "ªᴹᴷᵁˢᴴ"
+        CREATOR_USERNAME = "@Amkushu"
+        CREATOR_LINK = "https://t.me/Amkushu"
+
+    # Prepare credits message with hyperlink
+    credit_message = f"Bot by <a href='{CREATOR_LINK}'>{CREATOR_NAME}</a>"
+
+    gif_sent = False
+    if FAREWELL_GIFS:
+        try:
+            # Select a random GIF from our globally imported random module
+            random_gif = random.choice(FAREWELL_GIFS)
+            logger.info(f"Selected farewell GIF: {random_gif}")
+
+            # Print debug info
+            logger.info(f"Attempting to send GIF from URL: {random_gif}")
+
+            # Check if it's a URL or local file
+            if random_gif.startswith(('http://', 'https://')):
+                # Try sending message with the GIF as external URL using Telegram's built-in GIF support
+                # Include credits as caption
+                try:
+                    await user_client.send_message(
+                        channel_entity,
+                        credit_message,  # Use credits as caption
+                        file=random_gif,  # URL as file
+                        parse_mode='html'  # Enable HTML for the hyperlink
+                    )
+                    logger.info("Sent farewell GIF with credits caption as URL")
+                    gif_sent = True
+                except Exception as url_err:
+                    logger.error(f"Failed to send GIF as URL: {str(url_err)}")
+
+                    # Alternative: try sending with a different method
+                    try:
+                        await user_client.send_file(
+                            channel_entity,
+                            random_gif,  # URL as file
+                            caption=credit_message,  # Credits as caption
+                            parse_mode='html'  # Enable HTML for the hyperlink
+                        )
+                        logger.info("Sent GIF with credits using send_file")
+                        gif_sent = True
+                    except Exception as file_err:
+                        logger.error(f"Failed to send GIF with send_file: {str(file_err)}")
+
+                        # Last resort: try sending the URL as a text message with credits
+                        try:
+                            await user_client.send_message(
+                                channel_entity,
+                                f"{credit_message}\n\n{random_gif}"  # Credits + URL
+                            )
+                            logger.info("Sent GIF URL with credits as text message")
+                            gif_sent = True
+                        except Exception as txt_err:
+                            logger.error(f"Failed to send GIF URL as text: {str(txt_err)}")
+            else:
+                # Local file path
+                try:
+                    await user_client.send_file(
+                        channel_entity,
+                        random_gif,  # Local file path
+                        caption=credit_message,  # Credits as caption
+                        parse_mode='html'  # Enable HTML for the hyperlink
+                    )
+                    logger.info("Sent farewell GIF from local file with credits caption")
+                    gif_sent = True
+                except Exception as local_err:
+                    logger.error(f"Failed to send local GIF with caption: {str(local_err)}")
+                    # Fallback: send without HTML formatting
+                    try:
+                        await user_client.send_file(
+                            channel_entity,
+                            random_gif,  # Local file path
+                            caption=f"Bot by {CREATOR_NAME} ({CREATOR_USERNAME})"  # Plain text caption
+                        )
+                        logger.info("Sent farewell GIF with plain text credits")
+                        gif_sent = True
+                    except Exception as plain_err:
+                        logger.error(f"Failed to send GIF with plain caption: {str(plain_err)}")
+                        # Last resort: just send the GIF
+                        try:
+                            await user_client.send_file(
+                                channel_entity,
+                                random_gif  # Just the GIF, no caption
+                            )
+                            logger.info("Sent farewell GIF without caption (fallback)")
+                            gif_sent = True
+                        except Exception as no_caption_err:
+                            logger.error(f"Failed to send GIF without caption: {str(no_caption_err)}")
+
+            # Add small delay to ensure correct ordering
+            await asyncio.sleep(1)
+        except Exception as gif_err:
+            logger.error(f"Failed to send GIF: {str(gif_err)}")
+    else:
+        logger.warning("No farewell GIFs available")
+
+    # 3. Send the audio file (even if GIF failed)
+    audio_sent = False
+
+    # Simple, direct audio file selection
+    try:
+        # Explicitly define audio files here for maximum reliability
+        audio_files = [
+            "assets/farewell/laugh_or_cry.m4a",  # First audio file (simplified name)
+            "assets/farewell/piercing_light.mp3"  # Second audio file (simplified name)
+        ]
+
+        # Verify each file exists
+        available_files = []
+        for file in audio_files:
+            if os.path.exists(file):
+                available_files.append(file)
+                logger.info(f"Audio file verified: {file}")
+            else:
+                logger.warning(f"Audio file missing: {file}")
+
+        # Debug output for all available files
+        logger.info(f"Total available audio files: {len(available_files)}")
+
+        if len(available_files) > 0:
+            # Force deterministic choice based on current time 
+            # (will alternate between files)
+            current_second = datetime.datetime.now().second
+            chosen_index = current_second % len(available_files)
+            audio_path = available_files[chosen_index]
+
+            logger.info(f"TIME-BASED SELECTION - Second: {current_second}, Index: {chosen_index}")
+            logger.info(f"SELECTED AUDIO: {audio_path}")
+        else:
+            # Emergency fallback if no files exist
+            audio_path = "assets/farewell/bye.mp3"  # Default minimal audio
+            logger.warning(f"No audio files available, using emergency fallback: {audio_path}")
+    except Exception as audio_err:
+        # Last resort fallback
+        audio_path = "assets/farewell/bye.mp3"
+        logger.error(f"Critical audio selection error: {str(audio_err)}")
+        logger.error(f"Using emergency fallback audio: {audio_path}")
+
+    # Add a small delay regardless of whether GIF was sent
+    await asyncio.sleep(1)
+
+    # Check if audio file exists
+    if os.path.exists(audio_path):
+        logger.info(f"Found audio file at path: {audio_path}")
+        try:
+            # Try different ways to send the audio
+            try:
+                # First attempt: Send as regular audio file
+                await user_client.send_file(
+                    channel_entity,
+                    audio_path,
+                    voice_note=False,
+                    attributes=[DocumentAttributeAudio(
+                        duration=60,  # Approximate duration in seconds
+                        title="Farewell Audio",
+                        performer="Bot"
+                    )]
+                )
+                logger.info("Sent farewell audio successfully")
+                audio_sent = True
+            except Exception as attr_err:
+                logger.error(f"Failed to send audio with attributes: {str(attr_err)}")
+
+                # Second attempt: Send without attributes
+                try:
+                    await user_client.send_file(
+                        channel_entity,
+                        audio_path,
+                        voice_note=False
+                    )
+                    logger.info("Sent farewell audio without attributes")
+                    audio_sent = True
+                except Exception as simple_err:
+                    logger.error(f"Failed to send simple audio: {str(simple_err)}")
+
+                    # Third attempt: Try as voice note
+                    try:
+                        await user_client.send_file(
+                            channel_entity,
+                            audio_path,
+                            voice_note=True
+                        )
+                        logger.info("Sent farewell audio as voice note")
+                        audio_sent = True
+                    except Exception as voice_err:
+                        logger.error(f"Failed to send as voice note: {str(voice_err)}")
+        except Exception as audio_err:
+            logger.error(f"Failed to send audio: {str(audio_err)}")
+    else:
+        logger.warning(f"Audio file not found at path: {audio_path}")
+
+        # Try to list what files ARE in the assets directory
+        try:
+            import glob
+            audio_files = glob.glob("assets/farewell/*.*")
+            logger.info(f"Files found in farewell directory: {audio_files}")
+        except Exception as list_err:
+            logger.error(f"Error listing audio files: {str(list_err)}")
+    
+    return gif_sent or audio_sent
+
+async def build_route_rule_view(rule_idx: int) -> Tuple[str, InlineKeyboardMarkup]:
+    """Build the text and keyboard for editing a single routing rule"""
+    rule = routing_rules[rule_idx]
+    info = await get_entity_info(user_client, rule["source"])
+    source_name = info.get("title", str(rule["source"])) if info else str(rule["source"])
+    
+    text = f"🧭 Routing Rule #{rule_idx + 1}\n\n"
+    text += f"📡 Source: {source_name}\n"
+    text += f"📝 Keywords: {', '.join(rule.get('keywords', [])) or 'Any'}\n"
+    text += f"🖼️ Message types: {', '.join(rule.get('media_types', [])) or 'Any'}\n\n"
+    if not rule.get("destinations"):
+        text += "⚠️ This rule is inactive until at least one destination is selected.\n\n"
+    text += "Tap a destination to include or exclude it:"
+    
+    keyboard = []
+    rule_destinations = [str(dest) for dest in rule.get("destinations", [])]
+    for dest_idx, dest in enumerate(active_channels["destinations"] or []):
+        dest_info = await get_entity_info(user_client, dest)
+        dest_name = dest_info.get("title", str(dest)) if dest_info else str(dest)
+        status = "✅ " if str(dest) in rule_destinations else "◻️ "
+        keyboard.append([InlineKeyboardButton(f"{status}{dest_name}", callback_data=f"route_dest_{rule_idx}_{dest_idx}")])
+    
+    media_row = []
+    for media_type in ROUTE_MEDIA_TYPES:
+        status = "✅ " if media_type in rule.get("media_types", []) else "◻️ "
+        media_row.append(InlineKeyboardButton(f"{status}{media_type}", callback_data=f"route_media_{rule_idx}_{media_type}"))
+        if len(media_row) == 2:
+            keyboard.append(media_row)
+            media_row = []
+    if media_row:
+        keyboard.append(media_row)
+    
+    keyword_row = [InlineKeyboardButton("📝 Set Keywords", callback_data=f"route_keywords_{rule_idx}")]
+    if rule.get("keywords"):
+        keyword_row.append(InlineKeyboardButton("🧹 Clear Keywords", callback_data=f"route_kwclear_{rule_idx}"))
+    keyboard.append(keyword_row)
+    keyboard.append([InlineKeyboardButton("🗑️ Delete Rule", callback_data=f"route_del_{rule_idx}")])
+    keyboard.append([InlineKeyboardButton("◀️ Back to Routing Rules", callback_data="routing_rules")])
+    
+    return text, InlineKeyboardMarkup(keyboard)
+
+def save_routing_rules():
+    """Persist the routing rules and rebuild the compiled lookup"""
+    BOT_CONFIG["routing_rules"] = routing_rules
+    save_bot_config()
+    compile_routing_table()
+
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle button callbacks including session info"""
     global reposting_active, sync_deletions
@@ -3244,51 +5720,9 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 
                 # Save configuration and show appropriate message
                 if found and removed_channel is not None:
-                    # Save configuration first
+                    # Save configuration; this also unsubscribes the removed source
                     await save_config()
                     
-                    # CRITICAL FIX: Re-register event handlers to ensure removed source is no longer monitored
-                    # This is crucial to ensure the removed source channel doesn't continue triggering events
-                    if user_client and user_client.is_connected():
-                        logger.info("Updating Telegram client event handlers to reflect removed source channel")
-                        
-                        # First remove all existing event handlers for message events
-                        if hasattr(user_client, '_event_builders'):
-                            builders = list(user_client._event_builders)
-                            for builder in builders:
-                                if isinstance(builder[0], (events.NewMessage, events.MessageEdited, events.MessageDeleted)):
-                                    logger.info(f"Removing old event handler for {builder[0].__class__.__name__}")
-                                    user_client.remove_event_handler(builder[1], builder[0])
-                        
-                        # Re-register event handlers with the updated source list
-                        if active_channels["source"]:
-                            logger.info(f"Registering updated event handlers for source channels: {active_channels['source']}")
-                            
-                            # Add handler for new messages
-                            user_client.add_event_handler(
-                                handle_new_message,
-                                events.NewMessage(chats=active_channels["source"])
-                            )
-                            
-                            # Add handler for edited messages
-                            user_client.add_event_handler(
-                                handle_edited_message,
-                                events.MessageEdited(chats=active_channels["source"])
-                            )
-                            
-                            # Add handler for deleted messages (if sync_deletions is enabled)
-                            if BOT_CONFIG.get("sync_deletions", False):
-                                user_client.add_event_handler(
-                                    handle_deleted_message,
-                                    events.MessageDeleted(chats=active_channels["source"])
-                                )
-                                
-                            logger.info("Event handlers successfully updated")
-                        else:
-                            logger.info("No source channels left, not registering any event handlers")
-                    else:
-                        logger.warning("User client not available, couldn't update event handlers")
-                    
                     await query.edit_message_text(
                         f"✅ Successfully removed channel {removed_channel} from sources.\n\nEvent handlers have been updated to stop monitoring this channel.",
                         reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back to Menu", callback_data="back_to_menu")]])
@@ -3361,6 +5795,12 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         if active_channels["destinations"]:
             keyboard.append([InlineKeyboardButton("➖ Remove Destination", callback_data="remove_multi_destination")])
             
+            # Routing rules send sources to a subset of the destinations
+            keyboard.append([InlineKeyboardButton("🧭 Routing Rules", callback_data="routing_rules")])
+            
+            # Backfill copies a source's existing history into destinations
+            keyboard.append([InlineKeyboardButton("📥 Backfill History", callback_data="backfill_menu")])
+            
             # Add nuclear option to clear all destinations
             keyboard.append([InlineKeyboardButton("🧨 Reset All Destinations", callback_data="reset_all_destinations")])
             
@@ -3382,6 +5822,140 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
 
+    elif query.data == "routing_rules":
+        # Overview of the routing rules
+        text = "🧭 Routing Rules\n\n" \
+               "Routing rules send messages from a source to a subset of your destinations, " \
+               "optionally only when the message contains a keyword or is of a given type.\n\n" \
+               "Sources without any rule are still reposted to ALL destinations.\n\n"
+        
+        keyboard = []
+        if routing_rules:
+            # Rules saved with a username source are re-keyed to the numeric id updates carry
+            resolved_any = False
+            for rule in routing_rules:
+                if not str(rule["source"]).strip().lstrip('-').isdigit():
+                    resolved = await resolve_rule_source(rule["source"])
+                    if resolved != rule["source"]:
+                        rule["source"] = resolved
+                        resolved_any = True
+            if resolved_any:
+                save_routing_rules()
+            
+            for idx, rule in enumerate(routing_rules):
+                info = await get_entity_info(user_client, rule["source"])
+                source_name = info.get("title", str(rule["source"])) if info else str(rule["source"])
+                if not rule.get("destinations"):
+                    text += f"{idx + 1}. {source_name} → ⚠️ no destinations (inactive)"
+                else:
+                    text += f"{idx + 1}. {source_name} → {len(rule.get('destinations', []))} destination(s)"
+                if rule.get("keywords"):
+                    text += f", keywords: {', '.join(rule['keywords'])}"
+                if rule.get("media_types"):
+                    text += f", types: {', '.join(rule['media_types'])}"
+                text += "\n"
+                keyboard.append([InlineKeyboardButton(f"✏️ Edit Rule #{idx + 1}", callback_data=f"route_edit_{idx}")])
+        else:
+            text += "No routing rules configured yet."
+        
+        keyboard.append([InlineKeyboardButton("➕ Add Rule", callback_data="route_add")])
+        keyboard.append([InlineKeyboardButton("◀️ Back to Destinations", callback_data="manage_destinations")])
+        
+        await edit_message_smartly(
+            query.message,
+            text,
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+    
+    elif query.data == "route_add":
+        # Choose the source for a new routing rule
+        if not active_channels["source"]:
+            await edit_message_smartly(
+                query.message,
+                "No source channels configured yet.",
+                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back", callback_data="routing_rules")]])
+            )
+            return
+        
+        keyboard = []
+        for channel in active_channels["source"]:
+            info = await get_entity_info(user_client, channel)
+            display_name = info.get("title", str(channel)) if info else str(channel)
+            keyboard.append([InlineKeyboardButton(f"📡 {display_name}", callback_data=f"route_new_{str(channel).strip()}")])
+        keyboard.append([InlineKeyboardButton("◀️ Back", callback_data="routing_rules")])
+        
+        await edit_message_smartly(
+            query.message,
+            "Select the source channel for the new routing rule:",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+    
+    elif query.data.startswith("route_"):
+        # Create, edit or delete a single routing rule
+        try:
+            if query.data.startswith("route_new_"):
+                source = query.data[len("route_new_"):]
+                # Numeric ids like the rest of the configuration; usernames are resolved so the rule can match
+                source_value = await resolve_rule_source(source)
+                routing_rules.append({"source": source_value, "destinations": [], "keywords": [], "media_types": []})
+                rule_idx = len(routing_rules) - 1
+                save_routing_rules()
+            else:
+                parts = query.data.split("_")
+                action = parts[1]
+                rule_idx = int(parts[2])
+                rule = routing_rules[rule_idx]
+                
+                if action == "del":
+                    routing_rules.pop(rule_idx)
+                    save_routing_rules()
+                    await edit_message_smartly(
+                        query.message,
+                        f"✅ Routing rule #{rule_idx + 1} deleted.",
+                        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back to Routing Rules", callback_data="routing_rules")]])
+                    )
+                    return
+                elif action == "keywords":
+                    context.user_data["awaiting"] = "route_keywords"
+                    context.user_data["route_rule_idx"] = rule_idx
+                    await edit_message_smartly(
+                        query.message,
+                        "📝 Send the keywords for this rule, separated by commas.\n\n"
+                        "The rule will only match messages containing at least ONE of these keywords.",
+                        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Cancel", callback_data=f"route_edit_{rule_idx}")]])
+                    )
+                    return
+                elif action == "kwclear":
+                    rule["keywords"] = []
+                    save_routing_rules()
+                elif action == "dest":
+                    dest = (active_channels["destinations"] or [])[int(parts[3])]
+                    rule_destinations = rule.setdefault("destinations", [])
+                    existing = [d for d in rule_destinations if str(d) == str(dest)]
+                    if existing:
+                        rule_destinations.remove(existing[0])
+                    else:
+                        rule_destinations.append(dest)
+                    save_routing_rules()
+                elif action == "media":
+                    media_type = "_".join(parts[3:])
+                    rule_media = rule.setdefault("media_types", [])
+                    if media_type in rule_media:
+                        rule_media.remove(media_type)
+                    else:
+                        rule_media.append(media_type)
+                    save_routing_rules()
+            
+            text, reply_markup = await build_route_rule_view(rule_idx)
+            await edit_message_smartly(query.message, text, reply_markup=reply_markup)
+        except (IndexError, ValueError) as e:
+            logger.error(f"Invalid routing rule callback {query.data}: {str(e)}")
+            await edit_message_smartly(
+                query.message,
+                "❌ This routing rule no longer exists.",
+                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back to Routing Rules", callback_data="routing_rules")]])
+            )
+    
     elif query.data == "reset_all_destinations":
         # This is the "nuclear option" that completely resets all destinations
         # Show a confirmation dialog first
@@ -3865,6 +6439,9 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 [InlineKeyboardButton("🖼️ Media Type Filters", callback_data="media_filters")],
             ])
         
+        # Media admission rules apply before download, independently of the filter toggle
+        keyboard.append([InlineKeyboardButton("📦 Media Size Rules", callback_data="media_rules")])
+        
         keyboard.append([InlineKeyboardButton("◀️ Back to Menu", callback_data="back_to_menu")])
         
         await edit_message_smartly(
@@ -4331,19 +6908,143 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         save_bot_config()
         await edit_message_smartly(
             query.message,
-            "Cleared all include media types.",
-            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back to Media Filters", callback_data="media_filters")]]) 
+            "Cleared all include media types.",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back to Media Filters", callback_data="media_filters")]]) 
+        )
+        
+    elif query.data == "del_exclude_media_all":
+        # Clear all exclude media types
+        content_filters["media_types"]["exclude"] = []
+        BOT_CONFIG["filter_exclude_media"] = []
+        save_bot_config()
+        await edit_message_smartly(
+            query.message,
+            "Cleared all exclude media types.",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back to Media Filters", callback_data="media_filters")]]) 
+        )
+    
+    elif query.data == "media_rules":
+        # Per-source media admission rules (applied before any download)
+        text = "📦 Media Size Rules\n\n" \
+               "These rules are checked BEFORE media is downloaded, using only the file size, " \
+               "MIME type and duration reported by Telegram.\n\n" \
+               "Actions:\n" \
+               "• skip - don't repost the message at all\n" \
+               "• reference - post the caption with a link to the original media\n" \
+               "• slow - download anyway, but in the slow lane\n\n" \
+               "Select a rule to edit:"
+        
+        default_status = "✅" if "default" in media_rules else "◻️"
+        keyboard = [[InlineKeyboardButton(f"{default_status} Default (all sources)", callback_data="media_rule_src_default")]]
+        
+        for channel in active_channels["source"]:
+            info = await get_entity_info(user_client, channel)
+            display_name = info.get("title", str(channel)) if info else str(channel)
+            # Rules are keyed by the numeric id updates carry, so username sources are resolved here
+            channel_str = str(await resolve_rule_source(channel))
+            legacy_key = str(channel).strip()
+            if legacy_key != channel_str and legacy_key in media_rules:
+                media_rules[channel_str] = media_rules.pop(legacy_key)
+                BOT_CONFIG["media_rules"] = media_rules
+                save_bot_config()
+            status = "✅" if channel_str in media_rules else "◻️"
+            keyboard.append([InlineKeyboardButton(f"{status} {display_name}", callback_data=f"media_rule_src_{channel_str}")])
+        
+        keyboard.append([InlineKeyboardButton("◀️ Back to Filters", callback_data="content_filters")])
+        
+        await edit_message_smartly(
+            query.message,
+            text,
+            reply_markup=InlineKeyboardMarkup(keyboard)
         )
+    
+    elif (query.data.startswith("media_rule_src_") or query.data.startswith("media_rule_size_") or
+          query.data.startswith("media_rule_dur_") or query.data.startswith("media_rule_action_") or
+          query.data.startswith("media_rule_mime_") or query.data.startswith("media_rule_clear_")):
+        # Show or update the media admission rule for a single source (or the default rule)
+        if query.data.startswith("media_rule_mime_"):
+            # Format: media_rule_mime_<prefix index>_<source key>
+            mime_idx_str, rule_key = query.data[len("media_rule_mime_"):].split("_", 1)
+        else:
+            rule_key = query.data.split("_", 3)[3]
+        
+        rule = dict(media_rules.get(rule_key, {}))
+        changed = False
+        
+        if query.data.startswith("media_rule_size_"):
+            current = rule.get("max_size_mb")
+            idx = MEDIA_RULE_SIZE_PRESETS_MB.index(current) if current in MEDIA_RULE_SIZE_PRESETS_MB else 0
+            rule["max_size_mb"] = MEDIA_RULE_SIZE_PRESETS_MB[(idx + 1) % len(MEDIA_RULE_SIZE_PRESETS_MB)]
+            changed = True
+        elif query.data.startswith("media_rule_dur_"):
+            current = rule.get("max_duration_sec")
+            idx = MEDIA_RULE_DURATION_PRESETS_SEC.index(current) if current in MEDIA_RULE_DURATION_PRESETS_SEC else 0
+            rule["max_duration_sec"] = MEDIA_RULE_DURATION_PRESETS_SEC[(idx + 1) % len(MEDIA_RULE_DURATION_PRESETS_SEC)]
+            changed = True
+        elif query.data.startswith("media_rule_action_"):
+            current = rule.get("action", "skip")
+            idx = MEDIA_RULE_ACTIONS.index(current) if current in MEDIA_RULE_ACTIONS else 0
+            rule["action"] = MEDIA_RULE_ACTIONS[(idx + 1) % len(MEDIA_RULE_ACTIONS)]
+            changed = True
+        elif query.data.startswith("media_rule_mime_"):
+            prefix = MEDIA_RULE_MIME_PREFIXES[int(mime_idx_str)]
+            blocked = list(rule.get("blocked_mime_prefixes", []))
+            if prefix in blocked:
+                blocked.remove(prefix)
+            else:
+                blocked.append(prefix)
+            rule["blocked_mime_prefixes"] = blocked
+            changed = True
+        elif query.data.startswith("media_rule_clear_"):
+            media_rules.pop(rule_key, None)
+            rule = {}
+            BOT_CONFIG["media_rules"] = media_rules
+            save_bot_config()
+        
+        if changed:
+            rule.setdefault("action", "skip")
+            media_rules[rule_key] = rule
+            BOT_CONFIG["media_rules"] = media_rules
+            save_bot_config()
+        
+        if rule_key == "default":
+            display_name = "Default (all sources)"
+        else:
+            info = await get_entity_info(user_client, rule_key)
+            display_name = info.get("title", rule_key) if info else rule_key
+        
+        max_size = rule.get("max_size_mb")
+        max_duration = rule.get("max_duration_sec")
+        blocked_mimes = rule.get("blocked_mime_prefixes", [])
+        text = f"📦 Media Rule: {display_name}\n\n"
+        text += f"Max size: {f'{max_size} MB' if max_size else 'No limit'}\n"
+        text += f"Max duration: {f'{max_duration}s' if max_duration else 'No limit'}\n"
+        text += f"Blocked MIME types: {', '.join(blocked_mimes) if blocked_mimes else 'None'}\n"
+        text += f"Action when matched: {rule.get('action', 'skip') if rule else 'No rule set'}\n\n"
+        text += "Tap a setting to cycle through its values."
+        
+        keyboard = [
+            [InlineKeyboardButton("📏 Max Size", callback_data=f"media_rule_size_{rule_key}"),
+             InlineKeyboardButton("⏱️ Max Duration", callback_data=f"media_rule_dur_{rule_key}")],
+            [InlineKeyboardButton(f"⚙️ Action: {rule.get('action', 'skip')}", callback_data=f"media_rule_action_{rule_key}")]
+        ]
+        mime_row = []
+        for idx, prefix in enumerate(MEDIA_RULE_MIME_PREFIXES):
+            status = "❌ " if prefix in blocked_mimes else "◻️ "
+            mime_row.append(InlineKeyboardButton(f"{status}{prefix}", callback_data=f"media_rule_mime_{idx}_{rule_key}"))
+            if len(mime_row) == 2:
+                keyboard.append(mime_row)
+                mime_row = []
+        if mime_row:
+            keyboard.append(mime_row)
+        if rule:
+            keyboard.append([InlineKeyboardButton("🗑️ Clear Rule", callback_data=f"media_rule_clear_{rule_key}")])
+        keyboard.append([InlineKeyboardButton("◀️ Back to Media Rules", callback_data="media_rules")])
         
-    elif query.data == "del_exclude_media_all":
-        # Clear all exclude media types
-        content_filters["media_types"]["exclude"] = []
-        BOT_CONFIG["filter_exclude_media"] = []
-        save_bot_config()
         await edit_message_smartly(
             query.message,
-            "Cleared all exclude media types.",
-            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back to Media Filters", callback_data="media_filters")]]) 
+            text,
+            reply_markup=InlineKeyboardMarkup(keyboard)
         )
     
     elif query.data == "deletion_sync":
@@ -4357,6 +7058,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 InlineKeyboardButton("✅ Turn ON", callback_data="deletion_sync_on"),
                 InlineKeyboardButton("❌ Turn OFF", callback_data="deletion_sync_off")
             ],
+            [InlineKeyboardButton("🔁 Reconciliation Report", callback_data="reconcile_report")],
             [InlineKeyboardButton("◀️ Back to Menu", callback_data="back_to_menu")]
         ]
         
@@ -4370,6 +7072,34 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
         
+    elif query.data == "reconcile_report" or query.data == "reconcile_run":
+        if query.data == "reconcile_run":
+            if reconcile_lock.locked():
+                await query.answer("Reconciliation is already running")
+            else:
+                await query.answer("Reconciliation started")
+                asyncio.create_task(reconcile_mapped_messages())
+                await asyncio.sleep(0)  # Let the run take the lock before the report is rendered
+        
+        interval_text = f"every {RECONCILE_INTERVAL_MINUTES} minutes" if RECONCILE_INTERVAL_MINUTES else "disabled"
+        running_text = "⏳ A run is in progress, refresh for the results.\n\n" if reconcile_lock.locked() else ""
+        keyboard = [
+            [
+                InlineKeyboardButton("▶️ Run Now", callback_data="reconcile_run"),
+                InlineKeyboardButton("🔄 Refresh", callback_data="reconcile_report")
+            ],
+            [InlineKeyboardButton("◀️ Back to Deletion Sync", callback_data="deletion_sync")]
+        ]
+        await edit_message_smartly(
+            query.message,
+            f"🔁 Source/Destination Reconciliation\n\n"
+            f"Periodically re-checks the recently reposted messages and repairs edits and deletions "
+            f"whose events were missed (deletions only while deletion sync is on).\n\n"
+            f"Schedule: {interval_text}, at most {RECONCILE_MAX_REPAIRS} repairs per run\n\n"
+            f"{running_text}{format_reconcile_report()}",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+        
     elif query.data == "deletion_sync_on":
         # Turn ON deletion sync
         BOT_CONFIG["sync_deletions"] = True
@@ -5286,6 +8016,161 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         
         context.user_data["awaiting"] = "join_any_channel_input"
         
+    elif query.data == "backfill_menu":
+        # Overview of history backfill jobs
+        text = "📥 History Backfill\n\n" \
+               "Backfill copies the existing history of a source channel, oldest first, into the " \
+               "destinations you choose. Jobs run in the background, give way to live messages and " \
+               "continue from their checkpoint after a restart.\n\n"
+        keyboard = []
+        if not backfill_jobs:
+            text += "No backfill jobs yet."
+        for job in backfill_jobs.values():
+            text += format_backfill_job_status(job) + "\n"
+            if job["state"] in ("running", "paused"):
+                keyboard.append([InlineKeyboardButton(f"⚙️ {job['title']}", callback_data=f"backfill_job_view_{job['id']}")])
+        keyboard.append([InlineKeyboardButton("➕ New Backfill", callback_data="backfill_new")])
+        if any(job["state"] in ("completed", "cancelled", "failed") for job in backfill_jobs.values()):
+            keyboard.append([InlineKeyboardButton("🧹 Clear Finished Jobs", callback_data="backfill_clear")])
+        keyboard.append([InlineKeyboardButton("🔄 Refresh", callback_data="backfill_menu")])
+        keyboard.append([InlineKeyboardButton("◀️ Back to Destinations", callback_data="manage_destinations")])
+        
+        await edit_message_smartly(
+            query.message,
+            text,
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+    
+    elif query.data == "backfill_clear":
+        for job_id in [job_id for job_id, job in backfill_jobs.items() if job["state"] in ("completed", "cancelled", "failed")]:
+            del backfill_jobs[job_id]
+        save_backfill_jobs()
+        await query.answer("Finished backfill jobs cleared")
+        await edit_message_smartly(
+            query.message,
+            "📥 History Backfill\n\nFinished jobs cleared.",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📋 All Backfill Jobs", callback_data="backfill_menu")]])
+        )
+    
+    elif query.data == "backfill_new":
+        # Choose the source whose history should be copied
+        if not active_channels["source"] or not active_channels["destinations"]:
+            await edit_message_smartly(
+                query.message,
+                "Configure at least one source and one destination channel first.",
+                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back", callback_data="backfill_menu")]])
+            )
+            return
+        
+        keyboard = []
+        for idx, channel in enumerate(active_channels["source"]):
+            info = await get_entity_info(user_client, channel)
+            display_name = info.get("title", str(channel)) if info else str(channel)
+            keyboard.append([InlineKeyboardButton(f"📡 {display_name}", callback_data=f"backfill_src_{idx}")])
+        keyboard.append([InlineKeyboardButton("◀️ Back", callback_data="backfill_menu")])
+        
+        await edit_message_smartly(
+            query.message,
+            "Select the source channel to backfill:",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+    
+    elif query.data.startswith("backfill_src_") or query.data.startswith("backfill_dest_"):
+        # Pick the destinations for the backfill draft (all are selected to begin with)
+        if query.data.startswith("backfill_src_"):
+            source_idx = int(query.data[len("backfill_src_"):])
+            if source_idx >= len(active_channels["source"]):
+                await query.answer("Source channel no longer configured")
+                return
+            context.user_data["backfill_draft"] = {
+                "source": active_channels["source"][source_idx],
+                "destinations": list(active_channels["destinations"])
+            }
+        else:
+            draft = context.user_data.get("backfill_draft")
+            dest_idx = int(query.data[len("backfill_dest_"):])
+            if not draft or dest_idx >= len(active_channels["destinations"]):
+                await query.answer("Backfill draft expired, please start again")
+                return
+            dest = active_channels["destinations"][dest_idx]
+            if dest in draft["destinations"]:
+                draft["destinations"].remove(dest)
+            else:
+                draft["destinations"].append(dest)
+        
+        draft = context.user_data["backfill_draft"]
+        info = await get_entity_info(user_client, draft["source"])
+        source_name = info.get("title", str(draft["source"])) if info else str(draft["source"])
+        
+        keyboard = []
+        for idx, dest in enumerate(active_channels["destinations"]):
+            info = await get_entity_info(user_client, dest)
+            display_name = info.get("title", str(dest)) if info else str(dest)
+            mark = "✅" if dest in draft["destinations"] else "⬜"
+            keyboard.append([InlineKeyboardButton(f"{mark} {display_name}", callback_data=f"backfill_dest_{idx}")])
+        if draft["destinations"]:
+            keyboard.append([InlineKeyboardButton("▶️ Start Backfill", callback_data="backfill_start")])
+        keyboard.append([InlineKeyboardButton("◀️ Back", callback_data="backfill_new")])
+        
+        await edit_message_smartly(
+            query.message,
+            f"📥 Backfill {source_name}\n\n"
+            f"Select the destinations that should receive its history "
+            f"(about {BACKFILL_RATE_PER_SEC * 60:.0f} messages per minute):",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+    
+    elif query.data == "backfill_start":
+        draft = context.user_data.pop("backfill_draft", None)
+        if not draft or not draft["destinations"]:
+            await query.answer("Backfill draft expired, please start again")
+            return
+        
+        info = await get_entity_info(user_client, draft["source"])
+        title = info.get("title", str(draft["source"])) if info else str(draft["source"])
+        if any(job["source"] == draft["source"] and job["state"] in ("running", "paused") for job in backfill_jobs.values()):
+            await query.answer(f"A backfill of {title} is already active")
+            return
+        
+        job = create_backfill_job(draft["source"], title, draft["destinations"], query.message)
+        await edit_message_smartly(
+            query.message,
+            f"History Backfill Job\n\n{format_backfill_job_status(job)}",
+            reply_markup=build_backfill_job_keyboard(job)
+        )
+    
+    elif query.data.startswith("backfill_job_"):
+        # backfill_job_<action>_<job id>
+        _, _, action, job_id = query.data.split("_", 3)
+        job = backfill_jobs.get(job_id)
+        if not job:
+            await query.answer("Backfill job not found")
+            return
+        
+        if action == "pause" and job["state"] == "running":
+            job["state"] = "paused"
+            backfill_job_resume_events.get(job_id, asyncio.Event()).clear()
+        elif action == "resume" and job["state"] == "paused":
+            job["state"] = "running"
+            if job_id in backfill_job_resume_events:
+                backfill_job_resume_events[job_id].set()
+            else:
+                start_backfill_job(job_id)
+        elif action == "cancel" and job["state"] in ("running", "paused"):
+            job["state"] = "cancelled"
+            if job_id in backfill_job_resume_events:
+                backfill_job_resume_events[job_id].set()
+        save_backfill_jobs()
+        
+        # Status updates for this job now go to the message the admin is looking at
+        job["status_chat_id"] = query.message.chat_id
+        job["status_message_id"] = query.message.message_id
+        await edit_message_smartly(
+            query.message,
+            f"History Backfill Job\n\n{format_backfill_job_status(job)}",
+            reply_markup=build_backfill_job_keyboard(job)
+        )
+        
     elif query.data == "channel_cleanup_menu":
         # Channel cleanup tools menu
         text = "🧹 Channel Cleanup Tools\n\n"
@@ -5295,6 +8180,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         keyboard = [
             [InlineKeyboardButton("🗑️ Delete All Messages", callback_data="purge_channel_menu")],
             [InlineKeyboardButton("🚪 Delete & Leave Channel", callback_data="purge_and_leave_menu")],
+            [InlineKeyboardButton("📋 Purge Jobs", callback_data="purge_jobs_status")],
             [InlineKeyboardButton("◀️ Back to Channel Management", callback_data="channel_settings_menu")]
         ]
         
@@ -5303,6 +8189,70 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
         
+    elif query.data == "purge_jobs_status":
+        # Overview of background purge jobs
+        text = "📋 Purge Jobs\n\n"
+        keyboard = []
+        if not purge_jobs:
+            text += "No purge jobs yet."
+        for job in purge_jobs.values():
+            text += format_purge_job_status(job) + "\n"
+            if job["state"] in ("running", "paused"):
+                keyboard.append([InlineKeyboardButton(f"⚙️ {job['title']}", callback_data=f"purge_job_view_{job['id']}")])
+        if any(job["state"] in ("completed", "cancelled", "failed") for job in purge_jobs.values()):
+            keyboard.append([InlineKeyboardButton("🧹 Clear Finished Jobs", callback_data="purge_jobs_clear")])
+        keyboard.append([InlineKeyboardButton("🔄 Refresh", callback_data="purge_jobs_status")])
+        keyboard.append([InlineKeyboardButton("◀️ Back to Cleanup Tools", callback_data="channel_cleanup_menu")])
+        
+        await edit_message_smartly(
+            query.message,
+            text,
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+        
+    elif query.data == "purge_jobs_clear":
+        for job_id in [job_id for job_id, job in purge_jobs.items() if job["state"] in ("completed", "cancelled", "failed")]:
+            del purge_jobs[job_id]
+        save_purge_jobs()
+        await query.answer("Finished purge jobs cleared")
+        await edit_message_smartly(
+            query.message,
+            "📋 Purge Jobs\n\nFinished jobs cleared.",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📋 All Purge Jobs", callback_data="purge_jobs_status")]])
+        )
+        
+    elif query.data.startswith("purge_job_"):
+        # purge_job_<action>_<job id>
+        _, _, action, job_id = query.data.split("_", 3)
+        job = purge_jobs.get(job_id)
+        if not job:
+            await query.answer("Purge job not found")
+            return
+        
+        if action == "pause" and job["state"] == "running":
+            job["state"] = "paused"
+            purge_job_resume_events.get(job_id, asyncio.Event()).clear()
+        elif action == "resume" and job["state"] == "paused":
+            job["state"] = "running"
+            if job_id in purge_job_resume_events:
+                purge_job_resume_events[job_id].set()
+            else:
+                start_purge_job(job_id)
+        elif action == "cancel" and job["state"] in ("running", "paused"):
+            job["state"] = "cancelled"
+            if job_id in purge_job_resume_events:
+                purge_job_resume_events[job_id].set()
+        save_purge_jobs()
+        
+        # Status updates for this job now go to the message the admin is looking at
+        job["status_chat_id"] = query.message.chat_id
+        job["status_message_id"] = query.message.message_id
+        await edit_message_smartly(
+            query.message,
+            f"Channel Purge Job\n\n{format_purge_job_status(job)}",
+            reply_markup=build_purge_job_keyboard(job)
+        )
+        
     elif query.data == "purge_channel_menu":
         # Channel purge menu
         text = "🗑️ Channel Message Purge\n\n"
@@ -5521,6 +8471,15 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 channel_id = int(parts[2])
                 return_callback = "purge_channel_menu"
             
+            # Don't start a second purge of a channel that already has one running
+            existing_job = purge_jobs.get(str(abs(channel_id)))
+            if existing_job and existing_job["id"] in purge_job_tasks:
+                await query.edit_message_text(
+                    f"A purge of this channel is already running.\n\n{format_purge_job_status(existing_job)}",
+                    reply_markup=build_purge_job_keyboard(existing_job)
+                )
+                return
+            
             # Start the purge process
             if purge_and_leave:
                 await query.edit_message_text(
@@ -5561,574 +8520,49 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                         "This may take a long time for channels with many messages."
                     )
                     
-                    # Check admin rights first
-                    admin_rights_checked = False
-                    is_admin = False
-                    has_delete_permission = False
-                    
-                    try:
-                        # First try a simple permission check by attempting to delete a single message
-                        # This is more reliable than checking admin lists in many cases
-                        test_messages = await user_client.get_messages(channel_entity, limit=1)
-                        if test_messages and len(test_messages) > 0:
-                            test_message = test_messages[0]
-                            # Don't actually try deleting yet, just check admin status first
-                            try:
-                                # Get admin participants list first
-                                me = await user_client.get_me()
-                                my_id = me.id
-                                
-                                # Try to get admin participants list
-                                participants = await user_client(GetParticipantsRequest(
-                                    channel=channel_entity,
-                                    filter=ChannelParticipantsAdmins(),
-                                    offset=0,
-                                    limit=100,
-                                    hash=0
-                                ))
-                                
-                                # Check if we're in the admin list
-                                found_as_admin = False
-                                for participant in participants.participants:
-                                    if hasattr(participant, 'user_id') and participant.user_id == my_id:
-                                        found_as_admin = True
-                                        # Check for delete messages permission if possible
-                                        if hasattr(participant, 'admin_rights') and hasattr(participant.admin_rights, 'delete_messages'):
-                                            has_delete_permission = participant.admin_rights.delete_messages
-                                        break
-                                
-                                if not found_as_admin:
-                                    # We're definitively not an admin
-                                    is_admin = False
-                                    has_delete_permission = False
-                                    admin_rights_checked = True
-                                    
-                                    await status_msg.edit_text(
-                                        "⚠️ Admin Check Failed!\n\n"
-                                        "You are not an admin in this channel.\n\n"
-                                        "Add your user account as an admin with 'Delete Messages' permission first.",
-                                        reply_markup=InlineKeyboardMarkup([
-                                            [InlineKeyboardButton("◀️ Back to Cleanup Menu", callback_data="channel_cleanup_menu")],
-                                            [InlineKeyboardButton("🏠 Back to Main Menu", callback_data="back_to_menu")]
-                                        ])
-                                    )
-                                    return
-                                elif not has_delete_permission:
-                                    # We're an admin but don't have delete permission
-                                    is_admin = True
-                                    admin_rights_checked = True
-                                    
-                                    await status_msg.edit_text(
-                                        "⚠️ Permission Error!\n\n"
-                                        "Your admin account doesn't have 'Delete Messages' permission.\n\n"
-                                        "Please update your permissions for this channel.",
-                                        reply_markup=InlineKeyboardMarkup([
-                                            [InlineKeyboardButton("◀️ Back to Cleanup Menu", callback_data="channel_cleanup_menu")],
-                                            [InlineKeyboardButton("🏠 Back to Main Menu", callback_data="back_to_menu")]
-                                        ])
-                                    )
-                                    return
-                                
-                                # Now that we know we're an admin with permissions, try deleting a test message
-                                try:
-                                    # Try deleting and immediately catch specific errors
-                                    await user_client.delete_messages(channel_entity, test_message.id)
-                                    # If we get here, we have delete permission confirmed
-                                    is_admin = True
-                                    has_delete_permission = True
-                                    admin_rights_checked = True
-                                    deleted_count += 1  # Count this test deletion
-                                    logger.info("Admin rights confirmed through successful test deletion")
-                                    
-                                    await status_msg.edit_text(
-                                        "✅ Admin rights confirmed!\n\n"
-                                        "Starting message deletion..."
-                                    )
-                                    await asyncio.sleep(1)
-                                except Exception as delete_test_error:
-                                    # Failed to delete even though we should have permission
-                                    logger.error(f"Error in test deletion despite admin status: {str(delete_test_error)}")
-                                    await status_msg.edit_text(
-                                        "⚠️ Error in Admin Check!\n\n"
-                                        f"You have admin rights but couldn't delete messages: {str(delete_test_error)}\n\n"
-                                        "This might be due to channel settings or restrictions.",
-                                        reply_markup=InlineKeyboardMarkup([
-                                            [InlineKeyboardButton("◀️ Back to Cleanup Menu", callback_data="channel_cleanup_menu")],
-                                            [InlineKeyboardButton("🏠 Back to Main Menu", callback_data="back_to_menu")]
-                                        ])
-                                    )
-                                    return
-                            except Exception as admin_check_error:
-                                logger.error(f"Error checking admin status: {str(admin_check_error)}")
-                                # Continue to the next method
-                            except ChatAdminRequiredError:
-                                # This specific error means we're not an admin
-                                is_admin = False
-                                admin_rights_checked = True
-                                logger.info("Admin check failed: User is not an admin in this channel")
-                                
-                                await status_msg.edit_text(
-                                    "⚠️ Permission Error!\n\n"
-                                    "You are not an admin in this channel. Cannot delete messages.\n\n"
-                                    "Please add your user account as an admin with 'Delete Messages' permission first.",
-                                    reply_markup=InlineKeyboardMarkup([
-                                        [InlineKeyboardButton("◀️ Back to Cleanup Menu", callback_data="channel_cleanup_menu")],
-                                        [InlineKeyboardButton("🏠 Back to Main Menu", callback_data="back_to_menu")]
-                                    ])
-                                )
-                                return
-                                
-                            except UserAdminInvalidError:
-                                # This means we're an admin but don't have the right permission
-                                is_admin = True
-                                has_delete_permission = False
-                                admin_rights_checked = True
-                                logger.info("Admin check failed: User is admin but lacks delete permissions")
-                                
-                                await status_msg.edit_text(
-                                    "⚠️ Permission Error!\n\n"
-                                    "Your admin account doesn't have 'Delete Messages' permission.\n\n"
-                                    "Please update your permissions for this channel.",
-                                    reply_markup=InlineKeyboardMarkup([
-                                        [InlineKeyboardButton("◀️ Back to Cleanup Menu", callback_data="channel_cleanup_menu")],
-                                        [InlineKeyboardButton("🏠 Back to Main Menu", callback_data="back_to_menu")]
-                                    ])
-                                )
-                                return
-                            except Exception as test_error:
-                                # Some other error with the test deletion
-                                logger.error(f"Error during test deletion: {str(test_error)}")
-                                # We'll fall back to the admin participant check
-                                pass
-                                
-                    except Exception as get_msg_error:
-                        logger.error(f"Error getting test message: {str(get_msg_error)}")
-                    
-                    # If we couldn't confirm through test deletion, try checking admin status through participant list
-                    if not admin_rights_checked:
-                        try:
-                            # Get our own user info
-                            me = await user_client.get_me()
-                            my_id = me.id
-                            
-                            # Try to get admin participants list
-                            participants = await user_client(GetParticipantsRequest(
-                                channel=channel_entity,
-                                filter=ChannelParticipantsAdmins(),
-                                offset=0,
-                                limit=100,
-                                hash=0
-                            ))
-                                
-                            # Check if we're in the admin list
-                            for participant in participants.participants:
-                                if hasattr(participant, 'user_id') and participant.user_id == my_id:
-                                    is_admin = True
-                                    # Check for delete messages permission if possible
-                                    if hasattr(participant, 'admin_rights') and hasattr(participant.admin_rights, 'delete_messages'):
-                                        has_delete_permission = participant.admin_rights.delete_messages
-                                    else:
-                                        # Assume we have permission if we can't check specifically
-                                        has_delete_permission = True
-                                    break
-                            
-                            if not is_admin:
-                                await status_msg.edit_text(
-                                    "⚠️ Permission Error!\n\n"
-                                    "You are not an admin in this channel. Cannot delete messages.\n\n"
-                                    "Please add your user account as an admin with 'Delete Messages' permission first.",
-                                    reply_markup=InlineKeyboardMarkup([
-                                        [InlineKeyboardButton("◀️ Back to Cleanup Menu", callback_data="channel_cleanup_menu")],
-                                        [InlineKeyboardButton("🏠 Back to Main Menu", callback_data="back_to_menu")]
-                                    ])
-                                )
-                                return
-                                
-                            if not has_delete_permission:
-                                await status_msg.edit_text(
-                                    "⚠️ Permission Error!\n\n"
-                                    "Your admin account doesn't have 'Delete Messages' permission.\n\n"
-                                    "Please update your permissions for this channel.",
-                                    reply_markup=InlineKeyboardMarkup([
-                                        [InlineKeyboardButton("◀️ Back to Cleanup Menu", callback_data="channel_cleanup_menu")],
-                                        [InlineKeyboardButton("🏠 Back to Main Menu", callback_data="back_to_menu")]
-                                    ])
-                                )
-                                return
-                                
-                        except Exception as admin_check_error:
-                            logger.error(f"Error checking admin status: {str(admin_check_error)}")
-                            # We failed to get a definitive answer - warn the user but try anyway
-                            await status_msg.edit_text(
-                                "⚠️ Warning: Could not verify admin status.\n\n"
-                                "Attempting to delete messages anyway, but this may fail if you don't have admin permissions.\n\n"
-                                "Proceeding in 3 seconds..."
-                            )
-                            await asyncio.sleep(3)
-                    
-                    # If we got here, either we know we can delete or we're attempting as a last resort
-                    delete_success = False
-                    try_message_count = 0
-                    
-                    # Start with a limited batch to confirm deletion is working
-                    async for message in user_client.iter_messages(channel_entity, limit=500):
-                        try_message_count += 1
-                        try:
-                            await user_client.delete_messages(channel_entity, message.id)
-                            deleted_count += 1
-                            delete_success = True
-                            
-                            # Update status every 10 messages
-                            if deleted_count % 10 == 0:
-                                try:
-                                    await status_msg.edit_text(
-                                        "🗑️ Channel purge in progress...\n\n"
-                                        f"Deleting messages...\n"
-                                        f"Deleted: {deleted_count} messages"
-                                    )
-                                except Exception as e:
-                                    logger.error(f"Error updating status: {str(e)}")
-                        except Exception as delete_error:
-                            logger.error(f"Error deleting message {message.id}: {str(delete_error)}")
-                            
-                        # If we've tried 10 messages but none were deleted, exit the loop
-                        if try_message_count >= 10 and deleted_count == 0:
-                            # Display error message explaining the issue
-                            await status_msg.edit_text(
-                                "⚠️ Error: Unable to delete any messages.\n\n"
-                                "Possible reasons:\n"
-                                "• Not an admin in this channel\n"
-                                "• Missing delete messages permission\n"
-                                "• Channel is read-only or has restricted permissions\n\n"
-                                "Please check your permissions and try again.",
-                                reply_markup=InlineKeyboardMarkup([
-                                    [InlineKeyboardButton("◀️ Back to Cleanup Menu", callback_data="channel_cleanup_menu")],
-                                    [InlineKeyboardButton("🏠 Back to Main Menu", callback_data="back_to_menu")]
-                                ])
-                            )
-                            return
+                    # Check our own rights with a single GetParticipant call (refreshed, since this is destructive)
+                    rights = await get_self_rights(channel_entity, refresh=True)
                     
-                    # If purge and leave, post farewell sticker and leave the channel
-                    if purge_and_leave:
-                        sticker_success = False
-                        try:
-                            # Post farewell sticker
-                            await status_msg.edit_text(
-                                "🗑️ Purge completed. Posting farewell sticker..."
-                            )
-                            
-                            
-                            # New farewell sequence as requested
-                            await status_msg.edit_text(
-                                "🗑️ Purge completed. Sending farewell sequence..."
-                            )
-                            
-                            # Import the required constants first
-                            try:
-                                from assets.farewell.constants import FAREWELL_GIFS, FAREWELL_AUDIO
-                                from assets.farewell.constants import CREATOR_NAME, CREATOR_USERNAME, CREATOR_LINK
-                                logger.info(f"Loaded farewell constants: {len(FAREWELL_GIFS)} GIFs")
-                            except ImportError as import_err:
-                                logger.error(f"Could not import farewell constants: {str(import_err)}")
-                                # Set defaults if import fails
-                                FAREWELL_GIFS = []
-                                FAREWELL_AUDIO = "assets/farewell/bye.mp3"
-                                CREATOR_NAME = "ªᴹᴷᵁˢᴴ"
-                                CREATOR_USERNAME = "@Amkushu"
-                                CREATOR_LINK = "https://t.me/Amkushu"
-                            
-                            # Prepare credits message with hyperlink
-                            credit_message = f"Bot by <a href='{CREATOR_LINK}'>{CREATOR_NAME}</a>"
-                            credit_sent = False
-                            
-                            # We'll send the credits as part of the GIF if leaving
-                            if purge_and_leave:
-                                # Skip standalone credits message - it will be included with GIF
-                                credit_sent = True
-                                logger.info("Skipping standalone credits - will include with GIF")
-                            else:
-                                # For regular purge (not leaving), send credits as a message
-                                try:
-                                    await user_client.send_message(
-                                        channel_entity,
-                                        credit_message,
-                                        parse_mode='html'
-                                    )
-                                    logger.info("Sent credits message with hyperlink")
-                                    credit_sent = True
-                                except Exception as cred_err:
-                                    logger.error(f"Failed to send credits with HTML formatting: {str(cred_err)}")
-                                    # Try plain text as fallback
-                                    try:
-                                        await user_client.send_message(
-                                            channel_entity,
-                                            f"Bot by {CREATOR_NAME} ({CREATOR_USERNAME})"
-                                        )
-                                        logger.info("Sent plain text credits (fallback)")
-                                        credit_sent = True
-                                    except Exception as plain_err:
-                                        logger.error(f"Failed to send plain text credits: {str(plain_err)}")
-                            
-                            # Check if we should continue with the full farewell sequence
-                            if purge_and_leave:
-                                gif_sent = False
-                                if FAREWELL_GIFS:
-                                    try:
-                                        # Select a random GIF from our globally imported random module
-                                        random_gif = random.choice(FAREWELL_GIFS)
-                                        logger.info(f"Selected farewell GIF: {random_gif}")
-                                        
-                                        # Print debug info
-                                        logger.info(f"Attempting to send GIF from URL: {random_gif}")
-                                        
-                                        # Check if it's a URL or local file
-                                        if random_gif.startswith(('http://', 'https://')):
-                                            # Try sending message with the GIF as external URL using Telegram's built-in GIF support
-                                            # Include credits as caption
-                                            try:
-                                                await user_client.send_message(
-                                                    channel_entity,
-                                                    credit_message,  # Use credits as caption
-                                                    file=random_gif,  # URL as file
-                                                    parse_mode='html'  # Enable HTML for the hyperlink
-                                                )
-                                                logger.info("Sent farewell GIF with credits caption as URL")
-                                                gif_sent = True
-                                            except Exception as url_err:
-                                                logger.error(f"Failed to send GIF as URL: {str(url_err)}")
-                                                
-                                                # Alternative: try sending with a different method
-                                                try:
-                                                    await user_client.send_file(
-                                                        channel_entity,
-                                                        random_gif,  # URL as file
-                                                        caption=credit_message,  # Credits as caption
-                                                        parse_mode='html'  # Enable HTML for the hyperlink
-                                                    )
-                                                    logger.info("Sent GIF with credits using send_file")
-                                                    gif_sent = True
-                                                except Exception as file_err:
-                                                    logger.error(f"Failed to send GIF with send_file: {str(file_err)}")
-                                                    
-                                                    # Last resort: try sending the URL as a text message with credits
-                                                    try:
-                                                        await user_client.send_message(
-                                                            channel_entity,
-                                                            f"{credit_message}\n\n{random_gif}"  # Credits + URL
-                                                        )
-                                                        logger.info("Sent GIF URL with credits as text message")
-                                                        gif_sent = True
-                                                    except Exception as txt_err:
-                                                        logger.error(f"Failed to send GIF URL as text: {str(txt_err)}")
-                                        else:
-                                            # Local file path
-                                            try:
-                                                await user_client.send_file(
-                                                    channel_entity,
-                                                    random_gif,  # Local file path
-                                                    caption=credit_message,  # Credits as caption
-                                                    parse_mode='html'  # Enable HTML for the hyperlink
-                                                )
-                                                logger.info("Sent farewell GIF from local file with credits caption")
-                                                gif_sent = True
-                                            except Exception as local_err:
-                                                logger.error(f"Failed to send local GIF with caption: {str(local_err)}")
-                                                # Fallback: send without HTML formatting
-                                                try:
-                                                    await user_client.send_file(
-                                                        channel_entity,
-                                                        random_gif,  # Local file path
-                                                        caption=f"Bot by {CREATOR_NAME} ({CREATOR_USERNAME})"  # Plain text caption
-                                                    )
-                                                    logger.info("Sent farewell GIF with plain text credits")
-                                                    gif_sent = True
-                                                except Exception as plain_err:
-                                                    logger.error(f"Failed to send GIF with plain caption: {str(plain_err)}")
-                                                    # Last resort: just send the GIF
-                                                    try:
-                                                        await user_client.send_file(
-                                                            channel_entity,
-                                                            random_gif  # Just the GIF, no caption
-                                                        )
-                                                        logger.info("Sent farewell GIF without caption (fallback)")
-                                                        gif_sent = True
-                                                    except Exception as no_caption_err:
-                                                        logger.error(f"Failed to send GIF without caption: {str(no_caption_err)}")
-                                        
-                                        # Add small delay to ensure correct ordering
-                                        await asyncio.sleep(1)
-                                    except Exception as gif_err:
-                                        logger.error(f"Failed to send GIF: {str(gif_err)}")
-                                else:
-                                    logger.warning("No farewell GIFs available")
-                                
-                                # 3. Send the audio file (even if GIF failed)
-                                audio_sent = False
-                                
-                                # Simple, direct audio file selection
-                                try:
-                                    # Explicitly define audio files here for maximum reliability
-                                    audio_files = [
-                                        "assets/farewell/laugh_or_cry.m4a",  # First audio file (simplified name)
-                                        "assets/farewell/piercing_light.mp3"  # Second audio file (simplified name)
-                                    ]
-                                    
-                                    # Verify each file exists
-                                    available_files = []
-                                    for file in audio_files:
-                                        if os.path.exists(file):
-                                            available_files.append(file)
-                                            logger.info(f"Audio file verified: {file}")
-                                        else:
-                                            logger.warning(f"Audio file missing: {file}")
-                                    
-                                    # Debug output for all available files
-                                    logger.info(f"Total available audio files: {len(available_files)}")
-                                    
-                                    if len(available_files) > 0:
-                                        # Force deterministic choice based on current time 
-                                        # (will alternate between files)
-                                        current_second = datetime.datetime.now().second
-                                        chosen_index = current_second % len(available_files)
-                                        audio_path = available_files[chosen_index]
-                                        
-                                        logger.info(f"TIME-BASED SELECTION - Second: {current_second}, Index: {chosen_index}")
-                                        logger.info(f"SELECTED AUDIO: {audio_path}")
-                                    else:
-                                        # Emergency fallback if no files exist
-                                        audio_path = "assets/farewell/bye.mp3"  # Default minimal audio
-                                        logger.warning(f"No audio files available, using emergency fallback: {audio_path}")
-                                except Exception as audio_err:
-                                    # Last resort fallback
-                                    audio_path = "assets/farewell/bye.mp3"
-                                    logger.error(f"Critical audio selection error: {str(audio_err)}")
-                                    logger.error(f"Using emergency fallback audio: {audio_path}")
-                                
-                                # Add a small delay regardless of whether GIF was sent
-                                await asyncio.sleep(1)
-                                
-                                # Check if audio file exists
-                                if os.path.exists(audio_path):
-                                    logger.info(f"Found audio file at path: {audio_path}")
-                                    try:
-                                        # Try different ways to send the audio
-                                        try:
-                                            # First attempt: Send as regular audio file
-                                            await user_client.send_file(
-                                                channel_entity,
-                                                audio_path,
-                                                voice_note=False,
-                                                attributes=[DocumentAttributeAudio(
-                                                    duration=60,  # Approximate duration in seconds
-                                                    title="Farewell Audio",
-                                                    performer="Bot"
-                                                )]
-                                            )
-                                            logger.info("Sent farewell audio successfully")
-                                            audio_sent = True
-                                        except Exception as attr_err:
-                                            logger.error(f"Failed to send audio with attributes: {str(attr_err)}")
-                                            
-                                            # Second attempt: Send without attributes
-                                            try:
-                                                await user_client.send_file(
-                                                    channel_entity,
-                                                    audio_path,
-                                                    voice_note=False
-                                                )
-                                                logger.info("Sent farewell audio without attributes")
-                                                audio_sent = True
-                                            except Exception as simple_err:
-                                                logger.error(f"Failed to send simple audio: {str(simple_err)}")
-                                                
-                                                # Third attempt: Try as voice note
-                                                try:
-                                                    await user_client.send_file(
-                                                        channel_entity,
-                                                        audio_path,
-                                                        voice_note=True
-                                                    )
-                                                    logger.info("Sent farewell audio as voice note")
-                                                    audio_sent = True
-                                                except Exception as voice_err:
-                                                    logger.error(f"Failed to send as voice note: {str(voice_err)}")
-                                    except Exception as audio_err:
-                                        logger.error(f"Failed to send audio: {str(audio_err)}")
-                                else:
-                                    logger.warning(f"Audio file not found at path: {audio_path}")
-                                    
-                                    # Try to list what files ARE in the assets directory
-                                    try:
-                                        import glob
-                                        audio_files = glob.glob("assets/farewell/*.*")
-                                        logger.info(f"Files found in farewell directory: {audio_files}")
-                                    except Exception as list_err:
-                                        logger.error(f"Error listing audio files: {str(list_err)}")
-                                
-                                # 4. Now prepare to leave the channel
-                                try:
-                                    # Use a different message each time to avoid "message not modified" error
-                                    await status_msg.edit_text(
-                                        f"👋 Leaving channel... ({random.randint(1000, 9999)})"
-                                    )
-                                except Exception as msg_err:
-                                    logger.error(f"Status message update error: {str(msg_err)}")
-                            else:
-                                # For regular purge (not leaving), we only show credits
-                                logger.info("Message purge completed without leaving")
-                                
-                            # Leave the channel
-                            try:
-                                # Use a timestamp to make each message unique
-                                await status_msg.edit_text(
-                                    f"👋 Leaving channel... ({random.randint(1000, 9999)})"
-                                )
-                            except Exception as msg_err:
-                                logger.error(f"Update error when preparing to leave: {str(msg_err)}")
-                            
-                            # Small delay before leaving
-                            await asyncio.sleep(1)
-                            
-                            # Leave the channel
-                            await user_client.delete_dialog(channel_entity)
-                            
-                            # Final completion message
-                            farewell_status = "Posted farewell message" if sticker_success else "Skipped farewell message (error)"
-                            await status_msg.edit_text(
-                                f"✅ Operation completed successfully!\n\n"
-                                f"• Deleted {deleted_count} messages\n"
-                                f"• {farewell_status}\n"
-                                f"• Left the channel\n\n"
-                                f"Return to menu to continue using the bot.",
-                                reply_markup=InlineKeyboardMarkup([
-                                    [InlineKeyboardButton("◀️ Back to Cleanup Menu", callback_data="channel_cleanup_menu")],
-                                    [InlineKeyboardButton("🏠 Back to Main Menu", callback_data="back_to_menu")]
-                                ])
-                            )
-                        except Exception as leave_error:
-                            logger.error(f"Error during leave process: {str(leave_error)}")
-                            await status_msg.edit_text(
-                                f"⚠️ Partial completion!\n\n"
-                                f"• Successfully deleted {deleted_count} messages\n"
-                                f"• Error during leave process: {str(leave_error)}\n\n"
-                                f"You may need to manually leave the channel.",
-                                reply_markup=InlineKeyboardMarkup([
-                                    [InlineKeyboardButton("◀️ Back to Cleanup Menu", callback_data="channel_cleanup_menu")],
-                                    [InlineKeyboardButton("🏠 Back to Main Menu", callback_data="back_to_menu")]
-                                ])
-                            )
-                    else:
-                        # Regular purge completion message
+                    if rights is None:
+                        # We failed to get a definitive answer - warn the user but try anyway
+                        await status_msg.edit_text(
+                            "⚠️ Warning: Could not verify admin status.\n\n"
+                            "Attempting to delete messages anyway, but this may fail if you don't have admin permissions.\n\n"
+                            "Proceeding in 3 seconds..."
+                        )
+                        await asyncio.sleep(3)
+                    elif not rights["is_admin"]:
+                        await status_msg.edit_text(
+                            "⚠️ Admin Check Failed!\n\n"
+                            "You are not an admin in this channel.\n\n"
+                            "Add your user account as an admin with 'Delete Messages' permission first.",
+                            reply_markup=InlineKeyboardMarkup([
+                                [InlineKeyboardButton("◀️ Back to Cleanup Menu", callback_data="channel_cleanup_menu")],
+                                [InlineKeyboardButton("🏠 Back to Main Menu", callback_data="back_to_menu")]
+                            ])
+                        )
+                        return
+                    elif not rights["delete_messages"]:
                         await status_msg.edit_text(
-                            f"✅ Channel purge completed!\n\n"
-                            f"Successfully deleted {deleted_count} messages.\n\n"
-                            f"A credits message has been posted in the channel.\n\n"
-                            f"Return to menu to continue using the bot.",
+                            "⚠️ Permission Error!\n\n"
+                            "Your admin account doesn't have 'Delete Messages' permission.\n\n"
+                            "Please update your permissions for this channel.",
                             reply_markup=InlineKeyboardMarkup([
-                                [InlineKeyboardButton("◀️ Back to Purge Menu", callback_data=return_callback)],
+                                [InlineKeyboardButton("◀️ Back to Cleanup Menu", callback_data="channel_cleanup_menu")],
                                 [InlineKeyboardButton("🏠 Back to Main Menu", callback_data="back_to_menu")]
                             ])
                         )
+                        return
+                    
+                    # If we got here, either we know we can delete or we're attempting as a last resort.
+                    # The purge itself runs as a background job so this handler returns immediately.
+                    title = getattr(channel_entity, 'title', str(channel_id))
+                    job = create_purge_job(channel_id, title, purge_and_leave, status_msg, deleted_count)
+                    await status_msg.edit_text(
+                        f"Channel Purge Job\n\n{format_purge_job_status(job)}\n"
+                        "The purge continues in the background and resumes after a restart.",
+                        reply_markup=build_purge_job_keyboard(job)
+                    )
                 except Exception as e:
                     await status_msg.edit_text(
                         f"❌ Error during purge: {str(e)}\n\n"
@@ -6280,6 +8714,10 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             InlineKeyboardButton("➕ Add New Session", callback_data="add_session")
         ])
         
+        session_buttons.append([
+            InlineKeyboardButton("📈 Pipeline Stats", callback_data="pipeline_stats")
+        ])
+        
         # Add back button
         session_buttons.append([
             InlineKeyboardButton("◀️ Back to Menu", callback_data="back_to_menu")
@@ -6290,6 +8728,82 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             reply_markup=InlineKeyboardMarkup(session_buttons)
         )
         
+    elif query.data == "pipeline_stats":
+        # Media pipeline load: admission budget and media cache
+        waited = media_budget_stats["waited"]
+        average_wait = media_budget_stats["total_wait"] / waited if waited else 0
+        text = "📈 Pipeline Stats\n\n"
+        text += "Media admission:\n"
+        text += f"• In flight: {media_budget_stats['bytes_in_flight'] / (1024 * 1024):.1f} / {MEDIA_BUDGET_BYTES // (1024 * 1024)} MB, "
+        text += f"{media_budget_stats['downloads_in_flight']} / {MAX_CONCURRENT_DOWNLOADS} downloads\n"
+        text += f"• Queued now: {len(media_budget_waiters)}\n"
+        text += f"• Admitted: {media_budget_stats['admitted']} ({waited} had to wait)\n"
+        text += f"• Wait: {average_wait:.1f}s average, {media_budget_stats['max_wait']:.1f}s max\n\n"
+        text += "Delivery lanes:\n"
+        for lane in DELIVERY_LANES:
+            stats = lane_stats[lane]
+            text += f"• {lane}: {stats['active']} / {LANE_CONCURRENCY[lane]} active, {stats['queued']} queued, {stats['done']} done\n"
+        text += "\n"
+        text += f"Retry queue: {len(retry_queue)} pending, {len(dead_letters)} dead-lettered\n\n"
+        open_breakers = {dest: breaker for dest, breaker in destination_breakers.items() if breaker["state"] != "closed"}
+        if open_breakers:
+            text += "Unavailable destinations:\n"
+            for dest, breaker in open_breakers.items():
+                text += f"• {dest} ({breaker['state']}, {breaker['skipped']} skipped): {breaker['last_error']}\n"
+            text += "\n"
+        text += "Media cache:\n"
+        text += f"• Files: {len(media_cache)}, {sum(e['size'] for e in media_cache.values()) / (1024 * 1024):.1f} / {MEDIA_CACHE_MAX_BYTES // (1024 * 1024)} MB\n"
+        text += f"• Hits: {media_cache_stats['hits']}, misses: {media_cache_stats['misses']}, "
+        text += f"deduplicated: {media_cache_stats['deduplicated']}, evictions: {media_cache_stats['evictions']}\n"
+        
+        keyboard = [
+            [InlineKeyboardButton("☠️ Dead Letters", callback_data="dead_letters")],
+            [InlineKeyboardButton("🔄 Refresh", callback_data="pipeline_stats")],
+            [InlineKeyboardButton("◀️ Back to Session Info", callback_data="session_info")]
+        ]
+        await edit_message_smartly(
+            query.message,
+            text,
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+        
+    elif query.data in ("dead_letters", "dead_letters_retry", "dead_letters_clear"):
+        # Deliveries that failed permanently or ran out of retries
+        if query.data == "dead_letters_retry":
+            for entry in dead_letters:
+                entry["attempts"] = 0
+                entry["next_attempt_at"] = 0
+                retry_queue[f"{entry['source']}:{entry['message_id']}:{entry['destination']}"] = entry
+            dead_letters.clear()
+            schedule_state_save(notify_listeners=False)
+            await query.answer("Dead letters moved back to the retry queue")
+        elif query.data == "dead_letters_clear":
+            dead_letters.clear()
+            schedule_state_save(notify_listeners=False)
+            await query.answer("Dead letters cleared")
+        
+        text = "☠️ Dead Letters\n\n"
+        if not dead_letters:
+            text += "No failed deliveries."
+        for entry in dead_letters[-15:]:
+            text += f"• Message {entry['message_id']} from {entry['source']} → {entry['destination']}\n"
+            text += f"  {entry['error_class']} after {entry['attempts']} attempt(s): {entry['last_error']}\n"
+        if len(dead_letters) > 15:
+            text += f"\n...and {len(dead_letters) - 15} older"
+        
+        keyboard = []
+        if dead_letters:
+            keyboard.append([
+                InlineKeyboardButton("🔁 Retry All", callback_data="dead_letters_retry"),
+                InlineKeyboardButton("🧹 Clear", callback_data="dead_letters_clear")
+            ])
+        keyboard.append([InlineKeyboardButton("◀️ Back to Pipeline Stats", callback_data="pipeline_stats")])
+        await edit_message_smartly(
+            query.message,
+            text,
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+        
     elif query.data == "auto_add_tags":
         # Auto-add common tag formats for the destination channel
         destination_tag = None
@@ -7400,6 +9914,25 @@ async def handle_text_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
         # Clear awaiting state
         context.user_data.pop("awaiting", None)
     
+    elif awaiting == "route_keywords":
+        # Handle keywords for a routing rule
+        rule_idx = context.user_data.pop("route_rule_idx", None)
+        keywords = [kw.strip() for kw in update.message.text.split(",") if kw.strip()]
+        
+        if rule_idx is None or rule_idx >= len(routing_rules):
+            await update.message.reply_text(
+                "❌ This routing rule no longer exists.",
+                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back to Routing Rules", callback_data="routing_rules")]])
+            )
+        else:
+            routing_rules[rule_idx]["keywords"] = keywords
+            save_routing_rules()
+            text, reply_markup = await build_route_rule_view(rule_idx)
+            await update.message.reply_text(text, reply_markup=reply_markup)
+        
+        # Clear awaiting state
+        context.user_data.pop("awaiting", None)
+    
     elif awaiting == "admin_id":
         # Handle admin ID input
         admin_input = update.message.text.strip()
@@ -7727,52 +10260,11 @@ async def setup_client():
             except Exception as e:
                 logger.error(f"Error joining destination channel: {str(e)}")
     
-    # First remove all existing handlers if any exist
-    if hasattr(user_client, '_event_builders'):
-        builders = list(user_client._event_builders) if user_client._event_builders else []
-        logger.info(f"Cleaning up {len(builders)} existing event handlers")
-        for builder in builders:
-            try:
-                user_client.remove_event_handler(builder[1], builder[0])
-            except Exception as e:
-                logger.error(f"Error removing event handler: {e}")
-    
-    # Register a global event handler for debugging
-    async def debug_all_events(event):
-        logger.info(f"DEBUG: Received ANY event from ANY chat: {event.__class__.__name__}")
-        logger.info(f"DEBUG: Chat ID: {event.chat_id if hasattr(event, 'chat_id') else 'Unknown'}")
-        logger.info(f"DEBUG: Message: {event.message.text if hasattr(event, 'message') and hasattr(event.message, 'text') else 'No text'}")
-        
-    # Add this debugging handler
-    user_client.add_event_handler(debug_all_events, events.NewMessage())
-    logger.info("Registered global debug handler for ALL events")
+    # Register the source dispatcher (logs every update only when debug_all_events is enabled)
+    await apply_source_channels()
     
-    # Register event handlers if source channels are configured
-    if active_channels["source"]:
-        logger.info(f"Registering event handlers for source channels: {active_channels['source']}")
-        
-        # Register handler for new messages
-        user_client.add_event_handler(
-            handle_new_message,
-            events.NewMessage(chats=active_channels["source"])
-        )
-        logger.info("Registered handler for new messages")
-        
-        # Register handler for edited messages
-        user_client.add_event_handler(
-            handle_edited_message,
-            events.MessageEdited(chats=active_channels["source"])
-        )
-        logger.info("Registered handler for edited messages")
-        
-        # Register handler for deleted messages
-        user_client.add_event_handler(
-            handle_deleted_message,
-            events.MessageDeleted(chats=active_channels["source"])
-        )
-        logger.info("Registered handler for message deletions")
-    else:
-        logger.warning("No source channels configured, event handler not registered")
+    # Recover updates missed during downtime now that the dispatcher is listening
+    await catch_up_updates()
     
     # Register handler for any incoming message (for debugging)
     logger.info("User client has been set up and started")
@@ -7814,11 +10306,27 @@ async def start_bot():
         asyncio.create_task(periodic_cache_cleanup())
         logger.info("Started periodic cache cleanup task")
         
+        # Pick up purge jobs interrupted by the last shutdown
+        resume_purge_jobs()
+        sweep_media_temp_dirs()
+        resume_backfill_jobs()
+        asyncio.create_task(periodic_reconciliation())
+        asyncio.create_task(retry_queue_worker())
+        
+        # Apply channel configuration changes made outside the admin bot
+        start_config_reloaders()
+        
+        # Repost whatever the sources posted while we were down
+        asyncio.create_task(catch_up_missed_messages())
+        
         # Keep the script running
         await asyncio.Event().wait()
     except Exception as e:
         logger.error(f"Error starting bot: {str(e)}")
         raise
+    finally:
+        # Write any pending runtime state before exiting
+        await flush_state()
     
 def run_bot():
     """Run the bot - used as a simple entry point in main.py"""
@@ -2,6 +2,8 @@ import os
 from dotenv import load_dotenv
 import logging
 import json
+import asyncio
+import tempfile
 
 # Load environment variables
 load_dotenv()
@@ -69,15 +71,135 @@ except json.JSONDecodeError:
     logger.error("Invalid bot configuration format. Please check the BOT_CONFIG environment variable.")
     BOT_CONFIG = {"CLEAN_MODE": "false", "sync_deletions": False}
 
+# Runtime state (channels, tags, admins, bot settings) is kept in its own file, separate from the secrets in .env
+STATE_FILE = os.getenv("STATE_FILE", "bot_state.json")
+STATE_SAVE_DELAY = 1.0  # Seconds to coalesce rapid changes into a single write
+STATE_SAVE_RETRY_DELAY = 10.0  # Seconds before a failed write is tried again
+
+def load_state_file() -> dict:
+    """Load the runtime state file, returning an empty dict if it doesn't exist yet"""
+    try:
+        with open(STATE_FILE, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.error(f"Failed to load runtime state from {STATE_FILE}: {str(e)}")
+        return {}
+
+# Saved runtime state takes precedence over the initial values in the environment
+_saved_state = load_state_file()
+if _saved_state:
+    CHANNEL_CONFIG = _saved_state.get("channel_config", CHANNEL_CONFIG)
+    TAG_CONFIG = _saved_state.get("tag_config", TAG_CONFIG)
+    ADMIN_USERS = _saved_state.get("admin_users", ADMIN_USERS)
+    BOT_CONFIG = _saved_state.get("bot_config", BOT_CONFIG)
+    logger.info(f"Loaded runtime state from {STATE_FILE}")
+
+# Each section of the state file is read from its in-memory owner at write time
+_state_providers = {
+    "admin_users": lambda: ADMIN_USERS,
+    "bot_config": lambda: BOT_CONFIG
+}
+_state_save_task = None
+_state_write_lock = asyncio.Lock()
+_state_generation = 0  # Bumped on every change to the in-memory state
+_saved_generation = 0  # Generation of the state last written to disk
+_config_listeners = []
+
+def add_config_listener(listener):
+    """Register a callable run whenever runtime state changes, before the change is written"""
+    _config_listeners.append(listener)
+
+def register_state_section(name: str, provider):
+    """Register a callable returning the current value of a state file section"""
+    _state_providers[name] = provider
+
+def _write_state_file(state_json: str):
+    """Atomically replace the state file: write a temp file in the same directory, fsync, then rename"""
+    state_dir = os.path.dirname(os.path.abspath(STATE_FILE))
+    fd, tmp_path = tempfile.mkstemp(dir=state_dir, prefix=".bot_state.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(state_json)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, STATE_FILE)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def state_save_pending() -> bool:
+    """Whether the in-memory state has changes not yet written to the state file"""
+    return _saved_generation < _state_generation
+
+def update_state_sections(sections: dict):
+    """
+    Replace whole sections of the state file, keeping every other section as it is
+    
+    For maintenance scripts, which only know a few of the sections the bot writes. Run them
+    while the bot is stopped, or the bot's next save overwrites the change.
+    """
+    state = load_state_file()
+    state.update(sections)
+    _write_state_file(json.dumps(state))
+
+async def flush_state():
+    """Write the current in-memory state to disk now, off the event loop"""
+    global _state_save_task, _saved_generation
+    _state_save_task = None
+    # Snapshot on the loop so the written state is consistent, then do the file I/O in a thread
+    generation = _state_generation
+    state_json = json.dumps({name: provider() for name, provider in _state_providers.items()})
+    async with _state_write_lock:
+        try:
+            await asyncio.to_thread(_write_state_file, state_json)
+            _saved_generation = max(_saved_generation, generation)
+            logger.info(f"✅ Saved runtime state to {STATE_FILE}")
+        except Exception as e:
+            logger.error(f"❌ Failed to save runtime state to {STATE_FILE}: {str(e)}")
+            # Try again later unless a newer change already scheduled a write
+            if _state_save_task is None or _state_save_task.done():
+                _state_save_task = asyncio.get_running_loop().create_task(_delayed_state_save(STATE_SAVE_RETRY_DELAY))
+
+async def _delayed_state_save(delay: float = STATE_SAVE_DELAY):
+    await asyncio.sleep(delay)
+    await flush_state()
+
+def schedule_state_save(notify_listeners: bool = True):
+    """
+    Mark the runtime state as changed and notify configuration listeners
+    
+    Inside the event loop the write is deferred by STATE_SAVE_DELAY so a burst of changes
+    costs one write; outside a loop (e.g. maintenance scripts) the state is written immediately.
+    Bookkeeping that isn't configuration (e.g. checkpoints) passes notify_listeners=False.
+    """
+    global _state_save_task, _state_generation, _saved_generation
+    _state_generation += 1
+    if notify_listeners:
+        for listener in _config_listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.error(f"Error in configuration listener: {str(e)}")
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        _write_state_file(json.dumps({name: provider() for name, provider in _state_providers.items()}))
+        _saved_generation = _state_generation
+        return
+    if _state_save_task is None or _state_save_task.done():
+        _state_save_task = loop.create_task(_delayed_state_save())
+
 # Function to save bot configuration
 def save_bot_config():
-    """Save bot configuration to environment variable and .env file"""
+    """Save bot configuration to the runtime state file (coalesced, written off the event loop)"""
     # Import the developer mode setting if it exists in the bot module
     try:
         import bot
         if hasattr(bot, 'DEVELOPER_MODE'):
             BOT_CONFIG["developer_mode"] = bot.DEVELOPER_MODE
-            logger.info(f"Including developer_mode={bot.DEVELOPER_MODE} in bot configuration")
     except ImportError:
         logger.info("Could not import bot module to get DEVELOPER_MODE")
     
@@ -85,36 +207,6 @@ def save_bot_config():
     if "developer_mode" not in BOT_CONFIG:
         BOT_CONFIG["developer_mode"] = True  # Default to True for better debugging
     
-    config_json = json.dumps(BOT_CONFIG)
-    os.environ["BOT_CONFIG"] = config_json
-    
-    logger.info(f"Saving bot configuration with keys: {list(BOT_CONFIG.keys())}")
-    
-    # Update .env file
-    try:
-        with open(".env", "r") as f:
-            env_lines = f.readlines()
-        
-        # Check if BOT_CONFIG line exists
-        bot_config_line_exists = False
-        for i, line in enumerate(env_lines):
-            if line.startswith("BOT_CONFIG="):
-                env_lines[i] = f'BOT_CONFIG=\'{config_json}\'\n'
-                bot_config_line_exists = True
-                break
-        
-        # Add BOT_CONFIG if it doesn't exist
-        if not bot_config_line_exists:
-            env_lines.append(f'BOT_CONFIG=\'{config_json}\'\n')
-        
-        # Write back to .env
-        with open(".env", "w") as f:
-            f.writelines(env_lines)
-            
-        logger.info(f"✅ Successfully updated bot configuration in .env file")
-    except Exception as e:
-        error_msg = str(e)
-        logger.error(f"❌ Failed to update .env file with bot configuration: {error_msg}")
-        logger.info(f"Updated bot configuration in memory only: {config_json}")
+    schedule_state_save()
 
 # Remove Flask references
@@ -3,11 +3,12 @@
 Fix for deletion synchronization not working properly.
 This script adds registration for the deleted messages handler
 and ensures the sync_deletions setting is properly enabled.
+Stop the bot first, otherwise its next save overwrites the setting.
 """
 
-import os
 import json
-import re
+
+import config
 
 def load_file(filename):
     """Load the content of a file"""
@@ -19,75 +20,22 @@ def save_file(filename, content):
     with open(filename, 'w', encoding='utf-8') as f:
         f.write(content)
 
-def load_env():
-    """Load environment variables from .env file"""
-    env_vars = {}
-    try:
-        with open('.env', 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                key, value = line.split('=', 1)
-                env_vars[key] = value.strip("'\"")
-    except Exception as e:
-        print(f"Error loading .env file: {e}")
-    return env_vars
-
-def save_to_env(key, value):
-    """Save a value to both environment variables and .env file"""
-    os.environ[key] = value
-    
-    try:
-        # Read the current .env file
-        env_lines = []
-        try:
-            with open('.env', 'r') as f:
-                env_lines = f.readlines()
-        except FileNotFoundError:
-            # If .env doesn't exist, create an empty list
-            env_lines = []
-        
-        # Check if the key already exists
-        key_exists = False
-        for i, line in enumerate(env_lines):
-            if line.strip().startswith(f"{key}="):
-                # Replace the existing line
-                env_lines[i] = f"{key}='{value}'\n"
-                key_exists = True
-                break
-        
-        # If key doesn't exist, add it
-        if not key_exists:
-            env_lines.append(f"{key}='{value}'\n")
-        
-        # Write back to the .env file
-        with open('.env', 'w') as f:
-            f.writelines(env_lines)
-        
-        print(f"✅ Successfully updated {key} in .env file")
-    except Exception as e:
-        print(f"Error updating .env file: {e}")
-
 def enable_sync_deletions():
-    """Enable the sync_deletions flag in BOT_CONFIG"""
-    env_vars = load_env()
-    
-    # Get current BOT_CONFIG
-    bot_config = {}
-    try:
-        if 'BOT_CONFIG' in env_vars:
-            bot_config = json.loads(env_vars['BOT_CONFIG'])
-    except json.JSONDecodeError:
-        print("Error: Invalid BOT_CONFIG format in .env file")
-        bot_config = {}
+    """Enable the sync_deletions flag in the bot configuration of the runtime state file"""
+    # config already reflects the state file, falling back to BOT_CONFIG from .env
+    bot_config = dict(config.BOT_CONFIG)
     
     # Update sync_deletions flag
     bot_config['sync_deletions'] = True
     
     # Save updated config
-    save_to_env('BOT_CONFIG', json.dumps(bot_config))
-    print(f"Updated BOT_CONFIG: {json.dumps(bot_config)}")
+    try:
+        config.update_state_sections({'bot_config': bot_config})
+        print(f"✅ Successfully updated bot_config in {config.STATE_FILE}")
+    except Exception as e:
+        print(f"Error updating {config.STATE_FILE}: {e}")
+        return
+    print(f"Updated bot configuration: {json.dumps(bot_config)}")
 
 def register_deletion_handler(content):
     """Add registration for the deletion message handler in standalone_bot.py"""
@@ -137,7 +85,7 @@ def main():
     print("Fixing deletion synchronization issues...")
     
     # Enable sync_deletions flag
-    print("\n1. Enabling sync_deletions flag in BOT_CONFIG...")
+    print("\n1. Enabling sync_deletions flag in the bot configuration...")
     enable_sync_deletions()
     
     # Register deletion handler
@@ -71,23 +71,14 @@ async def start_bot():
                     hasattr(bot, 'USER_SESSION') and bot.USER_SESSION):
                     
                     # Create and connect client
-                    from telethon import TelegramClient
-                    from telethon.sessions import StringSession
-                    
                     if hasattr(bot, 'user_client') and bot.user_client:
                         try:
                             await bot.user_client.disconnect()
                         except Exception as e:
                             logger.warning(f"Error disconnecting existing client: {e}")
                     
-                    # Create new client with a unique session name
-                    bot.user_client = TelegramClient(
-                        StringSession(bot.USER_SESSION),
-                        bot.API_ID,
-                        bot.API_HASH,
-                        connection_retries=None,  # Infinite retries
-                        retry_delay=1  # 1 second delay between retries
-                    )
+                    # Create new client (uses the session file when USER_SESSION_FILE is set)
+                    bot.user_client = bot.create_user_client()
                     
                     # Connect client
                     await bot.user_client.connect()
@@ -143,172 +134,34 @@ async def start_bot():
                             # Still ensure the variable is set
                             bot.reposting_active = True
                         
-                        # Add debugging event handlers for monitoring message flow
+                        # Debug logging of every message is opt-in (debug_all_events in BOT_CONFIG)
                         from telethon import events
                         
-                        # Debug handler for ALL messages
-                        async def debug_all_messages(event):
-                            logger.info(f"DEBUG-ALL: Received event: {event.__class__.__name__}")
-                            if hasattr(event, 'message') and hasattr(event.message, 'text'):
-                                text_preview = event.message.text[:50] + '...' if len(event.message.text) > 50 else event.message.text
-                                logger.info(f"DEBUG-ALL: Message text: {text_preview}")
-                            if hasattr(event, 'chat_id'):
-                                logger.info(f"DEBUG-ALL: Chat ID: {event.chat_id}")
-                                
-                        # Add global handler for all messages
-                        bot.user_client.add_event_handler(debug_all_messages, events.NewMessage())
-                        logger.info("Added global debug handler for ALL messages")
-                        
-                        # Add specific handler for source channel if configured
-                        if bot.active_channels["source"]:
-                            source_channels = bot.active_channels["source"]
-                            
-                            # Debug handler specifically for source channel messages
-                            async def debug_source_messages(event):
-                                logger.info(f"DEBUG-SOURCE: Message in source channel {event.chat_id}")
-                                if hasattr(event, 'message'):
-                                    if hasattr(event.message, 'text') and event.message.text:
-                                        text_preview = event.message.text[:50] + '...' if len(event.message.text) > 50 else event.message.text
-                                        logger.info(f"DEBUG-SOURCE: Text: {text_preview}")
-                                    media_type = 'unknown'
-                                    if hasattr(event.message, 'photo') and event.message.photo:
-                                        media_type = 'photo'
-                                    elif hasattr(event.message, 'document') and event.message.document:
-                                        media_type = 'document'
-                                    elif hasattr(event.message, 'video') and event.message.video:
-                                        media_type = 'video'
-                                    logger.info(f"DEBUG-SOURCE: Media type: {media_type}")
-                            
-                            # Register source-specific handler
-                            bot.user_client.add_event_handler(
-                                debug_source_messages,
-                                events.NewMessage(chats=source_channels)
-                            )
-                            logger.info(f"Added specific debug handler for source channels: {source_channels}")
-                            
-                            # Add a debug handler for this specific chat ID we're seeing in logs
-                            debug_chat_id = -1002597966668
-                            async def debug_specific_channel(event):
-                                logger.info(f"DEBUG-SPECIFIC: Message in specific channel {event.chat_id}")
-                                if hasattr(event, 'message'):
-                                    if hasattr(event.message, 'text') and event.message.text:
-                                        text_preview = event.message.text[:50] + '...' if len(event.message.text) > 50 else event.message.text
-                                        logger.info(f"DEBUG-SPECIFIC: Text: {text_preview}")
-                                    media_type = 'unknown'
-                                    if hasattr(event.message, 'photo') and event.message.photo:
-                                        media_type = 'photo'
-                                    elif hasattr(event.message, 'document') and event.message.document:
-                                        media_type = 'document'
-                                    elif hasattr(event.message, 'video') and event.message.video:
-                                        media_type = 'video'
-                                    logger.info(f"DEBUG-SPECIFIC: Media type: {media_type}")
-                                    
-                                    # Try to forward this message to our destination channel
-                                    logger.info(f"DEBUG: Attempting to forward message from {debug_chat_id} to destination channel")
-                                    asyncio.create_task(bot.handle_new_message(event))
-                            
-                            # Register handler for the specific chat ID
-                            bot.user_client.add_event_handler(
-                                debug_specific_channel,
-                                events.NewMessage(chats=[debug_chat_id])
-                            )
-                            logger.info(f"Added debug handler for specific chat ID: {debug_chat_id}")
-                            
-                            # Print a message showing the relationship between positive and negative IDs
-                            logger.info(f"DEBUG: For reference, the relationship between IDs:")
-                            logger.info(f"DEBUG: Negative ID format: {debug_chat_id}")
-                            logger.info(f"DEBUG: Positive ID format (source_channels): {source_channels}")
-                            logger.info(f"DEBUG: Math relationship: {debug_chat_id} vs {-debug_chat_id - 1000000000000}")
-                            logger.info(f"DEBUG: This info helps understand Telegram's channel ID formats.")
-                            
-                            # Check if we need to add the negative format to our source channels
-                            # This is critical if we're seeing messages from channels in negative format
-                            neg_chat_id = debug_chat_id
-                            pos_chat_id = int(-neg_chat_id - 1000000000000)
-                            
-                            # If the calculated positive ID is different from what's in our config
-                            if pos_chat_id != source_channels[0]:
-                                logger.info(f"DEBUG: Channel ID mismatch between negative and positive formats!")
-                                logger.info(f"DEBUG: Adding negative format {neg_chat_id} to source channels list")
-                                
-                                # Add the negative format to our source channels
-                                if neg_chat_id not in source_channels:
-                                    source_channels.append(neg_chat_id)
-                                    # Update the bot's active channels
-                                    bot.active_channels["source"] = source_channels
-                                    logger.info(f"DEBUG: Updated source channels: {source_channels}")
+                        if bot.DEBUG_ALL_EVENTS:
+                            # Debug handler for ALL messages
+                            async def debug_all_messages(event):
+                                logger.info(f"DEBUG-ALL: Received event: {event.__class__.__name__}")
+                                if hasattr(event, 'message') and hasattr(event.message, 'text'):
+                                    text_preview = event.message.text[:50] + '...' if len(event.message.text) > 50 else event.message.text
+                                    logger.info(f"DEBUG-ALL: Message text: {text_preview}")
+                                if hasattr(event, 'chat_id'):
+                                    logger.info(f"DEBUG-ALL: Chat ID: {event.chat_id}")
                                     
-                                    # Force reposting to be active again
-                                    bot.reposting_active = True
-                                    logger.info("FORCED reposting_active to TRUE again after channel update")
-                                    # Try to save the reposting state again with the same robust approach
-                                    try:
-                                        if hasattr(bot, 'save_reposting_state'):
-                                            await bot.save_reposting_state()
-                                        else:
-                                            # Direct config update without await
-                                            if hasattr(bot, 'save_config'):
-                                                await bot.save_config()
-                                    except Exception as e:
-                                        logger.error(f"Error saving reposting state after channel update: {e}")
-                                        # Ensure this doesn't block execution
-                            
-                            
-                            # We also need to ensure the handle_new_message is properly registered
-                            # Clear any existing handlers for this specific function first
-                            if hasattr(bot.user_client, '_event_builders'):
-                                builders = list(bot.user_client._event_builders) if bot.user_client._event_builders else []
-                                for builder in builders:
-                                    if builder[1].__name__ == 'handle_new_message':
-                                        try:
-                                            bot.user_client.remove_event_handler(builder[1], builder[0])
-                                            logger.info("Removed existing handle_new_message handler")
-                                        except Exception as e:
-                                            logger.error(f"Error removing handler: {e}")
-                                            
-                            # Register our handler with fresh settings
-                            bot.user_client.add_event_handler(
-                                bot.handle_new_message,
-                                events.NewMessage(chats=source_channels)
-                            )
-                            logger.info(f"Re-registered handle_new_message for source channels: {source_channels}")
-                            
-                            # Do the same for edited messages handler - with enhanced logging
-                            for builder in builders:
-                                if builder[1].__name__ == 'handle_edited_message':
-                                    try:
-                                        bot.user_client.remove_event_handler(builder[1], builder[0])
-                                        logger.info("Removed existing handle_edited_message handler")
-                                    except Exception as e:
-                                        logger.error(f"Error removing handler: {e}")
-                            
-                            # Register our edited message handler
-                            bot.user_client.add_event_handler(
-                                bot.handle_edited_message,
-                                events.MessageEdited(chats=source_channels)
-                            )
-                            logger.info(f"Re-registered handle_edited_message for source channels: {source_channels}")
-
-                            # Register deletion message handler
-                            for builder in builders:
-                                if builder[1].__name__ == 'handle_deleted_message':
-                                    try:
-                                        bot.user_client.remove_event_handler(builder[1], builder[0])
-                                        logger.info("Removed existing handle_deleted_message handler")
-                                    except Exception as e:
-                                        logger.error(f"Error removing handler: {e}")
-                                        
-                            # Register our deletion message handler
-                            bot.user_client.add_event_handler(
-                                bot.handle_deleted_message,
-                                events.MessageDeleted(chats=source_channels)
-                            )
-                            logger.info(f"Re-registered handle_deleted_message for source channels: {source_channels}")
-                            
-                            # Check if sync_deletions is enabled
-                            if hasattr(bot, 'get_sync_deletions'):
-                                sync_status = bot.get_sync_deletions()
-                                logger.info(f"Deletion sync status: {'ENABLED' if sync_status else 'DISABLED'}")
+                            # Add global handler for all messages
+                            bot.user_client.add_event_handler(debug_all_messages, events.NewMessage())
+                            logger.info("Added global debug handler for ALL messages")
+                        
+                        # Source updates (new, edited and deleted) are routed by the bot's single raw dispatcher,
+                        # which matches both bare and -100 marked channel ids
+                        await bot.apply_source_channels()
+                        
+                        # Recover updates missed during downtime now that the dispatcher is listening
+                        await bot.catch_up_updates()
+                        
+                        # Check if sync_deletions is enabled
+                        if hasattr(bot, 'get_sync_deletions'):
+                            sync_status = bot.get_sync_deletions()
+                            logger.info(f"Deletion sync status: {'ENABLED' if sync_status else 'DISABLED'}")
                     else:
                         logger.warning("User client connected but not authorized")
             else:
@@ -355,6 +208,22 @@ async def start_bot():
             poll_interval=0.5  # Poll more frequently (default is 1.0)
         )
         
+        # Background jobs report progress through the bot module's application
+        bot.bot_app = application
+        
+        # Pick up purge jobs interrupted by the last shutdown
+        bot.resume_purge_jobs()
+        bot.sweep_media_temp_dirs()
+        bot.resume_backfill_jobs()
+        asyncio.create_task(bot.periodic_reconciliation())
+        asyncio.create_task(bot.retry_queue_worker())
+        
+        # Apply channel configuration changes made outside the admin bot
+        bot.start_config_reloaders()
+        
+        # Repost whatever the sources posted while we were down
+        asyncio.create_task(bot.catch_up_missed_messages())
+        
         logger.info("Bot is now running")
         
         # Keep running until shutdown flag is set
@@ -364,6 +233,9 @@ async def start_bot():
         # Handle shutdown
         logger.info("Shutting down bot...")
         
+        # Write any pending runtime state before exiting
+        await bot.flush_state()
+        
         # Close the user client
         if hasattr(bot, 'user_client') and bot.user_client and bot.user_client.is_connected():
             await bot.user_client.disconnect()